@@ -4,13 +4,37 @@ obs = obslua
 local socket = require("ljsocket")
 local json = require("dkjson")
 local our_server = nil
+local speaker_scene_prefix = "Speaker-"
+-- Milliseconds of each tick that can be spent applying updates before the rest wait for the next tick
+local apply_budget_ms = 4
+-- Newest update waiting to be applied for every camera source, in the order they first arrived
+local pending = {}
+-- Keys of pending updates from pending_first to pending_last. Applied keys are set to nil so the length of
+-- pending_order is never used, Lua's # is not defined on a table with holes
+local pending_order = {}
+local pending_first = 1
+local pending_last = 0
+-- Layout relative crop of every camera source so crops can follow the call window being resized
+local relative_crops = {}
+local follow_resizes = true
+-- Ticks between checks of the camera source sizes
+local resize_check_ticks = 5
+-- Address of the mapper that sent the last command, telemetry is sent back to it
+local mapper_address = nil
+local send_telemetry = true
+-- Plugin side timings and counts since the last telemetry report
+local telemetry = {}
+local last_tick_ns = nil
+local last_lagged_frames = nil
+local poll_interval_ms = 50
 
 -- Set true to get debug printing
 local debug_print_enabled = false
 
-function debug_print(a_string)
+-- Formats and prints only when debugging is enabled so no strings are built otherwise
+function debug_print(format_string, ...)
     if debug_print_enabled then
-        print(a_string)
+        print(string.format(format_string, ...))
     end
 end
 
@@ -24,9 +48,15 @@ function script_load(settings)
     -- Bind our_port on all local interfaces
     assert(our_server:bind('*', obs.obs_data_get_int(settings, "port")))
 
-    -- Check for input once per second.
-    obs.timer_add(client, 5000)
-    debug_print('Listening on UDP port ' .. obs.obs_data_get_int(settings, "port"))
+    speaker_scene_prefix = obs.obs_data_get_string(settings, "speaker_scene_prefix")
+    -- Check for input every poll_interval milliseconds. Short intervals keep active speaker switches quick
+    poll_interval_ms = obs.obs_data_get_int(settings, "poll_interval")
+    obs.timer_add(client, poll_interval_ms)
+    apply_budget_ms = obs.obs_data_get_int(settings, "apply_budget")
+    follow_resizes = obs.obs_data_get_bool(settings, "follow_resizes")
+    send_telemetry = obs.obs_data_get_bool(settings, "send_telemetry")
+    reset_telemetry()
+    debug_print('Listening on UDP port %d', obs.obs_data_get_int(settings, "port"))
 end
 
 function script_unload()
@@ -45,7 +75,8 @@ end
 function get_source(scene, win_title, cam_info, os, id)
     source = obs.obs_get_source_by_name(cam_info['camName'])
     if source == nil then
-        debug_print("No source found, creating new source for " .. cam_info['camName'])
+        debug_print("No source found, creating new source for %s", cam_info['camName'])
+        telemetry.created = telemetry.created + 1
         settings = obs.obs_data_create()
         if os == 'Linux' then
             obs.obs_data_set_string(settings, "capture_window", win_title)
@@ -70,28 +101,41 @@ function get_source(scene, win_title, cam_info, os, id)
             return source
         end
     else
-        debug_print("Source found for " .. cam_info['camName'])
+        debug_print("Source found for %s", cam_info['camName'])
+        telemetry.updated = telemetry.updated + 1
         if os == 'Linux' then
             settings = obs.obs_source_get_settings(source)
-            debug_print("Source window before modifying is " .. obs.obs_data_get_string(settings, "capture_window"))
+            if debug_print_enabled then
+                debug_print("Source window before modifying is %s", obs.obs_data_get_string(settings, "capture_window"))
+            end
             obs.obs_data_set_string(settings, "capture_window", win_title)
-            debug_print("Source window after modifying is " .. obs.obs_data_get_string(settings, "capture_window"))
+            if debug_print_enabled then
+                debug_print("Source window after modifying is %s", obs.obs_data_get_string(settings, "capture_window"))
+            end
             obs.obs_source_update(source, settings)
             obs.obs_data_release(settings)
             return source
         elseif os == 'Windows' then
             settings = obs.obs_source_get_settings(source)
-            debug_print("Source window before modifying is " .. obs.obs_data_get_string(settings, "capture_window"))
+            if debug_print_enabled then
+                debug_print("Source window before modifying is %s", obs.obs_data_get_string(settings, "capture_window"))
+            end
             obs.obs_data_set_string(settings, "window", win_title)
-            debug_print("Source window after modifying is " .. obs.obs_data_get_string(settings, "capture_window"))
+            if debug_print_enabled then
+                debug_print("Source window after modifying is %s", obs.obs_data_get_string(settings, "capture_window"))
+            end
             obs.obs_source_update(source, settings)
             obs.obs_data_release(settings)
             return source
         else
             settings = obs.obs_source_get_settings(source)
-            debug_print("Source window before modifying is " .. obs.obs_data_get_string(settings, "capture_window"))
+            if debug_print_enabled then
+                debug_print("Source window before modifying is %s", obs.obs_data_get_string(settings, "capture_window"))
+            end
             obs.obs_data_set_string(settings, os, win_title)
-            debug_print("Source window after modifying is " .. obs.obs_data_get_string(settings, "capture_window"))
+            if debug_print_enabled then
+                debug_print("Source window after modifying is %s", obs.obs_data_get_string(settings, "capture_window"))
+            end
             obs.obs_source_update(source, settings)
             obs.obs_data_release(settings)
             return source
@@ -102,6 +146,7 @@ end
 function get_crop(source)
     crop = obs.obs_source_get_filter_by_name(source, "CamCrop")
     if crop == nil then
+        telemetry.filters = telemetry.filters + 1
         _obs_data = obs.obs_data_create()
         obs.obs_data_set_bool(_obs_data, "relative", false)
         filter = obs.obs_source_create_private("crop_filter", "CamCrop", _obs_data)
@@ -114,43 +159,279 @@ function get_crop(source)
     end
 end
 
-function crop_cam(win_title, cam_info, os, id)
+function set_crop(source, left, top, cx, cy)
+    local crop = get_crop(source)
+    local settings = obs.obs_source_get_settings(crop)
+    local i = obs.obs_data_set_int
+    i(settings, "left", left)
+    i(settings, "top", top)
+    i(settings, "cx", cx)
+    i(settings, "cy", cy)
+    obs.obs_source_update(crop, settings)
+    obs.obs_data_release(settings)
+    obs.obs_source_release(crop)
+end
+
+function track_relative_crop(source, v, layout)
+    -- Stores the camera as fractions of the call's content area so its crop can be recomputed on a resize
+    if layout == nil or v['nx'] == nil then
+        relative_crops[v['camName']] = nil
+        return
+    end
+    local entry = {cam = v, layout = layout, width = 0, height = 0, chrome = nil}
+    relative_crops[v['camName']] = entry
+    -- A new source has no size until it renders, check_resizes records its size as the baseline once it has one
+    set_crop_baseline(entry, obs.obs_source_get_base_width(source), obs.obs_source_get_base_height(source))
+end
+
+function set_crop_baseline(entry, width, height)
+    -- Records the size the crop was set for. Chrome is measured from the source edges so it stays the same size
+    -- when the source is resized
+    if width == 0 or height == 0 then
+        return
+    end
+    local layout = entry.layout
+    local margins = layout['margins']
+    local y_offset = layout['yOffset']
+    entry.width = width
+    entry.height = height
+    entry.chrome = {margins[1], margins[2] + y_offset, width - (layout['w'] - margins[3]),
+                    height - (layout['h'] - margins[4] + y_offset)}
+end
+
+function relative_crop(entry, width, height)
+    -- Scales the box around every camera to fit the new content area without stretching it, keeping its position
+    local cam = entry.cam
+    local layout = entry.layout
+    local margins = layout['margins']
+    local box = layout['box']
+    local content_width = width - entry.chrome[1] - entry.chrome[3]
+    local content_height = height - entry.chrome[2] - entry.chrome[4]
+    local detected_width = layout['w'] - margins[1] - margins[3]
+    local detected_height = layout['h'] - margins[2] - margins[4]
+    if math.min(content_width, content_height, detected_width, detected_height, box[3], box[4]) <= 0 then
+        return nil
+    end
+    local scale = math.min(content_width / detected_width, content_height / detected_height)
+    local scaled_width = box[3] * detected_width * scale
+    local scaled_height = box[4] * detected_height * scale
+    local scaled_x = entry.chrome[1] + (box[1] + box[3] / 2) * content_width - scaled_width / 2
+    local scaled_y = entry.chrome[2] + (box[2] + box[4] / 2) * content_height - scaled_height / 2
+    return math.floor(scaled_x + (cam['nx'] - box[1]) / box[3] * scaled_width + 0.5),
+           math.floor(scaled_y + (cam['ny'] - box[2]) / box[4] * scaled_height + 0.5),
+           math.floor(cam['nw'] / box[3] * scaled_width + 0.5),
+           math.floor(cam['nh'] / box[4] * scaled_height + 0.5)
+end
+
+function check_resizes()
+    -- Recomputes the crop of every camera whose capture source changed size since its crop was set
+    for cam_name, entry in pairs(relative_crops) do
+        local source = obs.obs_get_source_by_name(cam_name)
+        if source == nil then
+            relative_crops[cam_name] = nil
+        else
+            local width = obs.obs_source_get_base_width(source)
+            local height = obs.obs_source_get_base_height(source)
+            if entry.chrome == nil then
+                -- The crop sent by the mapper is already right for the first size the source renders at
+                set_crop_baseline(entry, width, height)
+            elseif width > 0 and height > 0 and (width ~= entry.width or height ~= entry.height) then
+                entry.width = width
+                entry.height = height
+                local left, top, cx, cy = relative_crop(entry, width, height)
+                if left ~= nil then
+                    debug_print("Source %s resized to %dx%d, crop moved to %d %d %d %d", cam_name, width, height, left, top, cx, cy)
+                    set_crop(source, left, top, cx, cy)
+                end
+            end
+            obs.obs_source_release(source)
+        end
+    end
+end
+
+function crop_one(win_title, v, os, id, layout)
+    current_scene = obs.obs_frontend_get_current_scene()
+    scene = obs.obs_scene_from_source(current_scene)
+    source = get_source(scene, win_title, v, os, id)
+    set_crop(source, v['x'], v['y'], v['x1'], v['y1'])
+    track_relative_crop(source, v, layout)
+    obs.obs_source_release(source)
+end
+
+function crop_cam(win_title, cam_info, os, id, layout)
     for  k,v in pairs(cam_info) do
-        current_scene = obs.obs_frontend_get_current_scene()
-        scene = obs.obs_scene_from_source(current_scene)
-        source = get_source(scene, win_title, v, os, id)
-        crop = get_crop(source)
-        settings = obs.obs_source_get_settings(crop)
-        i = obs.obs_data_set_int
-        i(settings, "left", v['x'])
-        i(settings, "top", v['y'])
-        i(settings, "cx", v['x1'])
-        i(settings, "cy", v['y1'])
-        obs.obs_source_update(crop, settings)
-        obs.obs_data_release(settings)
-        obs.obs_source_release(source)
-        obs.obs_source_release(crop)
+        crop_one(win_title, v, os, id, layout)
+    end
+end
+
+function set_speaker(cam_name)
+    -- Switches to the speaker scene of the person if there is one, otherwise moves their source to the top
+    if cam_name == nil or cam_name == "" then
+        return
+    end
+    local speaker_scene = obs.obs_get_source_by_name(speaker_scene_prefix .. cam_name)
+    if speaker_scene ~= nil then
+        debug_print("Switching to speaker scene for %s", cam_name)
+        obs.obs_frontend_set_current_scene(speaker_scene)
+        obs.obs_source_release(speaker_scene)
+        return
+    end
+    local current_scene = obs.obs_frontend_get_current_scene()
+    local scene = obs.obs_scene_from_source(current_scene)
+    local item = obs.obs_scene_find_source(scene, cam_name)
+    if item ~= nil then
+        debug_print("Moving speaker source to the top for %s", cam_name)
+        obs.obs_sceneitem_set_order(item, obs.OBS_ORDER_MOVE_TOP)
+    end
+    obs.obs_source_release(current_scene)
+end
+
+function set_camera_visible(cam_name, visible)
+    -- Shows or hides the camera source in the current scene, used to hide cameras that are turned off
+    local current_scene = obs.obs_frontend_get_current_scene()
+    local scene = obs.obs_scene_from_source(current_scene)
+    local item = obs.obs_scene_find_source(scene, cam_name)
+    if item ~= nil then
+        debug_print("Setting visibility of %s to %s", cam_name, tostring(visible))
+        obs.obs_sceneitem_set_visible(item, visible)
+    end
+    obs.obs_source_release(current_scene)
+end
+
+function reset_telemetry()
+    telemetry = {messages = 0, decode_ns = 0, applied = 0, apply_ns = 0, max_apply_ns = 0, created = 0,
+                 updated = 0, filters = 0, tick_late_ns = 0}
+end
+
+function remember_mapper(address)
+    -- The received address points into a buffer owned by the socket library so the mapper is resolved into an
+    -- address of our own, only when it changes
+    local ip, port = address:get_ip(), address:get_port()
+    local key = string.format("%s:%d", ip, port)
+    if mapper_address == nil or mapper_address.key ~= key then
+        local resolved = socket.find_first_address(ip, port, {socket_type = "dgram", protocol = "udp"})
+        if resolved then
+            resolved.key = key
+            mapper_address = resolved
+        end
+    end
+end
+
+function report_telemetry()
+    -- Sends the plugin side timings back to the mapper so both sides of a remap can be compared
+    if mapper_address == nil or (telemetry.messages == 0 and telemetry.applied == 0) then
+        return
+    end
+    local lagged_frames = obs.obs_get_lagged_frames()
+    local report = {
+        arg = "telemetry", messages = telemetry.messages, decode_ns = telemetry.decode_ns,
+        applied = telemetry.applied, apply_ns = telemetry.apply_ns, max_apply_ns = telemetry.max_apply_ns,
+        pending = pending_last - pending_first + 1, created = telemetry.created, updated = telemetry.updated,
+        filters = telemetry.filters, tick_late_ns = telemetry.tick_late_ns,
+        lagged_frames = lagged_frames - (last_lagged_frames or lagged_frames)
+    }
+    last_lagged_frames = lagged_frames
+    local sent, err = our_server:send_to(mapper_address, json.encode(report))
+    if not sent then
+        debug_print("Telemetry could not be sent: %s", tostring(err))
+    end
+    reset_telemetry()
+end
+
+function queue_update(key, update)
+    -- Keeps only the newest update for each key while keeping the position the key first arrived in
+    if pending[key] == nil then
+        pending_last = pending_last + 1
+        pending_order[pending_last] = key
+    end
+    pending[key] = update
+end
+
+function queue_command(args)
+    if args['arg'] == ("crop camera") then
+        for k, v in pairs(args['cameras']) do
+            queue_update("crop:" .. v['camName'], {kind = "crop", exe = args['exe'], cam = v, os = args['os'], id = args['id'], layout = args['layout']})
+        end
+    elseif args['arg'] == ("active speaker") then
+        queue_update("speaker", {kind = "speaker", camName = args['camName']})
+    elseif args['arg'] == ("camera visibility") then
+        queue_update("visible:" .. args['camName'], {kind = "visible", camName = args['camName'], visible = args['visible'] == 1})
+    end
+end
+
+function apply_update(update)
+    if update.kind == "crop" then
+        crop_one(update.exe, update.cam, update.os, update.id, update.layout)
+    elseif update.kind == "speaker" then
+        set_speaker(update.camName)
+    elseif update.kind == "visible" then
+        set_camera_visible(update.camName, update.visible)
+    end
+end
+
+function apply_pending()
+    -- Applies queued updates until the tick budget is used up. Anything left is applied on the next tick
+    local deadline = obs.os_gettime_ns() + apply_budget_ms * 1000000
+    while pending_first <= pending_last do
+        local key = pending_order[pending_first]
+        local update = pending[key]
+        pending_order[pending_first] = nil
+        pending[key] = nil
+        pending_first = pending_first + 1
+        local start = obs.os_gettime_ns()
+        apply_update(update)
+        local now = obs.os_gettime_ns()
+        telemetry.applied = telemetry.applied + 1
+        telemetry.apply_ns = telemetry.apply_ns + (now - start)
+        telemetry.max_apply_ns = math.max(telemetry.max_apply_ns, now - start)
+        if now >= deadline then
+            break
+        end
+    end
+    if pending_first > pending_last then
+        pending_order = {}
+        pending_first = 1
+        pending_last = 0
+    else
+        debug_print("%d updates carried over to the next tick", pending_last - pending_first + 1)
     end
 end
 
 local tick = 0
 function client()
     tick = tick + 1
-    debug_print("in client " .. tick)
-    -- Get data until there is no more, or an error occurs
+    debug_print("in client %d", tick)
+    -- Ticks that run late show OBS was too busy to run the script on time
+    local tick_start = obs.os_gettime_ns()
+    if last_tick_ns ~= nil then
+        telemetry.tick_late_ns = math.max(telemetry.tick_late_ns, tick_start - last_tick_ns - poll_interval_ms * 1000000)
+    end
+    last_tick_ns = tick_start
+    -- Drains the socket first so only the newest update for each source is applied
     repeat
         local data, status = our_server:receive_from()
         if data then
+            remember_mapper(status)
+            local decode_start = obs.os_gettime_ns()
             data = data:gsub("'", '"')
-            debug_print('Data received after ' .. tick .. ' polls: "' .. data .. '"')
+            debug_print('Data received after %d polls: "%s"', tick, data)
             local args = json.decode(data)
-            if args['arg'] == ("crop camera") then
-                crop_cam(args['exe'], args['cameras'], args['os'], args['id'])
+            telemetry.messages = telemetry.messages + 1
+            telemetry.decode_ns = telemetry.decode_ns + (obs.os_gettime_ns() - decode_start)
+            if args ~= nil then
+                queue_command(args)
             end
         elseif status ~= "timeout" then
             error(status)
         end
     until data == nil
+    apply_pending()
+    if follow_resizes and tick % resize_check_ticks == 0 then
+        check_resizes()
+    end
+    if send_telemetry then
+        report_telemetry()
+    end
 end
 
 function debugToggle()
@@ -168,13 +449,30 @@ function script_description()
     "\n\n By Luna"
 end
 
+function script_update(settings)
+    speaker_scene_prefix = obs.obs_data_get_string(settings, "speaker_scene_prefix")
+    apply_budget_ms = obs.obs_data_get_int(settings, "apply_budget")
+    follow_resizes = obs.obs_data_get_bool(settings, "follow_resizes")
+    send_telemetry = obs.obs_data_get_bool(settings, "send_telemetry")
+end
+
 function script_defaults(settings)
     obs.obs_data_set_default_int(settings, "port", 48387)
+    obs.obs_data_set_default_int(settings, "poll_interval", 50)
+    obs.obs_data_set_default_int(settings, "apply_budget", 4)
+    obs.obs_data_set_default_bool(settings, "follow_resizes", true)
+    obs.obs_data_set_default_bool(settings, "send_telemetry", true)
+    obs.obs_data_set_default_string(settings, "speaker_scene_prefix", "Speaker-")
 end
 
 function script_properties()
     props = obs.obs_properties_create()
     obs.obs_properties_add_int(props, "port", "Port used to communicate with server. Leave default unless changed in server settings.", 0, 65535, 1)
+    obs.obs_properties_add_int(props, "poll_interval", "Milliseconds between checks for new commands. Reload the script after changing.", 10, 5000, 10)
+    obs.obs_properties_add_int(props, "apply_budget", "Milliseconds per check that can be spent applying updates. The rest wait for the next check.", 1, 100, 1)
+    obs.obs_properties_add_bool(props, "follow_resizes", "Move crops when a call window is resized")
+    obs.obs_properties_add_bool(props, "send_telemetry", "Send timings of applied commands back to the mapper")
+    obs.obs_properties_add_text(props, "speaker_scene_prefix", "Prefix of the scene switched to when a person speaks", obs.OBS_TEXT_DEFAULT)
     obs.obs_properties_add_button(props, "button", "Debug Toggle", function() debugToggle() end)
     return props
 end
\ No newline at end of file
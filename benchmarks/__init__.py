@@ -0,0 +1,3 @@
+"""
+Benchmarks and test harnesses for OBS Call Mapper that run without OBS or a real call window.
+"""
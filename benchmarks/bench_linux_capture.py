@@ -0,0 +1,221 @@
+"""
+Measures the Linux window path of ImageProcessing on a headless Xvfb display.
+An Xvfb display and a window manager are started, synthetic call windows with known titles are opened and
+window enumeration, activation, capture, exe resolution and detection are timed once through the X11 window tracker
+and once through wmctrl, the fallback used when python-xlib is not installed.
+
+Needs Xvfb, wmctrl, xprop and one of the window managers in WINDOW_MANAGERS installed.
+Run with: python -m benchmarks.bench_linux_capture
+Use --display :0 to run against an existing display instead of starting Xvfb.
+"""
+import argparse  # Used to read benchmark options
+import os  # Used to point X clients at the display
+import shutil  # Used to find the X programs
+import subprocess  # Used to start Xvfb, the window manager and the windows
+import sys  # Used to start the windows with the running interpreter
+import tempfile  # Used as the save location for detection
+import time  # Used to time each operation
+from typing import Callable, Dict, List, Optional  # Used for typing
+
+import numpy as np  # Used to calculate percentiles
+
+from mappingUtils import x11_windows  # Used to time the X11 window tracker backend
+from mappingUtils.image_processing import ImageProcessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Window managers that set _NET_CLIENT_LIST and _NET_ACTIVE_WINDOW, which wmctrl and get_screenshot need
+WINDOW_MANAGERS = [['openbox'], ['fluxbox'], ['icewm'], ['xfwm4'], ['metacity'], ['matchbox-window-manager']]
+
+# (title, tiles) of the synthetic call windows
+WINDOWS = [('#general | BeeWare - Discord', 9), ('Zoom Meeting', 4), ('Team Standup | Microsoft Teams', 16)]
+
+
+def distribution(samples: List[float]) -> Dict[str, float]:
+    """
+    Returns the mean, p50, p95, p99 and max of samples in milliseconds
+    """
+    values = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'mean': values.mean(), 'p50': p50, 'p95': p95, 'p99': p99, 'max': values.max()}
+
+
+def wait_for(check: Callable[[], bool], timeout: float, what: str, interval: float = 0.05):
+    """
+    Polls check every interval seconds until it returns True
+    :raises TimeoutError: when timeout seconds pass first
+    """
+    end = time.perf_counter() + timeout
+    while not check():
+        if time.perf_counter() > end:
+            raise TimeoutError('Timed out waiting for ' + what)
+        time.sleep(interval)
+
+
+def free_display() -> str:
+    """
+    Returns the first display number without an X server socket
+    """
+    number = 99
+    while os.path.exists('/tmp/.X11-unix/X{0}'.format(number)) or os.path.exists('/tmp/.X{0}-lock'.format(number)):
+        number += 1
+    return ':{0}'.format(number)
+
+
+class HeadlessDisplay:
+    """
+    Starts Xvfb with a window manager and opens synthetic call windows on it.
+    Attributes
+    ----------
+    display : str
+        X display the windows are opened on
+    processes : list
+        Started processes, stopped in reverse order by stop
+    """
+    display: str
+    processes: List[subprocess.Popen]
+
+    def __init__(self, display: Optional[str] = None, size: str = '1920x1080x24'):
+        self.display = display
+        self.size = size
+        self.processes = []
+
+    def start(self):
+        """
+        Starts Xvfb and a window manager unless an existing display was given
+        """
+        if self.display is None:
+            missing = [program for program in ('Xvfb', 'wmctrl', 'xprop') if shutil.which(program) is None]
+            if missing:
+                raise SystemExit('Missing programs needed for the benchmark: ' + ', '.join(missing))
+            self.display = free_display()
+            self.processes.append(subprocess.Popen(['Xvfb', self.display, '-screen', '0', self.size, '-nolisten', 'tcp'],
+                                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            wait_for(lambda: os.path.exists('/tmp/.X11-unix/X' + self.display[1:]), 10, 'Xvfb to start')
+            window_manager = next((command for command in WINDOW_MANAGERS if shutil.which(command[0])), None)
+            if window_manager is None:
+                self.stop()
+                raise SystemExit('No window manager found, install one of: ' +
+                                 ', '.join(command[0] for command in WINDOW_MANAGERS))
+            self.processes.append(subprocess.Popen(window_manager, env=self.env(), stdout=subprocess.DEVNULL,
+                                                   stderr=subprocess.DEVNULL))
+            wait_for(lambda: '_NET_SUPPORTING_WM_CHECK(WINDOW)' in subprocess.run(
+                ['xprop', '-root', '_NET_SUPPORTING_WM_CHECK'], env=self.env(), capture_output=True,
+                text=True).stdout, 10, 'the window manager to start')
+        os.environ['DISPLAY'] = self.display
+
+    def env(self) -> Dict[str, str]:
+        """
+        Returns the environment of X clients on the display
+        """
+        return dict(os.environ, DISPLAY=self.display)
+
+    def open_window(self, title: str, tiles: int, index: int):
+        """
+        Opens a synthetic call window and waits for the window manager to list it
+        :param title: Window title
+        :param tiles: Number of camera tiles
+        :param index: Position of the window, used to offset it from the others
+        """
+        # pylint: disable=import-outside-toplevel
+        import wmctrl
+        self.processes.append(subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.synthetic_window', '--title', title, '--tiles', str(tiles),
+             '--x', str(40 * index), '--y', str(30 * index), '--wm-class', 'callclient{0}'.format(index)],
+            cwd=ROOT, env=self.env()))
+        wait_for(lambda: wmctrl.Window.by_name(title), 10, 'window ' + title)
+
+    def stop(self):
+        """
+        Closes the windows and stops the window manager and Xvfb
+        """
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in reversed(self.processes):
+            try:
+                process.wait(5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+
+
+def bench(iterations: int, image_proc: ImageProcessing) -> Dict[str, List[float]]:
+    """
+    Times every operation of the Linux window path on the open synthetic windows through the window backend
+    image_proc is set to use
+    :return: dict of operation name to samples in seconds
+    """
+    samples = {name: [] for name in ('get_windows', 'activate', 'get_screenshot', 'get_exe_name', 'get_camera_pos')}
+    for iteration in range(iterations):
+        for title, tiles in WINDOWS:
+            start = time.perf_counter()
+            image_proc.get_windows()
+            samples['get_windows'].append(time.perf_counter() - start)
+
+            # Activates another window first so every activation actually changes the active window
+            other = WINDOWS[(WINDOWS.index((title, tiles)) + 1) % len(WINDOWS)][0]
+            wait_for(image_proc.activate_window(other), 5, 'activation', 0.001)
+            start = time.perf_counter()
+            wait_for(image_proc.activate_window(title), 5, 'activation', 0.001)
+            samples['activate'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            image_proc.get_screenshot(title)
+            samples['get_screenshot'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            image_proc.get_exe_name(title)
+            samples['get_exe_name'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            cameras = image_proc.get_camera_pos(title)
+            samples['get_camera_pos'].append(time.perf_counter() - start)
+            if iteration == 0 and len(cameras) != tiles:
+                print('{0}: detected {1} of {2} tiles'.format(title, len(cameras), tiles))
+    return samples
+
+
+def main():
+    """
+    Starts the display, opens the windows, runs the benchmark through every available window backend and prints the
+    latency distribution of every operation
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the Linux window path on a headless display')
+    parser.add_argument('--iterations', type=int, default=20, help='Rounds over every synthetic window')
+    parser.add_argument('--display', default=None, help='Existing X display to use instead of starting Xvfb')
+    args = parser.parse_args()
+
+    display = HeadlessDisplay(args.display)
+    display.start()
+    results = {}
+    try:
+        for index, (title, tiles) in enumerate(WINDOWS):
+            display.open_window(title, tiles, index)
+        tracker = x11_windows.connect()
+        if tracker is None:
+            print('python-xlib is not installed, only timing wmctrl')
+        # Every backend is forced on its own ImageProcessing so neither run falls back to the other
+        for backend, window_tracker in (('x11', tracker), ('wmctrl', None)):
+            if backend == 'x11' and tracker is None:
+                continue
+            with tempfile.TemporaryDirectory() as save_location:
+                image_proc = ImageProcessing(save_location)
+                image_proc.window_tracker = window_tracker
+                results[backend] = bench(args.iterations, image_proc)
+        if tracker is not None:
+            tracker.stop()
+    finally:
+        display.stop()
+
+    print('{0:>7} {1:>15} {2:>7} {3:>9} {4:>9} {5:>9} {6:>9} {7:>9}'.format(
+        'backend', 'operation', 'samples', 'mean ms', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms'))
+    for backend, samples in results.items():
+        for name, values in samples.items():
+            result = distribution(values)
+            print('{0:>7} {1:>15} {2:>7} {3:>9.2f} {4:>9.2f} {5:>9.2f} {6:>9.2f} {7:>9.2f}'.format(
+                backend, name, len(values), result['mean'], result['p50'], result['p95'], result['p99'],
+                result['max']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measures press-to-applied latency of a remap without OBS running.
+Every iteration runs detection on a synthetic gallery frame, builds the payload the same way map_cameras does,
+sends it with Server.send_command and waits for PluginStandIn to apply it.
+
+Run with: python -m benchmarks.bench_remap_latency
+"""
+import argparse  # Used to read benchmark options
+import tempfile  # Used as the save location for detection
+import time  # Used to time each remap
+from typing import Dict, List  # Used for typing
+
+import numpy as np  # Used to calculate percentiles
+
+from tests.plugin_standin import PluginStandIn
+from tests.synthetic_frames import gallery_frame
+from mappingUtils import obs_plugin_server
+from mappingUtils.image_processing import ImageProcessing
+
+GALLERY_SIZES = [1, 2, 4, 9, 16, 25, 36, 49]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """
+    Returns p50, p95 and p99 of samples in milliseconds
+    """
+    values = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return {'p50': values[0], 'p95': values[1], 'p99': values[2]}
+
+
+def bench_gallery(tiles: int, iterations: int, image_proc: ImageProcessing, server: obs_plugin_server.Server,
+                  standin: PluginStandIn) -> Dict[str, float]:
+    """
+    Benchmarks remaps of one gallery size
+    :return: dict of latency percentiles and messages per second
+    """
+    frame, _ = gallery_frame(tiles, seed=tiles)
+    latencies = []
+    message = ''
+    for _ in range(iterations):
+        expected = len(standin.timings) + 1
+        start = time.perf_counter()
+        cams = image_proc.process_frame(frame, save_crops=False)
+        for index, cam in enumerate(cams.values()):
+            cam[1] = 'Person ' + str(index)
+        message = obs_plugin_server.crop_command('Linux', 'Call', obs_plugin_server.build_camera_crops(cams, -40))
+        server.send_command(message)
+        if not standin.wait_for(expected):
+            raise TimeoutError('Plugin stand-in did not receive the remap')
+        latencies.append(standin.timings[-1][1] - start)
+    # Sends the last payload back to back to measure how many messages the plugin side can take
+    first = len(standin.timings)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        server.send_command(message)
+    standin.wait_for(first + iterations)
+    received = len(standin.timings) - first
+    elapsed = standin.timings[-1][1] - start
+    result = percentiles(latencies)
+    result['tiles'] = len(cams)
+    result['msgs_per_s'] = received / elapsed if elapsed > 0 else 0.0
+    result['bytes'] = len(message)
+    return result
+
+
+def main():
+    """
+    Runs the benchmark for every gallery size and prints a table of the results
+    """
+    parser = argparse.ArgumentParser(description='Benchmark remap latency against a local plugin stand-in')
+    parser.add_argument('--iterations', type=int, default=100, help='Remaps per gallery size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=GALLERY_SIZES, help='Gallery sizes to benchmark')
+    args = parser.parse_args()
+
+    standin = PluginStandIn(port=0)
+    standin.start()
+    server = obs_plugin_server.Server(standin.port, targets=[('127.0.0.1', standin.port)])
+    server.start_server()
+    print('{0:>6} {1:>8} {2:>9} {3:>9} {4:>9} {5:>10} {6:>7}'.format(
+        'tiles', 'detected', 'p50 ms', 'p95 ms', 'p99 ms', 'msgs/s', 'bytes'))
+    with tempfile.TemporaryDirectory() as save_location:
+        image_proc = ImageProcessing(save_location)
+        for tiles in args.sizes:
+            result = bench_gallery(tiles, args.iterations, image_proc, server, standin)
+            print('{0:>6} {1:>8} {2:>9.2f} {3:>9.2f} {4:>9.2f} {5:>10.0f} {6:>7}'.format(
+                tiles, result['tiles'], result['p50'], result['p95'], result['p99'], result['msgs_per_s'],
+                result['bytes']))
+    server.stop_server()
+    standin.stop()
+    if standin.errors:
+        print('{0} messages could not be decoded'.format(len(standin.errors)))
+
+
+if __name__ == '__main__':
+    main()
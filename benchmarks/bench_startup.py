@@ -0,0 +1,87 @@
+"""
+Measures how long OBS Call Mapper takes to get to the point where the main window can be shown.
+Every run is a fresh interpreter. Cold runs use an empty bytecode cache and warm runs reuse one,
+so both first launch after an install or update and everyday launches are tracked.
+
+Run with: python -m benchmarks.bench_startup
+"""
+import argparse  # Used to read benchmark options
+import json  # Used to read results from the child interpreter
+import os  # Used to set up the child environment
+import statistics  # Used to summarise the runs
+import subprocess  # Used to start fresh interpreters
+import sys  # Used to find the running interpreter
+import tempfile  # Used for bytecode caches and the save location
+import time  # Used to time the whole launch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs the synchronous part of ObsMapper.startup without creating any widgets
+STARTUP_SCRIPT = '''
+import json, os, sys, time
+start = time.perf_counter()
+try:
+    import toga
+    import obsmapper
+except ImportError:
+    pass
+from mappingUtils import image_processing, layout_cache, preset_handler, obs_plugin_server
+imported = time.perf_counter()
+data_path = sys.argv[1]
+cache = layout_cache.LayoutCache(os.path.join(data_path, 'layout_cache.json'))
+image_proc = image_processing.ImageProcessing(data_path, False)
+presets = preset_handler.PresetHandler()
+presets.load_json(os.path.join('tests', 'presets.json'), validate=False)
+presets.get_preset_names()
+ready = time.perf_counter()
+modules = ['cv2', 'numpy', 'PIL.Image', 'mss', 'jsonschema', 'toga']
+print(json.dumps({'import': imported - start, 'ready': ready - start,
+                  'loaded': [name for name in modules if name in sys.modules]}))
+'''
+
+
+def run_once(pycache: str) -> dict:
+    """
+    Starts a fresh interpreter and returns its startup timings
+    :param pycache: Bytecode cache folder for the interpreter
+    :return: dict of timings in seconds
+    """
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    with tempfile.TemporaryDirectory() as data_path:
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, data_path], cwd=ROOT, env=env, check=True,
+                                capture_output=True, text=True).stdout
+        total = time.perf_counter() - start
+    result = json.loads(output.strip().splitlines()[-1])
+    result['total'] = total
+    return result
+
+
+def main():
+    """
+    Runs cold and warm launches and prints the median timings
+    """
+    parser = argparse.ArgumentParser(description='Benchmark OBS Call Mapper startup')
+    parser.add_argument('--runs', type=int, default=5, help='Launches per mode')
+    args = parser.parse_args()
+
+    results = {'cold': [], 'warm': []}
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as pycache:
+            results['cold'].append(run_once(pycache))
+    with tempfile.TemporaryDirectory() as pycache:
+        run_once(pycache)
+        for _ in range(args.runs):
+            results['warm'].append(run_once(pycache))
+
+    print('{0:>5} {1:>10} {2:>10} {3:>10}  {4}'.format('mode', 'import ms', 'ready ms', 'total ms', 'heavy modules'))
+    for mode, runs in results.items():
+        print('{0:>5} {1:>10.1f} {2:>10.1f} {3:>10.1f}  {4}'.format(
+            mode, statistics.median(run['import'] for run in runs) * 1000,
+            statistics.median(run['ready'] for run in runs) * 1000,
+            statistics.median(run['total'] for run in runs) * 1000, ', '.join(runs[-1]['loaded']) or 'none'))
+
+
+if __name__ == '__main__':
+    main()
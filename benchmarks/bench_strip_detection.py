@@ -0,0 +1,71 @@
+"""
+Measures detection time of very large call windows with strip parallel filtering against a single pass.
+Every frame of the corpus is detected once per worker count and the rects must match the single pass exactly.
+
+Run with: python -m benchmarks.bench_strip_detection
+"""
+import argparse  # Used to read benchmark options
+import os  # Used to find the number of cores
+import tempfile  # Used as the save location for detection
+import time  # Used to time detection
+
+import cv2  # Used to load the test screenshot
+
+from tests.synthetic_frames import gallery_frame
+from mappingUtils.image_processing import ImageProcessing
+
+# (tiles, width, height) of the synthetic frames, 4K, 8K and a dual monitor ultrawide
+CORPUS = [(9, 3840, 2160), (25, 3840, 2160), (9, 7680, 4320), (49, 7680, 4320), (12, 10240, 2880)]
+
+
+def detect(image_proc: ImageProcessing, frame, iterations: int):
+    """
+    Detects the cameras of a frame several times
+    :return: (best time in seconds, detected rects)
+    """
+    best = None
+    rects = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        cams = image_proc.process_frame(frame, save_crops=False)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        rects = [cam[0] for cam in cams.values()]
+    return best, rects
+
+
+def main():
+    """
+    Runs the benchmark for every frame of the corpus and prints a table of the results
+    """
+    parser = argparse.ArgumentParser(description='Benchmark strip parallel detection of large call windows')
+    parser.add_argument('--iterations', type=int, default=5, help='Detections per frame and worker count')
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, 4, os.cpu_count() or 1}),
+                        help='Worker counts to benchmark')
+    args = parser.parse_args()
+
+    frames = [('discord_test.png', cv2.imread(os.path.join('tests', 'discord_test.png')))]
+    frames += [('{0} tiles {1}x{2}'.format(tiles, width, height), gallery_frame(tiles, width, height, seed=tiles)[0])
+               for tiles, width, height in CORPUS]
+    print('{0:>26} {1:>8} {2:>9} {3:>8} {4:>6}'.format('frame', 'workers', 'ms', 'speedup', 'match'))
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as save_location:
+        image_proc = ImageProcessing(save_location)
+        image_proc.strip_min_pixels = 0
+        for name, frame in frames:
+            if frame is None:
+                continue
+            image_proc.strip_workers = 1
+            single, expected = detect(image_proc, frame, args.iterations)
+            for workers in args.workers:
+                image_proc.strip_workers = workers
+                elapsed, rects = detect(image_proc, frame, args.iterations)
+                mismatches += rects != expected
+                print('{0:>26} {1:>8} {2:>9.2f} {3:>8.2f} {4:>6}'.format(
+                    name, workers, elapsed * 1000, single / elapsed, 'yes' if rects == expected else 'NO'))
+    if mismatches:
+        raise SystemExit('{0} strip parallel detections did not match the single pass'.format(mismatches))
+
+
+if __name__ == '__main__':
+    main()
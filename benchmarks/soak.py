@@ -0,0 +1,128 @@
+"""
+Soak test of the capture, detect and map cycle for the length of a show.
+Thousands of cycles are run against synthetic gallery frames of changing sizes. Every cycle copies a frame as a
+capture would, detects its cameras with crops written, binds people and sends the crops to PluginStandIn.
+Traced Python memory and the process RSS are sampled over time and the run fails when either grows past its
+budget after the warm up, or when a detection returns cameras left over from an earlier one.
+
+Run with: python -m benchmarks.soak
+"""
+import argparse  # Used to read soak options
+import sys  # Used to fail the run
+import tempfile  # Used as the save location for detection
+import time  # Used to time the run
+import tracemalloc  # Used to trace Python and NumPy allocations
+from typing import Dict, List, Tuple  # Used for typing
+
+import psutil  # Used to read the RSS of the process
+
+from tests.plugin_standin import PluginStandIn
+from tests.synthetic_frames import gallery_frame
+from mappingUtils import obs_plugin_server
+from mappingUtils.image_processing import ImageProcessing
+from mappingUtils.layout_templates import TemplateLibrary
+
+GALLERY_SIZES = [9, 4, 16, 1, 25, 2, 6]
+
+
+def soak(cycles: int, image_proc: ImageProcessing, server: obs_plugin_server.Server, standin: PluginStandIn,
+         width: int = 1280, height: int = 720, sample_every: int = 100, warmup: int = 200) -> Dict[str, object]:
+    """
+    Runs capture, detect and map cycles and samples memory every sample_every cycles
+    :param cycles: Number of cycles
+    :param width: Width of the synthetic frames
+    :param height: Height of the synthetic frames
+    :param sample_every: Cycles between memory samples
+    :param warmup: Cycles run before the baseline sample is taken, so caches and pools are filled
+    :return: dict with the samples as (cycle, seconds, traced bytes, rss bytes), the traced and rss growth in bytes
+             since the baseline, the number of stale detections and the run time
+    """
+    frames = {tiles: gallery_frame(tiles, width, height, seed=tiles) for tiles in GALLERY_SIZES}
+    process = psutil.Process()
+    samples: List[Tuple[int, float, int, int]] = []
+    baseline = None
+    stale = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        for cycle in range(1, cycles + 1):
+            frame, rects = frames[GALLERY_SIZES[cycle % len(GALLERY_SIZES)]]
+            cams = image_proc.process_frame(frame.copy())
+            if len(cams) != len(rects):
+                stale += 1
+            for index, cam in enumerate(cams.values()):
+                cam[1] = 'Person ' + str(index)
+            expected = len(standin.timings) + 1
+            server.send_command(obs_plugin_server.crop_command(
+                'Linux', 'Call', obs_plugin_server.build_camera_crops(cams)))
+            if not standin.wait_for(expected):
+                raise TimeoutError('Plugin stand-in did not receive the remap')
+            if cycle % sample_every == 0 or cycle == cycles:
+                standin.reset()
+                sample = (cycle, time.perf_counter() - start, tracemalloc.get_traced_memory()[0],
+                          process.memory_info().rss)
+                samples.append(sample)
+                if baseline is None and cycle >= warmup:
+                    baseline = sample
+    finally:
+        tracemalloc.stop()
+    baseline = baseline or samples[0]
+    return {
+        'cycles': cycles,
+        'samples': samples,
+        'traced_growth': samples[-1][2] - baseline[2],
+        'rss_growth': samples[-1][3] - baseline[3],
+        'stale': stale,
+        'elapsed': time.perf_counter() - start
+    }
+
+
+def main():
+    """
+    Runs the soak test, prints the memory samples and exits with an error when a budget is exceeded
+    """
+    parser = argparse.ArgumentParser(description='Soak test capture, detect and map cycles for memory growth')
+    parser.add_argument('--cycles', type=int, default=5000, help='Capture, detect and map cycles')
+    parser.add_argument('--sample-every', type=int, default=250, help='Cycles between memory samples')
+    parser.add_argument('--warmup', type=int, default=500, help='Cycles run before the baseline sample')
+    parser.add_argument('--width', type=int, default=1280, help='Width of the synthetic frames')
+    parser.add_argument('--height', type=int, default=720, help='Height of the synthetic frames')
+    parser.add_argument('--traced-budget', type=float, default=4, help='Traced memory growth allowed in MB')
+    parser.add_argument('--rss-budget', type=float, default=32, help='RSS growth allowed in MB')
+    parser.add_argument('--no-templates', action='store_true', help='Always run the full detector')
+    args = parser.parse_args()
+
+    standin = PluginStandIn(port=0)
+    standin.start()
+    server = obs_plugin_server.Server(standin.port, targets=[('127.0.0.1', standin.port)])
+    server.start_server()
+    try:
+        with tempfile.TemporaryDirectory() as save_location:
+            image_proc = ImageProcessing(save_location)
+            if not args.no_templates:
+                image_proc.templates = TemplateLibrary()
+            result = soak(args.cycles, image_proc, server, standin, args.width, args.height, args.sample_every,
+                          args.warmup)
+    finally:
+        server.stop_server()
+        standin.stop()
+
+    print('{0:>7} {1:>9} {2:>11} {3:>9}'.format('cycle', 'seconds', 'traced MB', 'rss MB'))
+    for cycle, seconds, traced, rss in result['samples']:
+        print('{0:>7} {1:>9.1f} {2:>11.2f} {3:>9.1f}'.format(cycle, seconds, traced / 2 ** 20, rss / 2 ** 20))
+    traced_growth, rss_growth = result['traced_growth'] / 2 ** 20, result['rss_growth'] / 2 ** 20
+    print('traced growth {0:.2f} MB, rss growth {1:.1f} MB, {2} stale detections, {3:.0f} cycles/s'.format(
+        traced_growth, rss_growth, result['stale'], result['cycles'] / result['elapsed']))
+    failures = []
+    if traced_growth > args.traced_budget:
+        failures.append('traced memory grew {0:.2f} MB, budget {1} MB'.format(traced_growth, args.traced_budget))
+    if rss_growth > args.rss_budget:
+        failures.append('rss grew {0:.1f} MB, budget {1} MB'.format(rss_growth, args.rss_budget))
+    if result['stale']:
+        failures.append('{0} detections returned stale cameras'.format(result['stale']))
+    if failures:
+        sys.exit('FAILED: ' + '; '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Opens a window that looks like a call gallery, a black background with a grid of coloured camera tiles,
+so the Linux capture path can be exercised without a real call client.
+
+Run with: python -m benchmarks.synthetic_window --title "General" --tiles 9
+"""
+import argparse  # Used to read the window options
+import tkinter  # Used to open the window
+
+from tests.synthetic_frames import gallery_rects
+
+TILE_COLOURS = ['#3a6ea5', '#c05746', '#6a994e', '#f2a541', '#8e7dbe', '#4ecdc4', '#d4a5a5', '#9a8c98']
+
+
+def main():
+    """
+    Opens the window and keeps it open until it is closed or the process is killed
+    """
+    parser = argparse.ArgumentParser(description='Open a synthetic call window')
+    parser.add_argument('--title', required=True, help='Window title')
+    parser.add_argument('--tiles', type=int, default=9, help='Number of camera tiles')
+    parser.add_argument('--width', type=int, default=1280, help='Window width')
+    parser.add_argument('--height', type=int, default=720, help='Window height')
+    parser.add_argument('--x', type=int, default=0, help='Window x position')
+    parser.add_argument('--y', type=int, default=0, help='Window y position')
+    parser.add_argument('--wm-class', default='callclient', help='Window class, used by get_exe_name as the exe')
+    args = parser.parse_args()
+
+    root = tkinter.Tk(className=args.wm_class)
+    root.title(args.title)
+    root.geometry('{0}x{1}+{2}+{3}'.format(args.width, args.height, args.x, args.y))
+    canvas = tkinter.Canvas(root, width=args.width, height=args.height, background='black', highlightthickness=0)
+    canvas.pack(fill=tkinter.BOTH, expand=True)
+    for index, (x, y, width, height) in enumerate(gallery_rects(args.tiles, args.width, args.height)):
+        canvas.create_rectangle(x, y, x + width - 1, y + height - 1, width=0,
+                                fill=TILE_COLOURS[index % len(TILE_COLOURS)])
+        canvas.create_text(x + width // 2, y + height // 2, text='Person {0}'.format(index), fill='white')
+    root.mainloop()
+
+
+if __name__ == '__main__':
+    main()
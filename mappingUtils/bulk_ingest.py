@@ -0,0 +1,185 @@
+"""
+Detects the cameras of many call screenshots at once and writes one JSON layout per screenshot.
+
+Used for pre-show prep and on macOS where screenshots are the only way to get a call window. Screenshots are
+spread over a pool of processes that each keep their own ImageProcessing, so every core runs detection.
+"""
+from __future__ import annotations  # Keeps annotations from being evaluated
+
+import argparse  # Used to run ingestion from the command line
+import glob  # Used to expand screenshot patterns
+import json  # Used to write the layouts
+import os  # Used for screenshot and layout paths
+import tempfile  # Used to give every worker its own scratch folder
+import time  # Used to time detection and report throughput
+from concurrent.futures import ProcessPoolExecutor  # Used to run detection on every core
+from typing import Dict, Iterable, List, Optional  # Used for typing
+
+SCREENSHOT_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# ImageProcessing and CpuGovernor of the current worker process, created once by _start_worker
+_worker_image_proc = None
+_worker_governor = None
+
+
+def find_screenshots(patterns: Iterable[str]) -> List[str]:
+    """
+    Expands folders and glob patterns into a sorted list of screenshot files
+    :param patterns: Folders, files or glob patterns
+    :return: list of screenshot paths without duplicates
+    """
+    screenshots = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            paths = glob.glob(pattern)
+        for path in paths:
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SCREENSHOT_EXTENSIONS:
+                screenshots.add(os.path.abspath(path))
+    return sorted(screenshots)
+
+
+def layout_paths(screenshots: List[str], output_dir: str) -> Dict[str, str]:
+    """
+    Returns the file the layout of every screenshot is written to. Layouts are named after the screenshot, screenshots
+    whose names clash, like a/call.png and b/call.jpg, are named after their path relative to the folder all
+    screenshots are in and a counter is added if that still clashes, so no layout overwrites another
+    :param screenshots: Paths of the screenshots
+    :param output_dir: Folder layouts are written to
+    :return: dict of screenshot path to the path of its JSON layout
+    """
+    stems = [os.path.splitext(os.path.basename(screenshot))[0] for screenshot in screenshots]
+    root = os.path.commonpath([os.path.dirname(screenshot) for screenshot in screenshots]) if screenshots else ''
+    names = {}
+    for screenshot, stem in zip(screenshots, stems):
+        if stems.count(stem) > 1:
+            stem = os.path.relpath(screenshot, root).replace(os.sep, '_').replace('.', '_')
+        name = stem
+        counter = 1
+        while name in names.values():
+            counter += 1
+            name = '{stem}-{counter}'.format(stem=stem, counter=counter)
+        names[screenshot] = name
+    return {screenshot: os.path.join(output_dir, name + '.json') for screenshot, name in names.items()}
+
+
+def _start_worker(scratch_location: str, cpu_budget: Optional[float]):
+    """
+    Creates the ImageProcessing of a worker process in its own scratch folder so workers never share camera images
+    :param scratch_location: Folder the scratch folders of all workers are created in
+    :param cpu_budget: CPU seconds per second this worker may use or None for no limit
+    """
+    # pylint: disable=import-outside-toplevel,global-statement
+    from mappingUtils.cpu_governor import CpuGovernor
+    from mappingUtils.image_processing import ImageProcessing
+
+    global _worker_image_proc, _worker_governor
+    _worker_image_proc = ImageProcessing(tempfile.mkdtemp(dir=scratch_location))
+    # Every process already has a core to itself so OpenCV's own threads would only compete with the other workers
+    governor = CpuGovernor(cv_threads=1, budget=cpu_budget or 0.0)
+    governor.apply(_worker_image_proc, whole_process=True)
+    if cpu_budget:
+        _worker_governor = governor
+        _worker_image_proc.governor = governor
+
+
+def detect_layout(screenshot: str, output_path: str) -> Dict[str, object]:
+    """
+    Detects the cameras in a screenshot with get_camera_pos and writes the layout next to the others
+    :param screenshot: Path of the screenshot
+    :param output_path: File the layout is written to, see layout_paths
+    :return: the layout that was written
+    """
+    image_proc = _worker_image_proc
+    start = time.perf_counter()
+    cameras = image_proc.get_camera_pos(None, screenshot=screenshot)
+    x, y, x1, y1 = image_proc.window_geometry
+    layout = {
+        'screenshot': screenshot,
+        'size': [x1 - x, y1 - y],
+        'mask': image_proc.mask_hash,
+        'cameras': [{'rect': [int(value) for value in camera[0]], 'name': camera[1]} for camera in cameras.values()],
+        'detect_time': time.perf_counter() - start
+    }
+    with open(output_path, 'w', encoding='UTF-8') as layout_file:
+        json.dump(layout, layout_file, indent=4)
+    if _worker_governor is not None:
+        _worker_governor.wait()
+    return layout
+
+
+def cpu_time() -> float:
+    """
+    Returns the CPU time used by this process and its finished worker processes
+    """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def ingest(screenshots: List[str], output_dir: str, workers: Optional[int] = None,
+           cpu_budget: Optional[float] = None) -> Dict[str, object]:
+    """
+    Detects the cameras of every screenshot across a pool of processes at lowered priority
+    :param screenshots: Paths of the screenshots
+    :param output_dir: Folder the layouts are written to
+    :param workers: Number of processes, defaults to the number of cores
+    :param cpu_budget: CPU seconds per second shared by all workers or None for no limit
+    :return: dict of ingestion stats with the errors of screenshots that failed
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(screenshots) or 1))
+    output_paths = layout_paths(screenshots, output_dir)
+    errors = {}
+    detect_times = []
+    cpu_start = cpu_time()
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as scratch_location:
+        with ProcessPoolExecutor(workers, initializer=_start_worker,
+                                 initargs=(scratch_location, cpu_budget / workers if cpu_budget else None)) as pool:
+            futures = {screenshot: pool.submit(detect_layout, screenshot, output_paths[screenshot])
+                       for screenshot in screenshots}
+            for screenshot, future in futures.items():
+                try:
+                    detect_times.append(future.result()['detect_time'])
+                except Exception as error:  # pylint: disable=broad-except
+                    errors[screenshot] = str(error)
+    elapsed = time.perf_counter() - start
+    cpu_used = cpu_time() - cpu_start
+    return {
+        'screenshots': len(screenshots),
+        'layouts': len(detect_times),
+        'workers': workers,
+        'elapsed': elapsed,
+        'per_second': len(detect_times) / elapsed if elapsed > 0 else 0.0,
+        'mean_detect': sum(detect_times) / len(detect_times) if detect_times else 0.0,
+        'cpu_per_second': cpu_used / elapsed if elapsed > 0 else 0.0,
+        'errors': errors
+    }
+
+
+def main():
+    """
+    Ingests screenshots from the command line and prints the throughput
+    """
+    parser = argparse.ArgumentParser(description='Detect the cameras of many call screenshots at once')
+    parser.add_argument('screenshots', nargs='+', help='Screenshot files, folders or glob patterns')
+    parser.add_argument('-o', '--output', default='layouts', help='Folder the JSON layouts are written to')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Number of processes, defaults to every core')
+    parser.add_argument('--cpu-budget', type=float, default=None,
+                        help='CPU seconds per second all workers may use together, for example 1.5')
+    args = parser.parse_args()
+
+    screenshots = find_screenshots(args.screenshots)
+    if not screenshots:
+        parser.error('no screenshots found')
+    stats = ingest(screenshots, args.output, args.workers, args.cpu_budget)
+    for screenshot, error in stats.pop('errors').items():
+        print('failed {screenshot}: {error}'.format(screenshot=screenshot, error=error))
+    for key, value in stats.items():
+        print('{key}: {value}'.format(key=key, value=value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Array backed layout of the cameras in a call window, shared by detection, the user interface and the obs sender.
+"""
+from __future__ import annotations  # Keeps numpy annotations from importing it
+
+from typing import Dict, List, Optional, Sequence, Tuple, Union  # Used for typing
+
+from mappingUtils.lazy_import import lazy_import  # Used to import heavy modules on first use
+
+np = lazy_import('numpy')  # Used to store and transform every camera at once
+
+# Fields of every camera. person is the index of the bound person in people or -1 when nobody is bound
+CAMERA_FIELDS = [('x', '<i4'), ('y', '<i4'), ('width', '<i4'), ('height', '<i4'), ('id', '<i4'), ('person', '<i2')]
+
+# Decimal places of layout relative coordinates, a tenth of a pixel on an 8K window
+RELATIVE_PLACES = 5
+
+
+class CameraLayout:
+    """
+    Cameras of one detection stored in a NumPy structured array, one row per camera, with the rect, an id that
+    stays with the camera through transforms and the index of the person bound to it.
+    Attributes
+    ----------
+    cameras : np.ndarray
+        Structured array of cameras with the fields in CAMERA_FIELDS. An empty layout only creates it on first use
+        so empty layouts made at startup do not import NumPy
+    people : list
+        People cameras can be bound to, normally the people of the preset
+    paths : list
+        Image of every camera for the user interface, in the same order as cameras
+    """
+    people: List[str]
+    paths: List[str]
+
+    def __init__(self, rects: Sequence[Sequence[int]] = (), people: Optional[Sequence[str]] = None,
+                 paths: Optional[Sequence[str]] = None):
+        self._cameras = None
+        if len(rects) > 0:
+            self._cameras = np.zeros(len(rects), CAMERA_FIELDS)
+            rect_array = np.asarray(rects, np.int32).reshape(-1, 4)
+            for column, field in enumerate(('x', 'y', 'width', 'height')):
+                self._cameras[field] = rect_array[:, column]
+            self._cameras['id'] = np.arange(len(rects))
+            self._cameras['person'] = -1
+        self.people = list(people or [])
+        self.paths = list(paths) if paths is not None else [''] * len(rects)
+
+    @property
+    def cameras(self) -> np.ndarray:
+        """
+        Structured array of cameras with the fields in CAMERA_FIELDS
+        """
+        if self._cameras is None:
+            self._cameras = np.zeros(0, CAMERA_FIELDS)
+        return self._cameras
+
+    @cameras.setter
+    def cameras(self, cameras: np.ndarray):
+        self._cameras = cameras
+
+    @classmethod
+    def from_cameras(cls, cameras: Dict[str, List[Union[list, str]]],
+                     people: Optional[Sequence[str]] = None) -> CameraLayout:
+        """
+        Creates a layout from a cameras dict in the format of ImageProcessing.cameras.
+        Names that are not in people are added to the end of people
+        :param cameras: dict of image path to [rect, name]
+        :param people: People cameras can be bound to
+        :return: CameraLayout
+        """
+        layout = cls([cam[0] for cam in cameras.values()], people, list(cameras))
+        for index, cam in enumerate(cameras.values()):
+            if cam[1]:
+                layout.bind(index, cam[1])
+        return layout
+
+    def to_cameras(self) -> Dict[str, List[Union[list, str]]]:
+        """
+        Returns the cameras as a dict in the format of ImageProcessing.cameras
+        :return: dict of image path to [rect, name]
+        """
+        return {path: [rect, name] for path, rect, name in zip(self.paths, self.rect_tuples(), self.names())}
+
+    def __len__(self) -> int:
+        return len(self._cameras) if self._cameras is not None else 0
+
+    def append(self, rect: Sequence[int], path: str = '', person: str = '') -> int:
+        """
+        Adds a camera after the last one with the next free id
+        :param rect: (x, y, width, height) of the camera
+        :param path: Image of the camera
+        :param person: Name of the person bound to the camera or an empty string
+        :return: position of the new camera
+        """
+        camera = np.zeros(1, CAMERA_FIELDS)
+        for field, value in zip(('x', 'y', 'width', 'height'), rect):
+            camera[field] = value
+        camera['id'] = int(self.cameras['id'].max()) + 1 if len(self) > 0 else 0
+        camera['person'] = -1
+        self.cameras = np.concatenate([self.cameras, camera])
+        self.paths.append(path)
+        self.bind(len(self.cameras) - 1, person)
+        return len(self.cameras) - 1
+
+    def index(self, path: str) -> int:
+        """
+        Returns the position of the camera with an image
+        :raises ValueError: If no camera has the image
+        """
+        return self.paths.index(path)
+
+    def __copy(self, cameras: np.ndarray) -> CameraLayout:
+        """
+        Returns a layout sharing people and paths with this one holding the given cameras
+        """
+        layout = CameraLayout(people=self.people)
+        layout.cameras = cameras
+        layout.paths = list(self.paths)
+        return layout
+
+    @property
+    def rects(self) -> np.ndarray:
+        """
+        (count, 4) int32 array of the x, y, width and height of every camera
+        """
+        rects = np.empty((len(self.cameras), 4), np.int32)
+        for column, field in enumerate(('x', 'y', 'width', 'height')):
+            rects[:, column] = self.cameras[field]
+        return rects
+
+    def rect_tuples(self) -> List[Tuple[int, int, int, int]]:
+        """
+        Returns the rect of every camera as a tuple of ints
+        """
+        if len(self) == 0:
+            return []
+        return [tuple(rect) for rect in self.rects.tolist()]
+
+    def names(self) -> List[str]:
+        """
+        Returns the name of the person bound to every camera or an empty string
+        """
+        if len(self) == 0:
+            return []
+        return [self.people[person] if person >= 0 else '' for person in self.cameras['person'].tolist()]
+
+    def bind(self, index: int, person: str):
+        """
+        Binds a person to a camera. A person not in people is added to it
+        :param index: Position of the camera
+        :param person: Name of the person or an empty string to unbind the camera
+        """
+        if not person:
+            self.cameras['person'][index] = -1
+            return
+        if person not in self.people:
+            self.people.append(person)
+        self.cameras['person'][index] = self.people.index(person)
+
+    def unbind_all(self):
+        """
+        Unbinds every camera
+        """
+        if len(self) > 0:
+            self.cameras['person'] = -1
+
+    def copy_bindings(self, other: CameraLayout) -> int:
+        """
+        Binds every camera to the person bound to a camera of other with exactly the same rect
+        :param other: Earlier layout of the same window
+        :return: number of cameras that were bound
+        """
+        if len(self) == 0 or len(other) == 0:
+            return 0
+        matches = (self.rects[:, None, :] == other.rects[None, :, :]).all(axis=2)
+        found = matches.any(axis=1)
+        other_names = other.names()
+        bound = 0
+        for index, match in zip(np.flatnonzero(found).tolist(), matches.argmax(axis=1)[found].tolist()):
+            if other_names[match]:
+                self.bind(index, other_names[match])
+                bound += 1
+        return bound
+
+    def offset(self, dx: int = 0, dy: int = 0) -> CameraLayout:
+        """
+        Returns a copy with every camera moved
+        """
+        cameras = self.cameras.copy()
+        cameras['x'] += dx
+        cameras['y'] += dy
+        return self.__copy(cameras)
+
+    def scale(self, sx: float, sy: Optional[float] = None) -> CameraLayout:
+        """
+        Returns a copy with every camera scaled from the window origin, rounded to whole pixels
+        :param sx: Horizontal scale
+        :param sy: Vertical scale, defaults to sx
+        """
+        sy = sx if sy is None else sy
+        cameras = self.cameras.copy()
+        for field, factor in (('x', sx), ('y', sy), ('width', sx), ('height', sy)):
+            cameras[field] = np.rint(self.cameras[field] * factor)
+        return self.__copy(cameras)
+
+    def bounds(self) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Returns the area around every camera as (x, y, x1, y1) or None without cameras
+        """
+        if len(self) == 0:
+            return None
+        cameras = self.cameras
+        return (int(cameras['x'].min()), int(cameras['y'].min()), int((cameras['x'] + cameras['width']).max()),
+                int((cameras['y'] + cameras['height']).max()))
+
+    def diff(self, other: CameraLayout) -> Dict[str, List[int]]:
+        """
+        Compares this layout with an earlier one. Cameras are paired by id
+        :param other: Earlier layout
+        :return: dict of the ids of cameras that were added, removed, moved and bound to another person
+        """
+        ids, other_ids = self.cameras['id'], other.cameras['id']
+        common, here, there = np.intersect1d(ids, other_ids, assume_unique=True, return_indices=True)
+        moved = (self.rects[here] != other.rects[there]).any(axis=1)
+        names, other_names = self.names(), other.names()
+        return {
+            'added': np.setdiff1d(ids, other_ids, assume_unique=True).tolist(),
+            'removed': np.setdiff1d(other_ids, ids, assume_unique=True).tolist(),
+            'moved': common[moved].tolist(),
+            'rebound': [camera_id for camera_id, index, other_index in zip(common.tolist(), here.tolist(),
+                                                                           there.tolist())
+                        if names[index] != other_names[other_index]]
+        }
+
+    def crops(self, y_offset: int = 0, relative: Optional[dict] = None) -> List[dict]:
+        """
+        Serializes the cameras to the crops of a crop camera command
+        :param y_offset: Offset added to the top of every crop
+        :param relative: Layout from obs_plugin_server.camera_layout. When given every crop also gets its rect as
+                         fractions of the content area as nx, ny, nw and nh
+        :return: list of camera crops
+        """
+        cameras = self.cameras
+        columns = {'x': cameras['x'].tolist(), 'x1': cameras['width'].tolist(),
+                   'y': (cameras['y'] + y_offset).tolist(), 'y1': cameras['height'].tolist()}
+        if relative is not None:
+            left, top, right, bottom = relative['margins']
+            content_width = max(relative['w'] - left - right, 1)
+            content_height = max(relative['h'] - top - bottom, 1)
+            columns.update({'nx': np.round((cameras['x'] - left) / content_width, RELATIVE_PLACES).tolist(),
+                            'ny': np.round((cameras['y'] - top) / content_height, RELATIVE_PLACES).tolist(),
+                            'nw': np.round(cameras['width'] / content_width, RELATIVE_PLACES).tolist(),
+                            'nh': np.round(cameras['height'] / content_height, RELATIVE_PLACES).tolist()})
+        crops = [{'camName': name} for name in self.names()]
+        for key, values in columns.items():
+            for crop, value in zip(crops, values):
+                crop[key] = value
+        return crops
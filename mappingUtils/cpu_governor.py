@@ -0,0 +1,180 @@
+"""
+Keeps detection from taking CPU time away from OBS encoding on the same machine.
+"""
+import ctypes  # Used to lower the priority of a thread on Windows
+import os  # Used to count cores and lower the priority of a thread on Linux
+import platform  # Used to pick the priority to lower the process to
+import threading  # Used to find the id of the current thread
+import time  # Used to measure CPU and wall time
+from concurrent.futures import ThreadPoolExecutor  # Used to run detection on lowered priority threads
+from typing import Callable, List, Optional  # Used for typing
+
+from mappingUtils.lazy_import import lazy_import  # Used to import heavy modules on first use
+
+cv2 = lazy_import('cv2')  # Used to cap the OpenCV thread count
+psutil = lazy_import('psutil')  # Used to lower the priority and pin the process to cores
+
+# Settings cpu_governor.json can contain
+GOVERNOR_SETTINGS = ('cv_threads', 'nice', 'affinity', 'budget')
+
+# THREAD_PRIORITY_BELOW_NORMAL of SetThreadPriority
+_THREAD_PRIORITY_BELOW_NORMAL = -1
+
+
+class CpuGovernor:
+    """
+    Caps OpenCV threads, lowers the priority of detection threads or worker processes, pins the process to cores and
+    holds watch and batch detection to a CPU time budget.
+    The budget works like a bucket. Every call to throttle adds the CPU time used by the whole process since the
+    last call and drains budget seconds of CPU time per second of wall time. When the bucket holds more than
+    it should the caller is told how long to wait for it to drain.
+    Attributes
+    ----------
+    cv_threads : int
+        Number of threads OpenCV may use or None to leave OpenCV's default
+    nice : int
+        Niceness detection threads and worker processes are lowered to on Linux and macOS. Windows uses below
+        normal priority
+    affinity : list
+        Cores the process is pinned to or None to use every core
+    budget : float
+        CPU seconds per second of wall time watch and batch detection may use. 0.5 is half of one core
+    usage : float
+        CPU seconds per second used by the process, averaged over roughly the last second
+    """
+    cv_threads: Optional[int]
+    nice: int
+    affinity: Optional[List[int]]
+    budget: float
+    usage: float
+
+    def __init__(self, cv_threads: Optional[int] = 2, nice: int = 10, affinity: Optional[List[int]] = None,
+                 budget: float = 0.5, cpu_clock: Callable[[], float] = time.process_time,
+                 wall_clock: Callable[[], float] = time.perf_counter, sleep: Callable[[float], None] = time.sleep):
+        """
+        :param cpu_clock: Returns the CPU time used by the process in seconds
+        :param wall_clock: Returns the wall time in seconds
+        :param sleep: Waits for a number of seconds of wall time
+        """
+        self.cv_threads = cv_threads
+        self.nice = nice
+        self.affinity = affinity
+        self.budget = budget
+        self.usage = 0.0
+        self._cpu_clock = cpu_clock
+        self._wall_clock = wall_clock
+        self._sleep = sleep
+        self._cpu = None
+        self._wall = None
+        self._debt = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> 'CpuGovernor':
+        """
+        Creates a governor from the settings of cpu_governor.json, checking the type of every setting
+        :param settings: dict with any of the settings in GOVERNOR_SETTINGS, other keys are ignored
+        :return: CpuGovernor
+        :raises ValueError: If settings is not a dict or a setting has the wrong type
+        """
+        if not isinstance(settings, dict):
+            raise ValueError('cpu_governor.json must contain an object')
+        settings = {key: value for key, value in settings.items() if key in GOVERNOR_SETTINGS}
+
+        def is_int(value):
+            return isinstance(value, int) and not isinstance(value, bool)
+        if settings.get('cv_threads') is not None and not (is_int(settings['cv_threads'])
+                                                           and settings['cv_threads'] >= 1):
+            raise ValueError('cv_threads must be a whole number of at least 1')
+        if 'nice' in settings and not (is_int(settings['nice']) and -20 <= settings['nice'] <= 19):
+            raise ValueError('nice must be a whole number from -20 to 19')
+        if settings.get('affinity') is not None and not (isinstance(settings['affinity'], list) and all(
+                is_int(core) and core >= 0 for core in settings['affinity'])):
+            raise ValueError('affinity must be a list of core numbers')
+        if 'budget' in settings and not (isinstance(settings['budget'], (int, float))
+                                         and not isinstance(settings['budget'], bool) and settings['budget'] >= 0):
+            raise ValueError('budget must be a number of at least 0')
+        return cls(**settings)
+
+    def apply(self, image_proc=None, whole_process: bool = False):
+        """
+        Caps OpenCV threads and pins the process. Settings the platform does not support are skipped.
+        The priority is only lowered here for processes that do nothing but detection, the user interface lowers the
+        threads detection runs on with executor instead
+        :param image_proc: ImageProcessing whose strip workers are capped to cv_threads or None
+        :param whole_process: Lowers the priority of the whole process, for worker processes
+        """
+        if self.cv_threads is not None:
+            cv2.setNumThreads(self.cv_threads)
+            if image_proc is not None:
+                image_proc.strip_workers = max(1, self.cv_threads)
+        process = psutil.Process()
+        if whole_process:
+            try:
+                if platform.system() == 'Windows':
+                    process.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+                elif process.nice() < self.nice:
+                    process.nice(self.nice)
+            except psutil.Error:
+                pass
+        if self.affinity:
+            cores = [core for core in self.affinity if core < (os.cpu_count() or 1)]
+            try:
+                if cores:
+                    process.cpu_affinity(cores)
+            except (AttributeError, psutil.Error, ValueError):
+                # macOS has no way to pin a process to cores
+                pass
+
+    def lower_thread_priority(self):
+        """
+        Lowers the priority of the calling thread. Threads it starts, like OpenCV's and the strip workers, start
+        with the same priority on Linux. Platforms without thread priorities are skipped
+        """
+        try:
+            if platform.system() == 'Windows':
+                kernel32 = ctypes.windll.kernel32
+                kernel32.SetThreadPriority(kernel32.GetCurrentThread(), _THREAD_PRIORITY_BELOW_NORMAL)
+            elif platform.system() == 'Linux':
+                # Linux keeps a niceness for every thread, addressed by its thread id
+                thread_id = threading.get_native_id()
+                if os.getpriority(os.PRIO_PROCESS, thread_id) < self.nice:
+                    os.setpriority(os.PRIO_PROCESS, thread_id, self.nice)
+        except OSError:
+            pass
+
+    def executor(self, workers: int = 2) -> ThreadPoolExecutor:
+        """
+        Returns a thread pool whose threads run at lowered priority, for detection and watching from the user interface
+        :param workers: Number of threads
+        """
+        return ThreadPoolExecutor(workers, thread_name_prefix='detect', initializer=self.lower_thread_priority)
+
+    def throttle(self) -> float:
+        """
+        Accounts the CPU time used since the last call and returns how long to wait to stay in budget
+        :return: seconds to wait before the next piece of work
+        """
+        cpu = self._cpu_clock()
+        wall = self._wall_clock()
+        if self._cpu is None:
+            self._cpu, self._wall = cpu, wall
+            return 0.0
+        used, elapsed = cpu - self._cpu, wall - self._wall
+        self._cpu, self._wall = cpu, wall
+        if elapsed > 0:
+            # Averages usage over roughly one second however often throttle is called
+            weight = min(elapsed, 1.0)
+            self.usage = self.usage * (1 - weight) + used / elapsed * weight
+        # Unused budget is only saved up for one second so idle time does not allow a long burst
+        self._debt = max(self._debt + used - self.budget * elapsed, -self.budget)
+        if self._debt <= 0 or self.budget <= 0:
+            return 0.0
+        return self._debt / self.budget
+
+    def wait(self):
+        """
+        Sleeps until the process is back within budget. Used by batch detection that does not run on an event loop
+        """
+        delay = self.throttle()
+        if delay > 0:
+            self._sleep(delay)
@@ -0,0 +1,166 @@
+"""
+Profiles the next few capture, detect and send cycles with cProfile so slow mapping reports come with data.
+"""
+import cProfile  # Used to profile the cycles
+import io  # Used to collect the text summary
+import os  # Used for profile paths
+import pstats  # Used to summarise the hottest functions
+import time  # Used to name the profile files and time cycles
+from contextlib import contextmanager  # Used to wrap a cycle in a with block
+from typing import Iterator, Optional, Tuple  # Used for typing
+
+
+class CycleProfiler:
+    """
+    Profiles the next cycles after start is called and then writes a .prof file and a text summary.
+    cProfile only sees the thread a cycle runs on, so cycles must start and end on the same thread.
+    Only one cycle is profiled at a time, a cycle started while another is open runs without being profiled
+    Attributes
+    ----------
+    output_location : str
+        Folder the profile files are written to
+    cycles : int
+        Number of cycles profiled after every start
+    top : int
+        Number of functions listed in the text summary
+    remaining : int
+        Number of cycles still to be profiled
+    last_output : tuple
+        Paths of the last written .prof file and text summary or None
+    """
+    output_location: str
+    cycles: int
+    top: int
+    remaining: int
+    last_output: Optional[Tuple[str, str]]
+
+    def __init__(self, output_location: str, cycles: int = 10, top: int = 30):
+        self.output_location = output_location
+        self.cycles = cycles
+        self.top = top
+        self.remaining = 0
+        self.last_output = None
+        self._profile = None
+        self._profiled = 0
+        self._names = []
+        self._open = None
+        self._notes = []
+
+    @property
+    def active(self) -> bool:
+        """
+        True while cycles are still being profiled
+        """
+        return self.remaining > 0
+
+    def start(self):
+        """
+        Profiles the next cycles, dropping any cycles profiled since the last start
+        """
+        self._profile = cProfile.Profile()
+        self._profiled = 0
+        self._names = []
+        self.remaining = self.cycles
+
+    def stop(self) -> Optional[Tuple[str, str]]:
+        """
+        Stops profiling and writes the cycles profiled so far
+        :return: paths of the .prof file and text summary or None if no cycle was profiled
+        """
+        self.remaining = 0
+        if self._profile is None or self._profiled == 0:
+            self._profile = None
+            self._names = []
+            return None
+        return self.save()
+
+    @contextmanager
+    def cycle(self, name: str) -> Iterator[bool]:
+        """
+        Profiles the code in the with block if cycles are still being profiled and no other cycle is open.
+        The files are written after the last one
+        :param name: Name of the cycle, only used in the summary
+        :return: True if the with block is profiled
+        """
+        if not self.active or self._open is not None:
+            yield False
+            return
+        # The profile is kept so a stop or start while the cycle is open does not count it in the next profile
+        profile = self._profile
+        self._open = profile
+        self._notes = []
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield True
+        finally:
+            profile.disable()
+            self._open = None
+            if self._profile is profile:
+                self._profiled += 1
+                self.remaining -= 1
+                self._names.append(' '.join(['{0} {1:.1f} ms'.format(name, (time.perf_counter() - start) * 1000)]
+                                            + self._notes))
+                if self.remaining == 0:
+                    self.save()
+
+    def note(self, text: str):
+        """
+        Adds text to the summary line of the open cycle, for example the capture metrics of the cycle
+        :param text: Text listed after the cycle, nothing is added when empty or no cycle is open
+        """
+        if text and self._open is not None:
+            self._notes.append('({0})'.format(text))
+
+    @contextmanager
+    def paused(self, name: str) -> Iterator[None]:
+        """
+        Stops profiling the open cycle while the with block runs and times the block on its own.
+        Used around awaits, as cProfile would otherwise count whatever the event loop runs in the meantime
+        :param name: Name of the paused block, listed after its cycle in the summary
+        """
+        profile = self._open
+        if profile is None:
+            yield
+            return
+        profile.disable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._open is profile:
+                self._notes.append('({0} {1:.1f} ms)'.format(name, (time.perf_counter() - start) * 1000))
+                if self._profile is profile:
+                    profile.enable()
+
+    def save(self) -> Tuple[str, str]:
+        """
+        Writes the profile and a summary of the hottest functions by own time and by cumulative time
+        :return: paths of the .prof file and text summary
+        """
+        if not os.path.exists(self.output_location):
+            os.makedirs(self.output_location)
+        now = time.time()
+        stem = os.path.join(self.output_location, '{0}-{1:03d}'.format(time.strftime('profile-%Y%m%d-%H%M%S',
+                                                                                    time.localtime(now)),
+                                                                      int(now % 1 * 1000)))
+        # Profiles written within the same millisecond get a counter so none overwrites another
+        if os.path.exists(stem + '.prof'):
+            counter = 2
+            while os.path.exists('{0}-{1}.prof'.format(stem, counter)):
+                counter += 1
+            stem = '{0}-{1}'.format(stem, counter)
+        self._profile.dump_stats(stem + '.prof')
+        summary = io.StringIO()
+        summary.write('{0} cycles profiled\n'.format(self._profiled))
+        for name in self._names:
+            summary.write('  {0}\n'.format(name))
+        for sort in ('tottime', 'cumulative'):
+            summary.write('\nTop {0} functions by {1}\n'.format(self.top, sort))
+            pstats.Stats(self._profile, stream=summary).sort_stats(sort).print_stats(self.top)
+        with open(stem + '.txt', 'w', encoding='UTF-8') as summary_file:
+            summary_file.write(summary.getvalue())
+        self._profile = None
+        self._names = []
+        self.last_output = (stem + '.prof', stem + '.txt')
+        return self.last_output
@@ -0,0 +1,177 @@
+"""
+Writes debug images on a background thread so debugging barely slows down capture and detection.
+
+Images are numbered by frame, a new frame starting whenever a name is queued again, and encoded by a single writer thread into a folder per session.
+The queue is bounded, so when the writer falls behind new images are dropped instead of holding up detection,
+and the oldest images are removed once all debug folders grow past a size cap.
+"""
+from __future__ import annotations  # Keeps numpy annotations from importing it
+
+import os  # Used for debug image paths
+import queue  # Used to hand images to the writer thread
+import shutil  # Used to remove old sessions
+import threading  # Used to run the writer thread
+import time  # Used to name session folders
+from typing import Callable, Optional, Union  # Used for typing
+
+from mappingUtils.lazy_import import lazy_import  # Used to import heavy modules on first use
+
+cv2 = lazy_import('cv2')  # Used to shrink and encode the images
+np = lazy_import('numpy')  # Used for typing
+
+
+class DebugWriter:
+    """
+    Background writer of debug images with a bounded queue and a size capped, rolling set of session folders.
+    Attributes
+    ----------
+    root : str
+        Folder every session folder is created in
+    session_location : str
+        Folder the images of this session are written to
+    compression : int
+        PNG compression level from 0, fastest, to 9, smallest
+    scale : float
+        Factor images are shrunk by before being written. 1 keeps the full resolution
+    max_bytes : int
+        Largest total size of all session folders before the oldest images are removed
+    dropped : int
+        Number of images dropped because the queue was full
+    written : int
+        Number of images written
+    failed : int
+        Number of images that could not be made or written
+    last_error : str
+        Name of the last image that failed and why or None
+    """
+    root: str
+    session_location: str
+    compression: int
+    scale: float
+    max_bytes: int
+    dropped: int
+    written: int
+    failed: int
+    last_error: Optional[str]
+
+    def __init__(self, root: str, max_queue: int = 16, compression: int = 1, scale: float = 0.5,
+                 max_bytes: int = 256 * 1024 * 1024):
+        self.root = root
+        self.session_location = os.path.join(root, time.strftime('%Y%m%d-%H%M%S-') + str(os.getpid()))
+        self.compression = compression
+        self.scale = scale
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.last_error = None
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._frame = 1
+        self._frame_names = set()
+        self._files = []
+        self._bytes = None
+
+    def submit(self, name: str, image: Union[np.ndarray, Callable[[], np.ndarray]], mask: bool = False) -> bool:
+        """
+        Queues an image without waiting. The image must not be changed after it is queued
+        :param name: Name of the image, the file is named after it and the frame. A name already queued for the
+            current frame starts a new frame
+        :param image: Image or a function returning it, called on the writer thread so the work is kept off the caller
+        :param mask: True for black and white images so they are shrunk without blurring
+        :return: False if the queue was full and the image was dropped
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.__run, name='debug-writer', daemon=True)
+                self._thread.start()
+            if name in self._frame_names:
+                self._frame += 1
+                self._frame_names.clear()
+            self._frame_names.add(name)
+        try:
+            self._queue.put_nowait((self._frame, name, image, mask))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self):
+        """
+        Waits until every queued image is written
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def __run(self):
+        """
+        Writes queued images until the program exits
+        """
+        while True:
+            frame, name, image, mask = self._queue.get()
+            try:
+                self.__write(frame, name, image, mask)
+            except Exception as error:  # pylint: disable=broad-except
+                # The writer thread has nobody to report to, so failures are counted for whoever reads the writer
+                self.failed += 1
+                self.last_error = '{0}: {1}'.format(name, error)
+            finally:
+                self._queue.task_done()
+
+    def __write(self, frame: int, name: str, image: Union[np.ndarray, Callable[[], np.ndarray]], mask: bool):
+        """
+        Shrinks, encodes and writes an image and removes the oldest images if the size cap is passed
+        """
+        if callable(image):
+            image = image()
+        if self.scale != 1:
+            image = cv2.resize(image, None, fx=self.scale, fy=self.scale,
+                               interpolation=cv2.INTER_NEAREST if mask else cv2.INTER_AREA)
+        if not os.path.exists(self.session_location):
+            os.makedirs(self.session_location)
+        path = os.path.join(self.session_location, '{0:06d}-{1}.png'.format(frame, name))
+        cv2.imwrite(path, image, [cv2.IMWRITE_PNG_COMPRESSION, self.compression])
+        self.written += 1
+        self._files.append(path)
+        if self._bytes is None:
+            self._bytes = self.__folder_size(self.root)
+        else:
+            self._bytes += os.path.getsize(path)
+        self.__roll()
+
+    def __roll(self):
+        """
+        Removes older sessions and then the oldest images of this session until the debug folders fit in max_bytes
+        """
+        if self._bytes <= self.max_bytes:
+            return
+        sessions = sorted(entry.path for entry in os.scandir(self.root)
+                          if entry.is_dir() and entry.path != self.session_location)
+        for session in sessions:
+            if self._bytes <= self.max_bytes:
+                return
+            self._bytes -= self.__folder_size(session)
+            shutil.rmtree(session, ignore_errors=True)
+        # Keeps the newest image so the last frame can always be looked at
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            path = self._files.pop(0)
+            try:
+                self._bytes -= os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def __folder_size(folder: str) -> int:
+        """
+        Returns the total size of every file in a folder and its sub folders
+        """
+        total = 0
+        for directory, _, files in os.walk(folder):
+            for file in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, file))
+                except OSError:
+                    pass
+        return total
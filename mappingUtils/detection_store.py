@@ -0,0 +1,129 @@
+"""
+Keeps the cameras of the last few detections so a long running mapper never piles up stale cameras or camera images.
+"""
+import os  # Used for camera image paths
+import time  # Used to timestamp detections
+from collections import OrderedDict  # Used to keep generations in detection order
+from typing import Dict, List, Optional, Tuple, Union  # Used for typing
+
+from mappingUtils.camera_layout import CameraLayout  # Used to hand out detections as arrays
+
+
+class DetectionStore:
+    """
+    Stores the cameras of every detection as a CameraLayout under a generation number. Starting a detection starts a new generation and
+    once more than max_generations are kept the oldest one is dropped along with its camera images.
+    Camera images are named after their generation so a detection never overwrites an image the user interface or a
+    previous detection still points at.
+    Attributes
+    ----------
+    save_location : str
+        Folder the camera images are written to
+    max_generations : int
+        Number of detections kept, the newest being the current one
+    generation : int
+        Number of the current detection. 0 before the first detection
+    """
+    save_location: str
+    max_generations: int
+    generation: int
+
+    def __init__(self, save_location: str, max_generations: int = 4):
+        self.save_location = save_location
+        self.max_generations = max(1, max_generations)
+        self.generation = 0
+        self._generations = OrderedDict()
+        self.begin()
+
+    def begin(self, cameras: Union[Dict[str, List[Union[list, str]]], CameraLayout, None] = None) -> int:
+        """
+        Starts a new generation and drops the oldest generations past max_generations
+        :param cameras: CameraLayout or cameras dict the generation starts with, defaults to none
+        :return: number of the new generation
+        """
+        if cameras is None:
+            cameras = CameraLayout()
+        elif not isinstance(cameras, CameraLayout):
+            cameras = CameraLayout.from_cameras(cameras)
+        self.generation += 1
+        self._generations[self.generation] = {'layout': cameras, 'mask_hash': '', 'geometry': (0, 0, 0, 0),
+                                              'time': time.time()}
+        while len(self._generations) > self.max_generations:
+            _, dropped = self._generations.popitem(last=False)
+            self.__remove_images(dropped['layout'].paths)
+        return self.generation
+
+    def __remove_images(self, paths: List[str]):
+        """
+        Removes the camera images of a dropped generation that were written to the save location
+        """
+        for path in paths:
+            if os.path.dirname(path) == self.save_location:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def image_path(self, index: int) -> str:
+        """
+        Returns the path of a camera image of the current generation
+        :param index: Position of the camera
+        """
+        return os.path.join(self.save_location, '{0}-{1}.jpg'.format(self.generation, index))
+
+    def add(self, index: int, rect: Tuple[int, int, int, int]) -> str:
+        """
+        Adds a camera to the current generation
+        :param index: Position of the camera used to name its image
+        :param rect: (x, y, width, height) of the camera
+        :return: path of the camera image
+        """
+        path = self.image_path(index)
+        self.layout().append(rect, path)
+        return path
+
+    def describe(self, mask_hash: str, geometry: Tuple[int, int, int, int]):
+        """
+        Stores the mask hash and window geometry the current generation was detected from
+        """
+        self._generations[self.generation]['mask_hash'] = mask_hash
+        self._generations[self.generation]['geometry'] = geometry
+
+    @property
+    def cameras(self) -> Dict[str, List[Union[list, str]]]:
+        """
+        Cameras of the current generation as a dict of image path to [rect, name], built from its layout
+        """
+        return self.layout().to_cameras()
+
+    def layout(self, generation: Optional[int] = None) -> Optional[CameraLayout]:
+        """
+        Returns the cameras of a kept generation. The layout is the stored one, not a copy
+        :param generation: Number of the generation, defaults to the current one
+        :return: CameraLayout or None if the generation was dropped
+        """
+        entry = self._generations.get(self.generation if generation is None else generation)
+        return entry['layout'] if entry is not None else None
+
+    def get(self, generation: int) -> Optional[dict]:
+        """
+        Returns a kept generation
+        :param generation: Number of the generation
+        :return: dict of layout, mask_hash, geometry and time or None if the generation was dropped
+        """
+        return self._generations.get(generation)
+
+    def generations(self) -> List[int]:
+        """
+        Returns the numbers of the kept generations from oldest to newest
+        """
+        return list(self._generations)
+
+    def clear(self):
+        """
+        Drops every generation and its camera images and starts an empty one
+        """
+        for entry in self._generations.values():
+            self.__remove_images(entry['layout'].paths)
+        self._generations.clear()
+        self.begin()
@@ -0,0 +1,171 @@
+"""
+Detector settings for every call client. A profile is picked from the class and exe of the call window so every frame
+is only searched inside the client's tile area with the background colour that client draws behind its tiles.
+"""
+import json  # Used to read custom profiles
+from typing import List, Optional, Sequence, Tuple  # Used for typing
+
+
+class DetectorProfile:
+    """
+    Detector settings of one call client.
+    Attributes
+    ----------
+    name : str
+        Name of the client
+    window_classes : tuple
+        Lowercase parts of a window class or exe name that identify the client
+    background_low : tuple
+        Lowest HSV colour of the background behind the tiles
+    background_high : tuple
+        Highest HSV colour of the background behind the tiles
+    margins : tuple
+        (left, top, right, bottom) pixels of toolbars and panels at the window edges that never contain tiles
+    roi : tuple
+        (x, y, x1, y1) fractions of the window inside the margins that tiles can be in
+    titlebar : int
+        Height of the titlebar, removed from Linux windows located with wmctrl as it reports the window with its frame
+    linux_y_offset : int
+        Offset added to the top of every crop sent from Linux, where OBS captures the window with its titlebar
+    """
+    name: str
+    window_classes: Tuple[str, ...]
+    background_low: Tuple[int, int, int]
+    background_high: Tuple[int, int, int]
+    margins: Tuple[int, int, int, int]
+    roi: Tuple[float, float, float, float]
+    titlebar: int
+    linux_y_offset: int
+
+    def __init__(self, name: str, window_classes: Sequence[str] = (),
+                 background_low: Sequence[int] = (0, 0, 0), background_high: Sequence[int] = (1, 1, 1),
+                 margins: Sequence[int] = (0, 0, 0, 0), roi: Sequence[float] = (0.0, 0.0, 1.0, 1.0),
+                 titlebar: int = 20, linux_y_offset: int = -40):
+        self.name = name
+        self.window_classes = tuple(window_class.lower() for window_class in window_classes)
+        self.background_low = tuple(background_low)
+        self.background_high = tuple(background_high)
+        self.margins = tuple(margins)
+        self.roi = tuple(roi)
+        self.titlebar = titlebar
+        self.linux_y_offset = linux_y_offset
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> 'DetectorProfile':
+        """
+        Creates a profile from the settings of a custom profile, checking the shape of every setting so a broken
+        profile is refused when it is read instead of when a frame is searched with it
+        :param settings: dict with name and any of the other arguments of DetectorProfile
+        :return: DetectorProfile
+        :raises ValueError: If a setting is unknown, missing or has the wrong shape
+        """
+        if not isinstance(settings, dict) or not isinstance(settings.get('name'), str):
+            raise ValueError('a profile needs a name')
+        name = settings['name']
+        unknown = sorted(set(settings) - set(PROFILE_SETTINGS))
+        if unknown:
+            raise ValueError('{0}: unknown settings {1}'.format(name, ', '.join(unknown)))
+        window_classes = settings.get('window_classes', [])
+        if not isinstance(window_classes, list) or not all(isinstance(part, str) for part in window_classes):
+            raise ValueError('{0}: window_classes must be a list of strings'.format(name))
+        for key, count, low, high in (('background_low', 3, 0, 255), ('background_high', 3, 0, 255),
+                                      ('margins', 4, 0, None), ('roi', 4, 0, 1)):
+            value = settings.get(key)
+            if value is None:
+                continue
+            if (not isinstance(value, list) or len(value) != count
+                    or not all(isinstance(number, (int, float)) and not isinstance(number, bool) and low <= number
+                               and (high is None or number <= high) for number in value)):
+                raise ValueError('{0}: {1} must be {2} numbers from {3} to {4}'.format(
+                    name, key, count, low, 'any size' if high is None else high))
+        roi = settings.get('roi')
+        if roi is not None and (roi[0] >= roi[2] or roi[1] >= roi[3]):
+            raise ValueError('{0}: roi must have x below x1 and y below y1'.format(name))
+        if 'margins' in settings and not all(isinstance(number, int) for number in settings['margins']):
+            raise ValueError('{0}: margins must be whole pixels'.format(name))
+        for key in ('titlebar', 'linux_y_offset'):
+            if key in settings and (not isinstance(settings[key], int) or isinstance(settings[key], bool)):
+                raise ValueError('{0}: {1} must be a whole number of pixels'.format(name, key))
+        return cls(**settings)
+
+    def region(self, width: int, height: int) -> Tuple[int, int, int, int]:
+        """
+        Returns the part of a window that is searched for tiles
+        :param width: Width of the window image
+        :param height: Height of the window image
+        :return: (x, y, x1, y1) in pixels, never empty
+        """
+        left, top, right, bottom = self.margins
+        inner_width, inner_height = max(width - left - right, 1), max(height - top - bottom, 1)
+        x = min(left + int(self.roi[0] * inner_width), width - 1)
+        y = min(top + int(self.roi[1] * inner_height), height - 1)
+        x1 = max(min(left + int(round(self.roi[2] * inner_width)), width), x + 1)
+        y1 = max(min(top + int(round(self.roi[3] * inner_height)), height), y + 1)
+        return x, y, x1, y1
+
+    def matches(self, window_class: str) -> bool:
+        """
+        Returns True if a window class or exe name belongs to this client
+        """
+        window_class = window_class.lower()
+        return any(part in window_class for part in self.window_classes)
+
+
+# Discord draws a pure black stage behind the tiles, the settings detection started with
+DISCORD = DetectorProfile('Discord', ('discord',), (0, 0, 0), (1, 1, 1))
+# Zoom's gallery is dark grey with the meeting bar above and the toolbar below it
+ZOOM = DetectorProfile('Zoom', ('zoom', 'zpcontentviewwndclass'), (0, 0, 0), (180, 20, 30), margins=(0, 40, 0, 64))
+# Teams draws the meeting controls above a dark grey stage
+TEAMS = DetectorProfile('Teams', ('teams', 'ms-teams'), (0, 0, 20), (180, 25, 48), margins=(0, 56, 0, 0))
+
+PROFILES = [DISCORD, ZOOM, TEAMS]
+
+# Settings a custom profile can have
+PROFILE_SETTINGS = ('name', 'window_classes', 'background_low', 'background_high', 'margins', 'roi', 'titlebar',
+                    'linux_y_offset')
+
+
+def classify(window_class: str, profiles: Optional[List[DetectorProfile]] = None,
+             default: DetectorProfile = DISCORD) -> DetectorProfile:
+    """
+    Picks the profile of a call window from its class and exe name
+    :param window_class: Class and exe name of the window, in any case
+    :param profiles: Profiles checked in order, defaults to the built in ones
+    :param default: Profile used when no profile matches
+    :return: DetectorProfile
+    """
+    for profile in PROFILES if profiles is None else profiles:
+        if profile.matches(window_class):
+            return profile
+    return default
+
+
+def load_profiles(profiles_file: str, errors: Optional[List[str]] = None) -> List[DetectorProfile]:
+    """
+    Reads custom profiles and returns them ahead of the built in ones so they take priority.
+    The file contains {"profiles": [{"name": ..., "window_classes": [...], "background_low": [h, s, v],
+    "background_high": [h, s, v], "margins": [left, top, right, bottom], "roi": [x, y, x1, y1], "titlebar": 20,
+    "linux_y_offset": -40}]} where only name is required. Profiles that are not valid are skipped
+    :param profiles_file: JSON file with custom profiles
+    :param errors: List the reason every skipped profile was skipped is added to
+    :return: list of profiles, only the built in ones when the file is missing or broken
+    """
+    errors = [] if errors is None else errors
+    try:
+        with open(profiles_file, 'r', encoding='UTF-8') as profiles:
+            settings = json.load(profiles)['profiles']
+    except FileNotFoundError:
+        return list(PROFILES)
+    except (json.decoder.JSONDecodeError, KeyError, TypeError) as exception:
+        errors.append('{0} could not be read: {1}'.format(profiles_file, exception))
+        return list(PROFILES)
+    if not isinstance(settings, list):
+        errors.append('{0}: profiles must be a list'.format(profiles_file))
+        return list(PROFILES)
+    custom = []
+    for profile in settings:
+        try:
+            custom.append(DetectorProfile.from_settings(profile))
+        except ValueError as exception:
+            errors.append(str(exception))
+    return custom + PROFILES
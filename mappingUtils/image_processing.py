@@ -1,22 +1,57 @@
 """
 Processes a window screenshot and returns cords of all detected cameras
 """
+from __future__ import annotations  # Keeps numpy and PIL annotations from importing them
+
 import platform  # Used to get platform system of the user
 import os  # used for file manipulation and data paths
-import time  # Used to wait between showing a window and grabbing a screenshot
-from typing import Dict, List, Union  # Used for typing
+import threading  # Used to keep a screenshotter per thread
+import time  # Used to wait for a window to be ready before grabbing a screenshot
+from concurrent.futures import ThreadPoolExecutor  # Used to filter strips of large frames in parallel
+from contextlib import contextmanager  # Used to move the pointer off the window while it is captured
+from typing import Callable, Dict, List, Optional, Tuple, Union  # Used for typing
 
-from mss import mss  # Used to get screenshot of the users whole computer
-from PIL import Image  # Used for loading and manipulating images
-import cv2  # Used for getting camera locations
-import numpy as np  # Used to assist with getting camera locations
+from mappingUtils.lazy_import import lazy_import  # Used to import heavy modules on first use
+from mappingUtils import layout_cache  # Used to hash the window layout for the layout cache
+from mappingUtils.debug_writer import DebugWriter  # Used to write debug images off the detection path
+from mappingUtils.camera_layout import CameraLayout  # Used to hand out the last detection as arrays
+from mappingUtils.detection_store import DetectionStore  # Used to keep the cameras of the last few detections
+from mappingUtils import detector_profiles  # Used to pick the detector settings of the call client
+from mappingUtils.cpu_governor import CpuGovernor  # Used to report the CPU used by detection
+from mappingUtils.layout_templates import TemplateLibrary  # Used to snap frames to known layouts
+from mappingUtils.session_archive import SessionRecorder  # Used to record sessions for offline replay
+from mappingUtils import x11_windows  # Used to look up Linux windows without spawning wmctrl
 
 if platform.system() == 'Windows':
     import ctypes  # Used to get window information
     from ctypes import wintypes, cdll, CFUNCTYPE, c_bool, POINTER, c_int, create_unicode_buffer
     import psutil
 elif platform.system() == 'Linux':
-    import wmctrl  # Used to get window information
+    import wmctrl  # Used to get window information when the X11 window tracker can not be started
+
+mss = lazy_import('mss')  # Used to get screenshot of the users whole computer
+Image = lazy_import('PIL.Image')  # Used for loading and manipulating images
+cv2 = lazy_import('cv2')  # Used for getting camera locations
+np = lazy_import('numpy')  # Used to assist with getting camera locations
+
+# Rows added above and below every strip of a large frame, more than the erode and Canny steps reach
+STRIP_OVERLAP = 8
+
+
+def format_metrics(metrics: Dict[str, float]) -> str:
+    """
+    Formats the metrics of ImageProcessing for showing to the user next to the other timings
+    :param metrics: ImageProcessing.metrics
+    :return: text with one line per measured step or an empty string if nothing was measured yet
+    """
+    lines = []
+    if 'capture_wait' in metrics:
+        lines.append('capture waited {wait:.1f} ms for the window over {grabs} grabs'.format(
+            wait=metrics['capture_wait'] * 1000, grabs=metrics['capture_grabs']))
+    if 'cpu_usage' in metrics:
+        lines.append('detection used {usage:.0%} of a core with a budget of {budget:.0%}'.format(
+            usage=metrics['cpu_usage'], budget=metrics['cpu_budget']))
+    return '\n'.join(lines)
 
 
 class ImageProcessing:
@@ -26,26 +61,188 @@ class ImageProcessing:
     ----------
     windows : dict
         dictionary of window names with the key being the name shrunk to fit in a toga selection widget and the value being the full name
-    camera_pos : dict
-        dictionary of all the cameras in the window. Key is the screenshot file and the value is a list of the position rect and a blank string
+    cameras : dict
+        dictionary of all the cameras in the window. Key is the screenshot file and the value is a list of the position rect and a blank string.
+        Only holds the cameras of the last detection and is built from layout on every access
+    detections : DetectionStore
+        Cameras of the last few detections. Every detection starts a new generation so stale cameras are never kept
+    layout : CameraLayout
+        Cameras of the last detection. This is the layout held by detections, not a copy
     save_location : str
         Location of saved screenshots
     debug : bool
         Enables debugging for easy troubleshooting
+    debug_writer : DebugWriter
+        Writes the debug images to a folder per session in the debug folder on a background thread
+    window_geometry : tuple
+        Screen position (x, y, x1, y1) of the last captured window
+    recorder : SessionRecorder
+        Session recorder that every processed frame is appended to while recording, otherwise None
+    mask_hash : str
+        Hash of the background mask of the last processed frame used to key the layout cache
+    capture_timeout : float
+        Longest time in seconds to wait for a window to be ready before taking the screenshot anyway
+    capture_poll_interval : float
+        Time in seconds between grabs while waiting for a window to be ready
+    stable_tolerance : float
+        Largest mean pixel difference between two grabs for the window to count as ready
+    activation_delay : float
+        Time in seconds waited after activating a Linux window when the window tracker can not tell when it is active
+    park_pointer : bool
+        Moves the pointer just outside the window while it is captured so call controls shown on hover are hidden.
+        The pointer is moved back afterwards
+    metrics : dict
+        Timings of the last capture and detection for instrumentation
+    templates : TemplateLibrary
+        Known layouts frames are snapped to before running the full detector or None to always run it
+    strip_workers : int
+        Number of threads large frames are filtered with. 1 filters every frame in a single pass
+    strip_min_pixels : int
+        Frames with fewer pixels than this are filtered in a single pass
+    governor : CpuGovernor
+        Governor limiting the CPU used by detection or None. Its usage and budget are stored in metrics as cpu_usage
+        and cpu_budget
+    profiles : list
+        Detector profiles call windows are classified with, custom profiles first
+    profile : DetectorProfile
+        Detector profile of the last classified window. Screenshots are detected with it as well
+    window_tracker : X11WindowTracker
+        Keeps Linux windows current from X11 events once started. None when python-xlib or the display is missing
+        and wmctrl is used instead
     """
     windows: Dict[str, str]
-    cameras: Dict[str, List[Union[list, str]]]
+    detections: DetectionStore
     save_location: str
     debug: bool
+    debug_writer: DebugWriter
+    window_geometry: Tuple[int, int, int, int]
+    recorder: Optional[SessionRecorder]
+    mask_hash: str
+    capture_timeout: float
+    capture_poll_interval: float
+    stable_tolerance: float
+    activation_delay: float
+    park_pointer: bool
+    metrics: Dict[str, float]
+    templates: Optional[TemplateLibrary]
+    strip_workers: int
+    strip_min_pixels: int
+    governor: Optional[CpuGovernor]
+    profiles: List[detector_profiles.DetectorProfile]
+    profile: detector_profiles.DetectorProfile
 
     def __init__(self, save_location: str, debug: bool = False):
         self.windows = {}
-        self.cameras = {}
         # Checks to see if a location for storing camera screenshots is created and if not creates it
         self.save_location = str(os.path.join(save_location, 'cameras'))
         if not os.path.exists(self.save_location):
             os.makedirs(os.path.join(self.save_location, 'cameras'))
+        self.detections = DetectionStore(self.save_location)
         self.debug = debug
+        self.debug_writer = DebugWriter(os.path.join(save_location, 'debug'))
+        self.window_geometry = (0, 0, 0, 0)
+        self.recorder = None
+        self.mask_hash = ''
+        self.capture_timeout = 1.0
+        self.capture_poll_interval = 0.03
+        self.stable_tolerance = 0.5
+        self.activation_delay = 0.2
+        self.park_pointer = True
+        self.metrics = {}
+        self.templates = None
+        self.strip_workers = os.cpu_count() or 1
+        self.strip_min_pixels = 3840 * 2160
+        self.governor = None
+        self.profiles = list(detector_profiles.PROFILES)
+        self.profile = detector_profiles.DISCORD
+        self._strip_pool = None
+        self._strip_pool_size = 0
+        self._thread_local = threading.local()
+        self._window_tracker = None
+        self._tracker_started = False
+        self._tracker_lock = threading.Lock()
+
+    @property
+    def cameras(self) -> Dict[str, List[Union[list, str]]]:
+        """
+        Cameras of the last detection as a dict built from layout
+        """
+        return self.detections.cameras
+
+    @cameras.setter
+    def cameras(self, cameras: Dict[str, List[Union[list, str]]]):
+        """
+        Starts a new generation holding the given cameras
+        """
+        self.detections.begin(cameras)
+
+    @property
+    def layout(self) -> CameraLayout:
+        """
+        Cameras of the last detection as held by detections
+        """
+        return self.detections.layout()
+
+    @property
+    def window_tracker(self) -> Optional[x11_windows.X11WindowTracker]:
+        """
+        Window tracker of the X11 display, started on first use on Linux
+        """
+        if platform.system() != 'Linux':
+            return None
+        with self._tracker_lock:
+            if not self._tracker_started:
+                self._tracker_started = True
+                self._window_tracker = x11_windows.connect()
+        if self._window_tracker is not None and not self._window_tracker.running:
+            return None
+        return self._window_tracker
+
+    @window_tracker.setter
+    def window_tracker(self, tracker: Optional[x11_windows.X11WindowTracker]):
+        """
+        Uses a window tracker instead of connecting one on first use, None to always use wmctrl
+        """
+        with self._tracker_lock:
+            self._tracker_started = True
+            self._window_tracker = tracker
+
+    def __linux_geometry(self, window) -> Tuple[int, int, int, int]:
+        """
+        Returns the screen position (x, y, x1, y1) of the client area of a Linux window.
+        The window tracker reads the client area itself while wmctrl reports the window with its frame, so the
+        titlebar of the current profile is only removed from wmctrl windows
+        :param window: TrackedWindow or wmctrl.Window
+        """
+        titlebar = self.profile.titlebar if isinstance(window, wmctrl.Window) else 0
+        return window.x, window.y + titlebar, window.x + window.w, window.y + window.h
+
+    def __linux_windows(self, window_title: str = None) -> list:
+        """
+        Returns the windows with a title or every window from the window tracker, or from wmctrl without one
+        :param window_title: the title of the window, None for every window
+        :return: list of TrackedWindow or wmctrl.Window
+        """
+        tracker = self.window_tracker
+        if tracker is not None:
+            return tracker.list() if window_title is None else tracker.by_name(window_title)
+        return wmctrl.Window.list() if window_title is None else wmctrl.Window.by_name(window_title)
+
+    def start_recording(self, archive_path: str):
+        """
+        Starts recording every processed frame, its window geometry and the detected cameras to an archive
+        :param archive_path: Folder the session archive is written to
+        """
+        self.stop_recording()
+        self.recorder = SessionRecorder(archive_path)
+
+    def stop_recording(self):
+        """
+        Stops recording and closes the session archive if one is open
+        """
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
 
     def toggle_debugging(self):
         """
@@ -77,32 +274,53 @@ class ImageProcessing:
     def get_windows(self) -> Dict[str, str]:
         """
         If windows system calls the __win_enum_handler and gets all the current visible windows and then returns the windows array
-        If Linux system will use WMCTRL to get a list of all current windows and add it to the windows dict. Key is first 28 char of win name and value is win name
+        If Linux system will use the window tracker or WMCTRL to get a list of all current windows and add it to the windows dict. Key is first 28 char of win name and value is win name
         :return: windows
         """
+        # Starts from an empty dict so closed windows are not offered again
+        self.windows = {}
         if platform.system() == 'Windows':
             enum_windows = cdll.user32.EnumWindows
             enum_windows_proc = CFUNCTYPE(c_bool, POINTER(c_int), POINTER(c_int))
             enum_windows(enum_windows_proc(self.__win_enum_handler), 0)
         elif platform.system() == 'Linux':
-            windows_list = wmctrl.Window.list()
+            windows_list = self.__linux_windows()
             for window in windows_list:
                 self.windows[window.wm_name[0:28]] = window.wm_name
         else:
             return {}
         return self.windows
 
-    def get_screenshot(self, window_title: str) -> Image:
-        # pylint: disable=invalid-name
+    def get_screenshot(self, window_title: str, is_active: Callable[[], bool] = None) -> Image.Image:
         """
         Screenshot returns a screenshot of the specified window.
-        If windows, uses ctypes to set the window to the foreground and then gets the location of the window and passes it to mss.
-        If linux, uses wmctrl to set window to the foreground and then gets the location of the window and passes it to mss
+        The window is brought to the foreground with activate_window unless it already was, then the location of the
+        window is passed to mss. The screenshot is taken as soon as the window is active and its content has stopped
+        changing.
         Parameters
         ----------
         window_title : str
             the title of the window that contains the cameras
+        is_active : Callable
+            readiness check returned by activate_window when the window was already activated, for example on the
+            user interface thread before capturing in a worker thread
         """
+        if is_active is None:
+            is_active = self.activate_window(window_title)
+        if is_active is None:
+            return
+        return self.__capture_when_ready(is_active)
+
+    def activate_window(self, window_title: str) -> Optional[Callable[[], bool]]:
+        # pylint: disable=invalid-name
+        """
+        Brings a window to the foreground and sets window_geometry and the profile of the window.
+        If windows, uses ctypes to set the window to the foreground.
+        If linux, uses the window tracker or wmctrl to set the window to the foreground
+        :param window_title: the title of the window that contains the cameras
+        :return: function returning True once the window is active and mapped or None if the window was not found
+        """
+        self.select_profile(window_title)
         if platform.system() == 'Windows':
             find_window = cdll.user32.FindWindowW
             window_handle = find_window(None, window_title)
@@ -113,30 +331,197 @@ class ImageProcessing:
                 get_window_rect = cdll.user32.GetWindowRect
                 get_window_rect(window_handle, ctypes.pointer(window_rect))
                 x, y, x1, y1 = window_rect.left, window_rect.top, window_rect.right, window_rect.bottom
-                time.sleep(1)
-                screenshotter = mss()
-                for filename in screenshotter.save(
-                        output=os.path.join(self.save_location, 'tempFullScreen.png'), mon=-1):
-                    image = Image.open(filename)
-                    cropped_image = image.crop((x, y, x1, y1))
-                    if not self.debug:
-                        os.remove(filename)
-                    return cropped_image
+                self.window_geometry = (x, y, x1, y1)
+
+                def is_active():
+                    return (cdll.user32.GetForegroundWindow() == window_handle
+                            and cdll.user32.IsWindowVisible(window_handle)
+                            and not cdll.user32.IsIconic(window_handle))
+                return is_active
         elif platform.system() == 'Linux':
-            window_handle = wmctrl.Window.by_name(window_title)[0]
+            window_handle = self.__linux_windows(window_title)[0]
+            self.window_geometry = self.__linux_geometry(window_handle)
+            window_id = int(window_handle.id, 16)
+            tracker = self.window_tracker
+            if tracker is not None:
+                tracker.activate(window_id)
+                # The window manager only sets _NET_ACTIVE_WINDOW once the window is mapped and raised
+                return lambda: tracker.active == window_id
+            # wmctrl can not tell when the window is active without xprop, so a short delay is waited instead
             window_handle.activate()
-            x, y, x1, y1 = window_handle.x, window_handle.y, window_handle.x + window_handle.w, window_handle.y + window_handle.h
-            time.sleep(1)
-            screenshotter = mss()
-            for filename in screenshotter.save(output=os.path.join(self.save_location, 'tempFullScreen.png'),
-                                               mon=-1):
-                image = Image.open(filename)
-                cropped_image = image.crop((x, y + 20, x1, y1))
-                if not self.debug:
-                    os.remove(filename)
-                return cropped_image
-        else:
+            activated = time.perf_counter()
+            return lambda: time.perf_counter() - activated >= self.activation_delay
+        return None
+
+    def __capture_when_ready(self, is_active: Callable[[], bool]) -> Image.Image:
+        """
+        Grabs window_geometry with wait_until_ready, with the pointer parked outside the window while park_pointer
+        is on so controls the call client shows on hover are not captured
+        :param is_active: Returns True when the window is activated and mapped
+        :return: Image of the window
+        """
+        x, y, x1, y1 = self.window_geometry
+        region = {'left': x, 'top': y, 'width': x1 - x, 'height': y1 - y}
+        with mss.mss() as screenshotter:
+            with self.__pointer_parked(region, screenshotter.monitors[0]):
+                shot = self.wait_until_ready(lambda: screenshotter.grab(region), is_active)
+            image = Image.frombytes('RGB', shot.size, shot.bgra, 'raw', 'BGRX')
+            if self.debug:
+                # The whole screen is grabbed right after the window so it shows the moment detection saw,
+                # only shrinking, encoding and writing it is left to the writer thread
+                self.debug_writer.submit('full_screen', np.asarray(screenshotter.grab(screenshotter.monitors[0])))
+        return image
+
+    def wait_until_ready(self, grab: Callable[[], np.ndarray], is_active: Callable[[], bool]) -> np.ndarray:
+        """
+        Grabs until the window is active and two grabs in a row match, or until capture_timeout passes.
+        The time spent waiting is stored in metrics as capture_wait along with the number of grabs as capture_grabs
+        :param grab: Returns a BGRA grab of the window
+        :param is_active: Returns True when the window is activated and mapped
+        :return: the last grab
+        """
+        start = time.perf_counter()
+        grabs = 0
+        previous = None
+        shot = None
+        while True:
+            if is_active():
+                shot = grab()
+                grabs += 1
+                # Compares a sparse grid of pixels so fading controls are seen as changes
+                signature = np.asarray(shot, dtype=np.int16)[::8, ::8, :3]
+                if previous is not None and np.abs(signature - previous).mean() <= self.stable_tolerance:
+                    break
+                previous = signature
+            if time.perf_counter() - start > self.capture_timeout:
+                if shot is None:
+                    shot = grab()
+                    grabs += 1
+                break
+            time.sleep(self.capture_poll_interval)
+        self.metrics['capture_wait'] = time.perf_counter() - start
+        self.metrics['capture_grabs'] = grabs
+        return shot
+
+    @contextmanager
+    def __pointer_parked(self, region: Dict[str, int], screen: Dict[str, int]):
+        """
+        Moves the pointer just outside region while the with block runs if it is inside and moves it back after.
+        A static hover overlay looks ready to the stability check, so it has to be hidden before the grabs
+        :param region: Captured region in mss format
+        :param screen: Bounds of every monitor in mss format
+        """
+        pointer = self.__pointer() if self.park_pointer else None
+        x, y = region['left'], region['top']
+        x1, y1 = x + region['width'], y + region['height']
+        if pointer is None or not (x <= pointer[0] < x1 and y <= pointer[1] < y1):
+            yield
             return
+        screen_x, screen_y = screen['left'], screen['top']
+        screen_x1, screen_y1 = screen_x + screen['width'], screen_y + screen['height']
+        # Nearest point just outside each edge that is still on screen
+        outside = [(x - 1, pointer[1]), (x1, pointer[1]), (pointer[0], y - 1), (pointer[0], y1)]
+        outside = [point for point in outside if screen_x <= point[0] < screen_x1 and screen_y <= point[1] < screen_y1]
+        if not outside:
+            yield
+            return
+        self.__move_pointer(*min(outside, key=lambda point: abs(point[0] - pointer[0]) + abs(point[1] - pointer[1])))
+        try:
+            yield
+        finally:
+            self.__move_pointer(*pointer)
+
+    def __pointer(self) -> Optional[Tuple[int, int]]:
+        """
+        Returns the screen position of the pointer or None if it can not be read
+        """
+        if platform.system() == 'Windows':
+            point = wintypes.POINT()
+            if cdll.user32.GetCursorPos(ctypes.byref(point)):
+                return point.x, point.y
+            return None
+        tracker = self.window_tracker
+        return tracker.pointer() if tracker is not None else None
+
+    def __move_pointer(self, x: int, y: int):
+        """
+        Moves the pointer to a screen position
+        """
+        if platform.system() == 'Windows':
+            cdll.user32.SetCursorPos(x, y)
+        elif self.window_tracker is not None:
+            self.window_tracker.move_pointer(x, y)
+
+    def grab_frame(self) -> np.ndarray:
+        """
+        Grabs the last captured window region without activating the window. Used to watch a call after detection
+        :return: BGRA frame of the window
+        """
+        screenshotter = getattr(self._thread_local, 'screenshotter', None)
+        if screenshotter is None:
+            # mss keeps per thread handles so every thread gets its own screenshotter
+            screenshotter = mss.mss()
+            self._thread_local.screenshotter = screenshotter
+        x, y, x1, y1 = self.window_geometry
+        return np.asarray(screenshotter.grab({'left': x, 'top': y, 'width': x1 - x, 'height': y1 - y}))
+
+    def get_window_geometry(self, window_title: str) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Returns the screen position (x, y, x1, y1) of a window without activating or capturing it.
+        The titlebar of the window's profile is removed from wmctrl windows the same way as in get_screenshot
+        :param window_title: the title of the window
+        :return: tuple or None if the window can not be found
+        """
+        if platform.system() == 'Windows':
+            window_handle = cdll.user32.FindWindowW(None, window_title)
+            if not window_handle:
+                return None
+            window_rect = wintypes.RECT()
+            cdll.user32.GetWindowRect(window_handle, ctypes.pointer(window_rect))
+            return window_rect.left, window_rect.top, window_rect.right, window_rect.bottom
+        if platform.system() == 'Linux':
+            windows = self.__linux_windows(window_title)
+            if not windows:
+                return None
+            self.select_profile(window_title)
+            return self.__linux_geometry(windows[0])
+        return None
+
+    def get_window_class(self, window_title: str) -> str:
+        """
+        Returns the class and exe name of a window for picking its detector profile
+        :param window_title: the title of the window
+        :return: str or an empty string if the window can not be found
+        """
+        if platform.system() == 'Windows':
+            window_handle = cdll.user32.FindWindowW(None, window_title)
+            if not window_handle:
+                return ''
+            class_name = ctypes.create_unicode_buffer(256)
+            cdll.user32.GetClassNameW(window_handle, class_name, 256)
+            pid = ctypes.c_ulong()
+            cdll.user32.GetWindowThreadProcessId(window_handle, ctypes.byref(pid))
+            try:
+                exe = psutil.Process(pid.value).name()
+            except psutil.Error:
+                exe = ''
+            return class_name.value + ' ' + exe
+        if platform.system() == 'Linux':
+            windows = self.__linux_windows(window_title)
+            return windows[0].wm_class if windows else ''
+        return ''
+
+    def select_profile(self, window_title: str) -> detector_profiles.DetectorProfile:
+        """
+        Classifies a window by its class and exe name and makes its profile the one frames are detected with.
+        The profile is kept when the window can not be found
+        :param window_title: the title of the window
+        :return: DetectorProfile
+        """
+        window_class = self.get_window_class(window_title)
+        if window_class:
+            self.profile = detector_profiles.classify(window_class, self.profiles)
+        return self.profile
 
     def get_exe_name(self, window_title: str) -> str:
         """
@@ -157,11 +542,11 @@ class ImageProcessing:
             exe = psutil.Process(pid.value).name()
             return "{id}:{title}:{exe}".format(id=window_title, title=class_name.value, exe=exe)
         if platform.system() == 'Linux':
-            window = wmctrl.Window.by_name(window_title)[0]
+            window = self.__linux_windows(window_title)[0]
             return "{id}\r\n{title}\r\n{exe}".format(id=int(window.id, 16), title=window.wm_name,
                                                      exe=window.wm_class.split('.')[0])
 
-    def get_camera_pos(self, window_title: str, screenshot: str = None) -> dict:
+    def get_camera_pos(self, window_title: str, screenshot: str = None, is_active: Callable[[], bool] = None) -> dict:
         """
         Returns the camera positions from the provided window in an array.
         Each position contains the x and y of the top left corner and the width and height of each camera.
@@ -170,67 +555,177 @@ class ImageProcessing:
         ----------
         window_title : str
             the title of the window that contains the cameras
-        debug : bool
-            if True then the image of the window as well as each camera crop will be stored for debugging usage.
+        screenshot : str
+            path of a screenshot to detect the cameras of instead of capturing the window
+        is_active : Callable
+            readiness check returned by activate_window when the window was already activated
 
         :return: array of camera positions (x,y,width,height)
         """
         if not screenshot:
-            window_img = self.get_screenshot(window_title)
+            window_img = self.get_screenshot(window_title, is_active)
         else:
             window_img = Image.open(screenshot)
+            self.window_geometry = (0, 0, window_img.width, window_img.height)
         if window_img:
-            # Saves the window image and passes it to cv2 to process camera locations.
-            window_img.save(os.path.join(self.save_location, 'window.png'))
-            process_img = cv2.imread(os.path.join(self.save_location, 'window.png'))
-            process_img_masked = cv2.imread(os.path.join(self.save_location, 'window.png'))
-
-            # Filters image and creates a mask of all black areas to mark out where cameras are
-            hsv = cv2.cvtColor(process_img, cv2.COLOR_BGR2HSV)
-            background = np.array([0, 0, 0])
-            background2 = np.array([1, 1, 1])
-            mask = cv2.inRange(hsv, background, background2)
-            process_img_masked[mask > 0] = (0, 0, 255)
-            kernel = np.ones((5, 5), np.uint8)
-            erosion = cv2.erode(mask, kernel, iterations=0)
-            edged = cv2.Canny(erosion, 30, 200)
-
+            # Converts the window image to a BGR array and passes it to cv2 to process camera locations.
+            process_img = cv2.cvtColor(np.asarray(window_img.convert('RGB')), cv2.COLOR_RGB2BGR)
             if self.debug:
-                cv2.imwrite(os.path.join(self.save_location, 'mask.png'), mask)
-                cv2.imwrite(os.path.join(self.save_location, 'processed_image.png'), process_img_masked)
-                cv2.imwrite(os.path.join(self.save_location, 'erosion.png'), erosion)
-                cv2.imwrite(os.path.join(self.save_location, 'edged.png'), edged)
-
-            contours, _ = cv2.findContours(edged, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-            rects = [cv2.boundingRect(cnt) for cnt in contours]
-            rects = sorted(rects, reverse=True)
-            index = 0
-            y_old = 5000
-            x_old = 5000
-            cam_area = 0
-            # Loops through all rects to figure out camera area
-            for rect in rects:
-                x_position, y_position, width, height = rect
-                area = width * height
-                if area > cam_area and width < process_img.shape[1] - 150:
-                    cam_area = area
-
-            # Loops through all rects and if camera is detected will save it's location to camera_pos
-            for rect in rects:
-                x_position, y_position, width, height = rect
-                area = width * height
-                if area == cam_area:
-                    if abs(y_old - y_position) > 1 or abs(x_old - x_position > 1):
-                        y_old = y_position
-                        x_old = x_position
-                        x_position, y_position, width, height = rect
-                        self.cameras[os.path.join(self.save_location, str(index) + '.jpg')] = [rect, '']
-
-                        out = process_img[y_position + 10:y_position + height - 10,
-                              x_position + 10:x_position + width - 10]
-                        if len(out.tobytes()) > 0:
-                            cv2.imwrite(os.path.join(self.save_location, str(index) + '.jpg'), out)
-                        index += 1
-        if not self.debug:
-            os.remove(os.path.join(self.save_location, 'window.png'))
+                self.debug_writer.submit('window', process_img)
+            cameras = self.process_frame(process_img)
+            if self.recorder is not None:
+                # The exe string is recorded as sent to OBS so a replay sends the same window as the live run
+                exe = self.get_exe_name(window_title) if window_title else None
+                self.recorder.record(process_img, self.window_geometry, cameras, window_title, self.profile.name, exe)
         return self.cameras
+
+    def process_frame(self, process_img: np.ndarray, save_crops: bool = True) -> dict:
+        """
+        Finds the camera positions in an already captured BGR frame and stores them in cameras as a new generation.
+        Only the region of interest of the current profile is searched and the camera positions are moved back to
+        window coordinates. If the region matches a layout in templates the cameras are snapped to it, otherwise
+        the full detector runs and its result is added to templates.
+
+        Parameters
+        ----------
+        process_img : np.ndarray
+            BGR image of the call window
+        save_crops : bool
+            if True then a jpg of each camera is written to the save location for the user interface
+
+        :return: dict of camera positions
+        """
+        if self.governor is not None:
+            self.metrics['cpu_usage'] = self.governor.usage
+            self.metrics['cpu_budget'] = self.governor.budget
+        self.detections.begin()
+        region_x, region_y, region_x1, region_y1 = self.profile.region(process_img.shape[1], process_img.shape[0])
+        tile_area = process_img[region_y:region_y1, region_x:region_x1]
+        origin = (region_x, region_y)
+        mask, erosion, edged = self.__filter_frame(tile_area)
+        small_mask = layout_cache.shrink_mask(mask)
+        self.mask_hash = layout_cache.mask_hash(small_mask)
+        self.detections.describe(self.mask_hash, self.window_geometry)
+        size = (tile_area.shape[1], tile_area.shape[0])
+        if self.templates is not None:
+            rects, self.metrics['template_score'] = self.templates.match(small_mask, size)
+            self.metrics['snapped'] = rects is not None
+            if rects is not None:
+                for index, rect in enumerate(rects):
+                    self.__add_camera(process_img, rect, index, save_crops, origin)
+                return self.cameras
+
+        if self.debug:
+            # The masked image is drawn on the writer thread so debugging adds next to nothing to detection
+            def masked_image(image=tile_area, background=mask):
+                process_img_masked = image.copy()
+                process_img_masked[background > 0] = (0, 0, 255)
+                return process_img_masked
+            self.debug_writer.submit('mask', mask, mask=True)
+            self.debug_writer.submit('processed_image', masked_image)
+            self.debug_writer.submit('erosion', erosion, mask=True)
+            self.debug_writer.submit('edged', edged, mask=True)
+
+        contours, _ = cv2.findContours(edged, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        rects = [cv2.boundingRect(cnt) for cnt in contours]
+        rects = sorted(rects, reverse=True)
+        index = 0
+        y_old = 5000
+        x_old = 5000
+        cam_area = 0
+        # Loops through all rects to figure out camera area
+        for rect in rects:
+            x_position, y_position, width, height = rect
+            area = width * height
+            if area > cam_area and width < tile_area.shape[1] - 150:
+                cam_area = area
+
+        # Loops through all rects and if camera is detected will save it's location to camera_pos
+        detected = []
+        for rect in rects:
+            x_position, y_position, width, height = rect
+            area = width * height
+            if area == cam_area:
+                if abs(y_old - y_position) > 1 or abs(x_old - x_position > 1):
+                    y_old = y_position
+                    x_old = x_position
+                    self.__add_camera(process_img, rect, index, save_crops, origin)
+                    detected.append(rect)
+                    index += 1
+        if self.templates is not None:
+            self.templates.add(small_mask, size, detected)
+        return self.cameras
+
+    @staticmethod
+    def __filter_strip(process_img: np.ndarray, background_low: Tuple[int, int, int],
+                       background_high: Tuple[int, int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Creates the background mask, eroded mask and edges of a frame or a strip of one
+        :param process_img: BGR image
+        :param background_low: Lowest HSV colour of the background
+        :param background_high: Highest HSV colour of the background
+        :return: (mask, erosion, edged)
+        """
+        # Filters image and creates a mask of all background areas to mark out where cameras are
+        hsv = cv2.cvtColor(process_img, cv2.COLOR_BGR2HSV)
+        background = np.array(background_low)
+        background2 = np.array(background_high)
+        mask = cv2.inRange(hsv, background, background2)
+        kernel = np.ones((5, 5), np.uint8)
+        erosion = cv2.erode(mask, kernel, iterations=0)
+        edged = cv2.Canny(erosion, 30, 200)
+        return mask, erosion, edged
+
+    def __filter_frame(self, process_img: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Creates the background mask, eroded mask and edges of a frame. Frames of at least strip_min_pixels are split
+        into horizontal strips that are filtered on strip_workers threads, as OpenCV releases the GIL.
+        Every strip is filtered with STRIP_OVERLAP extra rows above and below it that are then dropped.
+        The erode kernel and Canny's Sobel and non maximum suppression only reach a few rows, and every edge of a
+        0 or 255 mask is well above Canny's high threshold so hysteresis never follows an edge across a strip.
+        The stitched result is therefore identical to filtering the frame in a single pass and contours crossing
+        strip borders are found whole by the single findContours call that follows
+        :param process_img: BGR image of the call window
+        :return: (mask, erosion, edged)
+        """
+        background = (self.profile.background_low, self.profile.background_high)
+        height = process_img.shape[0]
+        strips = min(self.strip_workers, height // (4 * STRIP_OVERLAP))
+        if strips < 2 or process_img.shape[0] * process_img.shape[1] < self.strip_min_pixels:
+            return self.__filter_strip(process_img, *background)
+        if self._strip_pool is None or self._strip_pool_size != strips:
+            if self._strip_pool is not None:
+                self._strip_pool.shutdown(wait=False)
+            self._strip_pool = ThreadPoolExecutor(strips, thread_name_prefix='strip')
+            self._strip_pool_size = strips
+        outputs = tuple(np.empty(process_img.shape[:2], np.uint8) for _ in range(3))
+        bounds = [height * strip // strips for strip in range(strips + 1)]
+
+        def filter_strip(strip: int):
+            top, bottom = bounds[strip], bounds[strip + 1]
+            padded_top, padded_bottom = max(top - STRIP_OVERLAP, 0), min(bottom + STRIP_OVERLAP, height)
+            results = self.__filter_strip(process_img[padded_top:padded_bottom], *background)
+            for output, result in zip(outputs, results):
+                output[top:bottom] = result[top - padded_top:bottom - padded_top]
+        list(self._strip_pool.map(filter_strip, range(strips)))
+        return outputs
+
+    def __add_camera(self, process_img: np.ndarray, rect: Tuple[int, int, int, int], index: int, save_crops: bool,
+                     origin: Tuple[int, int] = (0, 0)):
+        """
+        Stores a camera in cameras and writes a jpg of it for the user interface
+        :param process_img: BGR image of the call window
+        :param rect: (x, y, width, height) of the camera inside the region of interest
+        :param index: Position of the camera used to name its jpg
+        :param save_crops: if True then the jpg is written
+        :param origin: (x, y) of the region of interest in the window
+        """
+        x_position, y_position, width, height = rect
+        if origin != (0, 0):
+            x_position, y_position = x_position + origin[0], y_position + origin[1]
+            rect = (x_position, y_position, width, height)
+        path = self.detections.add(index, rect)
+        out = process_img[y_position + 10:y_position + height - 10,
+              x_position + 10:x_position + width - 10]
+        if save_crops and out.size > 0:
+            cv2.imwrite(path, out)
@@ -0,0 +1,182 @@
+"""
+Persistent cache of detected camera layouts so a known call window can be remapped without capturing it again.
+"""
+from __future__ import annotations  # Keeps numpy annotations from importing it
+
+import hashlib  # Used to hash the background mask of a window
+import json  # Used to store the cache on disk
+import os  # Used for cache paths
+import shutil  # Used to copy camera images into the cache
+import time  # Used to keep the most recently used layouts and to space out saves
+from typing import Dict, List, Optional, Tuple, Union  # Used for typing
+
+from mappingUtils.lazy_import import lazy_import  # Used to import heavy modules on first use
+
+cv2 = lazy_import('cv2')  # Used to shrink the mask before hashing
+np = lazy_import('numpy')  # Used to threshold the shrunk mask
+
+
+# (width, height) masks are shrunk to before hashing or matching against layout templates
+SMALL_MASK_SIZE = (64, 36)
+
+
+def shrink_mask(mask: np.ndarray) -> np.ndarray:
+    """
+    Shrinks a background mask to SMALL_MASK_SIZE, averaging the pixels each small pixel covers
+    :param mask: Background mask from detection
+    :return: shrunk mask
+    """
+    return cv2.resize(mask, SMALL_MASK_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def mask_hash(mask: np.ndarray) -> str:
+    """
+    Hashes a shrunk copy of a background mask so small capture noise does not change the hash
+    :param mask: Background mask from detection or a mask already shrunk with shrink_mask
+    :return: hex digest
+    """
+    small = mask if mask.shape == SMALL_MASK_SIZE[::-1] else shrink_mask(mask)
+    return hashlib.sha1(np.packbits(small > 127).tobytes()).hexdigest()[:16]
+
+
+class LayoutCache:
+    """
+    Maps (preset, window, window size, mask hash) to the detected camera rects and the people bound to them.
+    Attributes
+    ----------
+    cache_file : str
+        JSON file the cache is stored in
+    image_location : str
+        Folder the camera images of every cached layout are stored in
+    max_entries : int
+        Number of layouts kept before the least recently used one is removed
+    entries : list
+        Cached layouts
+    save_interval : float
+        Seconds between saves when layouts are stored. Layouts stored in between are written by the next save or by
+        flush
+    """
+    cache_file: str
+    image_location: str
+    max_entries: int
+    entries: List[dict]
+    save_interval: float
+
+    def __init__(self, cache_file: str, max_entries: int = 64, save_interval: float = 5.0):
+        self.cache_file = cache_file
+        self.image_location = os.path.splitext(cache_file)[0]
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self.entries = []
+        self._unsaved = False
+        self._saved_at = None
+        self.load()
+
+    def load(self):
+        """
+        Loads the cache from disk. A missing or broken cache file leaves the cache empty
+        """
+        try:
+            with open(self.cache_file, 'r', encoding='UTF-8') as cache:
+                self.entries = json.load(cache)['layouts']
+        except (FileNotFoundError, json.decoder.JSONDecodeError, KeyError):
+            self.entries = []
+
+    def save(self):
+        """
+        Writes the cache to disk
+        """
+        self._unsaved = False
+        self._saved_at = time.monotonic()
+        directory = os.path.dirname(self.cache_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.cache_file, 'w', encoding='UTF-8') as cache:
+            json.dump({'layouts': self.entries}, cache)
+
+    def flush(self):
+        """
+        Writes layouts stored since the last save to disk
+        """
+        if self._unsaved:
+            self.save()
+
+    def recent(self) -> List[dict]:
+        """
+        Returns the cached layouts from the most to the least recently used
+        """
+        return sorted(self.entries, key=lambda item: item['used'], reverse=True)
+
+    def find(self, preset: str, window: str, size: Tuple[int, int], mask: str = None) -> Optional[dict]:
+        """
+        Finds a cached layout. If no mask hash is given the most recent layout for the window size is returned
+        :param preset: Preset name
+        :param window: Window title
+        :param size: (width, height) of the window
+        :param mask: Mask hash of the window or None
+        :return: cached layout or None
+        """
+        for entry in self.recent():
+            if entry['preset'] == preset and entry['window'] == window and tuple(entry['size']) == tuple(size):
+                if mask is None or entry['mask'] == mask:
+                    return entry
+        return None
+
+    def get(self, preset: str, window: str, size: Tuple[int, int],
+            mask: str = None) -> Optional[Dict[str, List[Union[list, str]]]]:
+        """
+        Returns the cached cameras in the same format as ImageProcessing.cameras
+        :param preset: Preset name
+        :param window: Window title
+        :param size: (width, height) of the window
+        :param mask: Mask hash of the window or None
+        :return: dict of cameras or None
+        """
+        entry = self.find(preset, window, size, mask)
+        if entry is None:
+            return None
+        entry['used'] = time.time()
+        cameras = {}
+        for index, camera in enumerate(entry['cameras']):
+            cameras[os.path.join(self.image_location, entry['id'], str(index) + '.jpg')] = [tuple(camera['rect']),
+                                                                                            camera['name']]
+        return cameras
+
+    def put(self, preset: str, window: str, size: Tuple[int, int], mask: str,
+            cameras: Dict[str, List[Union[list, str]]]):
+        """
+        Stores a layout, replacing any layout with the same key. Camera images are only copied for a new layout or when
+        the cameras moved, so rebinding people is cheap, and the cache is saved at most once every save_interval seconds
+        :param preset: Preset name
+        :param window: Window title
+        :param size: (width, height) of the window
+        :param mask: Mask hash of the window
+        :param cameras: dict of cameras in the same format as ImageProcessing.cameras
+        """
+        entry = self.find(preset, window, size, mask)
+        if entry is None:
+            entry = {'id': hashlib.sha1('{0}\n{1}\n{2}\n{3}'.format(preset, window, list(size), mask).encode()
+                                        ).hexdigest()[:16],
+                     'preset': preset, 'window': window, 'size': list(size), 'mask': mask}
+            self.entries.append(entry)
+        entry['used'] = time.time()
+        cached_rects = [camera['rect'] for camera in entry.get('cameras', [])]
+        entry['cameras'] = [{'rect': [int(value) for value in camera[0]], 'name': camera[1]}
+                            for camera in cameras.values()]
+        # Copies the camera images so the cached layout can still be shown after the next detection
+        image_folder = os.path.join(self.image_location, entry['id'])
+        if cached_rects != [camera['rect'] for camera in entry['cameras']] or not os.path.exists(image_folder):
+            if not os.path.exists(image_folder):
+                os.makedirs(image_folder)
+            for index, image in enumerate(cameras.keys()):
+                cached_image = os.path.join(image_folder, str(index) + '.jpg')
+                if os.path.isfile(image) and os.path.abspath(image) != os.path.abspath(cached_image):
+                    shutil.copyfile(image, cached_image)
+        # Removes the least recently used layouts
+        while len(self.entries) > self.max_entries:
+            oldest = min(self.entries, key=lambda item: item['used'])
+            self.entries.remove(oldest)
+            shutil.rmtree(os.path.join(self.image_location, oldest['id']), ignore_errors=True)
+        self._unsaved = True
+        if self._saved_at is None or time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
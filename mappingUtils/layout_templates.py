@@ -0,0 +1,158 @@
+"""
+Library of camera layouts learned from earlier detections that new frames can be snapped to without running
+the full detector.
+
+Call clients only use a handful of layouts, a single camera, grids and a speaker with a strip. Every template keeps
+its tile rects as fractions of the window size along with the shrunk background mask of the frame it came from.
+A new frame is scored against every template at once by comparing shrunk masks, so snapping costs a fraction
+of a millisecond however big the window is.
+"""
+from __future__ import annotations  # Keeps numpy annotations from importing it
+
+import json  # Used to store the library on disk
+import os  # Used for library paths
+import time  # Used to keep the most recently used templates and to space out saves
+from typing import List, Optional, Sequence, Tuple  # Used for typing
+
+from mappingUtils import layout_cache  # Used to shrink masks the same way as for the layout cache hash
+from mappingUtils.lazy_import import lazy_import  # Used to import heavy modules on first use
+
+np = lazy_import('numpy')  # Used to score every template at once
+
+
+class TemplateLibrary:
+    """
+    Stores normalised tile layouts and finds the one matching a frame's background mask.
+    Attributes
+    ----------
+    library_file : str
+        JSON file the library is stored in or None to only keep it in memory
+    min_score : float
+        Score from 0 to 1 a template needs for a frame to be snapped to it
+    max_templates : int
+        Number of templates kept before the least recently used one is removed
+    templates : list
+        Stored templates, each with its normalised rects, shrunk mask and last use time
+    save_interval : float
+        Seconds between saves when templates are added. Templates added in between are written by the next save
+        or by flush
+    """
+    library_file: Optional[str]
+    min_score: float
+    max_templates: int
+    templates: List[dict]
+    save_interval: float
+
+    def __init__(self, library_file: str = None, min_score: float = 0.98, max_templates: int = 32,
+                 save_interval: float = 30.0):
+        self.library_file = library_file
+        self.min_score = min_score
+        self.max_templates = max_templates
+        self.save_interval = save_interval
+        self.templates = []
+        self._masks = None
+        self._unsaved = False
+        self._saved_at = None
+        self.load()
+
+    def load(self):
+        """
+        Loads the library from disk. A missing or broken library file leaves the library empty
+        """
+        self.templates = []
+        if self.library_file is not None:
+            try:
+                with open(self.library_file, 'r', encoding='UTF-8') as library:
+                    for template in json.load(library)['templates']:
+                        template['mask'] = np.frombuffer(bytes.fromhex(template['mask']), np.uint8).reshape(
+                            layout_cache.SMALL_MASK_SIZE[::-1])
+                        self.templates.append(template)
+            except (FileNotFoundError, json.decoder.JSONDecodeError, KeyError, ValueError):
+                self.templates = []
+        self._masks = None
+
+    def save(self):
+        """
+        Writes the library to disk
+        """
+        self._unsaved = False
+        self._saved_at = time.monotonic()
+        if self.library_file is None:
+            return
+        directory = os.path.dirname(self.library_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.library_file, 'w', encoding='UTF-8') as library:
+            json.dump({'templates': [dict(template, mask=template['mask'].tobytes().hex())
+                                     for template in self.templates]}, library)
+
+    def flush(self):
+        """
+        Writes templates added since the last save to disk
+        """
+        if self._unsaved:
+            self.save()
+
+    def scores(self, small_mask: np.ndarray) -> np.ndarray:
+        """
+        Scores every template against a frame. 1 means the shrunk masks are identical
+        :param small_mask: Background mask of the frame shrunk with layout_cache.shrink_mask
+        :return: array with the score of every template
+        """
+        if not self.templates:
+            return np.zeros(0)
+        if self._masks is None:
+            # Stacks the template masks once so every frame is scored with a single subtraction
+            self._masks = np.stack([template['mask'].ravel() for template in self.templates]).astype(np.int16)
+        difference = np.abs(self._masks - small_mask.ravel().astype(np.int16)).mean(axis=1)
+        return 1 - difference / 255
+
+    def match(self, small_mask: np.ndarray,
+              size: Tuple[int, int]) -> Tuple[Optional[List[Tuple[int, int, int, int]]], float]:
+        """
+        Snaps a frame to the best scoring template
+        :param small_mask: Background mask of the frame shrunk with layout_cache.shrink_mask
+        :param size: (width, height) of the frame
+        :return: (rects in frame pixels or None if no template scored at least min_score, best score)
+        """
+        scores = self.scores(small_mask)
+        if scores.size == 0:
+            return None, 0.0
+        best = int(np.argmax(scores))
+        if scores[best] < self.min_score:
+            return None, float(scores[best])
+        template = self.templates[best]
+        template['used'] = time.time()
+        width, height = size
+        rects = [(int(round(x * width)), int(round(y * height)), int(round(w * width)), int(round(h * height)))
+                 for x, y, w, h in template['rects']]
+        return rects, float(scores[best])
+
+    def add(self, small_mask: np.ndarray, size: Tuple[int, int], rects: Sequence[Tuple[int, int, int, int]]):
+        """
+        Adds the result of a full detection, replacing the template it matches if there is one. The library is saved
+        at most once every save_interval seconds
+        :param small_mask: Background mask of the frame shrunk with layout_cache.shrink_mask
+        :param size: (width, height) of the frame
+        :param rects: Detected (x, y, width, height) of every camera
+        """
+        if not rects:
+            return
+        width, height = size
+        template = {
+            'rects': [[x / width, y / height, w / width, h / height] for x, y, w, h in rects],
+            'mask': np.ascontiguousarray(small_mask, np.uint8),
+            'used': time.time()
+        }
+        scores = self.scores(small_mask)
+        if scores.size and scores.max() >= self.min_score:
+            self.templates[int(np.argmax(scores))] = template
+        else:
+            self.templates.append(template)
+        # Removes the least recently used templates
+        while len(self.templates) > self.max_templates:
+            del self.templates[min(range(len(self.templates)), key=lambda index: self.templates[index]['used'])]
+        self._masks = None
+        self._unsaved = True
+        if self._saved_at is None or time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
@@ -0,0 +1,55 @@
+"""
+Lazy module imports so heavy libraries like OpenCV and NumPy are only loaded the first time they are used.
+"""
+import importlib  # Used to import the module on first use
+import threading  # Used so two threads using a module for the first time only import it once
+from types import ModuleType  # Used for typing
+
+
+class LazyModule:
+    """
+    Stands in for a module and imports it on the first attribute access.
+    Attributes
+    ----------
+    name : str
+        Full name of the module to import
+    """
+    name: str
+
+    def __init__(self, name: str):
+        self.name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        """
+        Imports the module if it has not been imported yet
+        :return: the module
+        """
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self.name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        """
+        True once the module has been imported
+        """
+        return self._module is not None
+
+    def __getattr__(self, attribute: str):
+        return getattr(self.load(), attribute)
+
+    def __repr__(self) -> str:
+        return '<lazy module {name}>'.format(name=self.name)
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Returns a stand in for a module that imports it on first use
+    :param name: Full name of the module, for example 'cv2' or 'PIL.Image'
+    :return: LazyModule
+    """
+    return LazyModule(name)
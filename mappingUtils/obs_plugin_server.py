@@ -1,12 +1,133 @@
 """
 Server side of the obs plugin. Used to send information to obs
 """
+import asyncio
+import json
+import select
 import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple, Union
+
+from mappingUtils.camera_layout import CameraLayout, RELATIVE_PLACES
+
+Cameras = Union[Dict[str, List[Union[list, str]]], CameraLayout]
+
+# Seconds before a host that could not be resolved is tried again, so sends never wait on DNS every time
+RESOLVE_RETRY = 30.0
+
+
+def camera_layout(cameras: Cameras, size: Tuple[int, int],
+                  margins: Tuple[int, int, int, int] = (0, 0, 0, 0), y_offset: int = 0) -> dict:
+    """
+    Builds the layout the obs plugin needs to recompute crops itself when the call window is resized.
+    The content area is the window inside the client's chrome margins and the box is the area around every camera
+    as fractions of the content area. On a resize the plugin scales the box to fit the new content area without
+    stretching it, the way call clients scale their galleries
+    :param cameras: CameraLayout or dictionary of cameras with the value being a list of the camera rect and the
+                    person's name
+    :param size: (width, height) of the window the cameras were detected in
+    :param margins: (left, top, right, bottom) pixels of chrome at the window edges that do not scale
+    :param y_offset: Offset added to the top of every crop
+    :return: layout dict
+    """
+    width, height = size
+    left, top, right, bottom = margins
+    content_width, content_height = max(width - left - right, 1), max(height - top - bottom, 1)
+    if not isinstance(cameras, CameraLayout):
+        cameras = CameraLayout.from_cameras(cameras)
+    x, y, x1, y1 = cameras.bounds() or (left, top, width - right, height - bottom)
+    box = [(x - left) / content_width, (y - top) / content_height, (x1 - x) / content_width,
+           (y1 - y) / content_height]
+    return {'w': width, 'h': height, 'margins': [left, top, right, bottom], 'yOffset': y_offset,
+            'box': [round(value, RELATIVE_PLACES) for value in box]}
+
+
+def build_camera_crops(cameras: Cameras, y_offset: int = 0, layout: Optional[dict] = None) -> List[dict]:
+    """
+    Builds the crop information the obs plugin needs to create or edit a source for each camera
+    :param cameras: CameraLayout or dictionary of cameras with the value being a list of the camera rect and the
+                    person's name
+    :param y_offset: Offset added to the top of every crop
+    :param layout: Layout from camera_layout. When given every crop also gets its rect as fractions of the
+                   content area as nx, ny, nw and nh
+    :return: list of camera crops
+    """
+    if not isinstance(cameras, CameraLayout):
+        cameras = CameraLayout.from_cameras(cameras)
+    return cameras.crops(y_offset, layout)
+
+
+def crop_command(os_name: str, exe: str, cameras: List[dict], source_id: str = '',
+                 layout: Optional[dict] = None) -> str:
+    """
+    Builds the crop camera command sent to the obs plugin
+    :param os_name: Platform of the capture source or the settings key of the source when using a scene export
+    :param exe: Window the capture source should use
+    :param cameras: Camera crops from build_camera_crops
+    :param source_id: OBS source id used when creating a source from a scene export
+    :param layout: Layout from camera_layout so the plugin can follow window resizes, or None for fixed crops
+    :return: command message
+    """
+    command = {
+        "arg": "crop camera",
+        "os": os_name,
+        "exe": exe,
+        "cameras": cameras,
+        "id": source_id
+    }
+    if layout is not None:
+        command["layout"] = layout
+    return str(command)
+
+
+def speaker_command(cam_name: str) -> str:
+    """
+    Builds the active speaker command sent to the obs plugin
+    :param cam_name: Name of the source of the active speaker or an empty string when nobody is speaking
+    :return: command message
+    """
+    return str({
+        "arg": "active speaker",
+        "camName": cam_name
+    })
+
+
+def visibility_command(cam_name: str, visible: bool) -> str:
+    """
+    Builds the command to show or hide a camera source in the obs plugin
+    :param cam_name: Name of the camera source
+    :param visible: True to show the source and False to hide it
+    :return: command message
+    """
+    return str({
+        "arg": "camera visibility",
+        "camName": cam_name,
+        "visible": 1 if visible else 0
+    })
+
+
+def parse_target(target: str, default_port: int = 48387) -> Tuple[str, int]:
+    """
+    Parses a host:port string into a target tuple
+    :param target: host or host:port of an obs instance
+    :param default_port: Port used when the target does not have one
+    :return: (host, port)
+    :raises ValueError: If the port is not a number from 0 to 65535
+    """
+    host, _, port = str(target).rpartition(':')
+    if not host:
+        return port, default_port
+    if not port.isdigit() or int(port) > 65535:
+        raise ValueError('{0} does not have a valid port'.format(target))
+    return host, int(port)
+
 
 class Server:
     """
         OBSPluginServer is the server host for the obs plugin to map cameras inside obs.
         It connects to obs and then sends commands to the plugin with camera positions, names, and other info needed.
+        Every command is sent to all targets at the same time using one socket so backup obs instances stay in sync.
 
         Attributes
         ----------
@@ -14,15 +135,91 @@ class Server:
             host ip address
         port : int
             port for server communication
+        targets : list
+            (host, port) of every obs instance commands are sent to
+        send_status : dict
+            Result of the last send for every target. Key is the target and value is 'sent' or the error message.
+            Commands are sent over UDP so 'sent' only means the datagram left this machine, not that OBS received it
+        stats : dict
+            Send stats for every target. Key is the target and value is a dict of sent, failed, last_latency and
+            total_latency with latencies in seconds
+        telemetry : dict
+            Plugin side stats reported back by every target. Key is the target and value is a dict of reports,
+            messages, decode_time, applied, apply_time, max_apply_time, pending, created, updated, filters,
+            lagged_frames and max_tick_late with times in seconds
         """
-    def __init__(self, port=48387):
+    def __init__(self, port=48387, targets: List[Tuple[str, int]] = None):
         """
         Sets up global variables for server
 
         :param port: port for sever communication
+        :param targets: (host, port) of every obs instance to send to, defaults to obs on this machine
         """
         self.port = port
         self.server_socket = None
+        self.targets = []
+        self.send_status = {}
+        self.stats = {}
+        self.telemetry = {}
+        self._addresses = {}
+        self._resolve_after = {}
+        self._pool = None
+        self._pool_size = 0
+        for host, target_port in targets or [('localhost', port)]:
+            self.add_target(host, target_port)
+
+    def add_target(self, host: str, port: int):
+        """
+        Adds an obs instance to send commands to. The host is resolved once here instead of on every send.
+        A host that can not be resolved is kept with its error as send status and tried again on later sends
+        :param host: host name or ip address of the obs instance
+        :param port: port the obs plugin listens on
+        """
+        target = (host, port)
+        if target in self.targets:
+            return
+        self._addresses[target] = None
+        self.targets.append(target)
+        self.stats[target] = {'sent': 0, 'failed': 0, 'last_latency': 0.0, 'total_latency': 0.0}
+        self.telemetry[target] = {'reports': 0, 'messages': 0, 'decode_time': 0.0, 'applied': 0, 'apply_time': 0.0,
+                                  'max_apply_time': 0.0, 'pending': 0, 'created': 0, 'updated': 0, 'filters': 0,
+                                  'lagged_frames': 0, 'max_tick_late': 0.0}
+        self.resolve(target)
+
+    def resolve(self, target: Tuple[str, int]) -> Optional[tuple]:
+        """
+        Returns the socket address of a target, resolving its host if it has not been resolved yet.
+        Failed hosts are only tried again after RESOLVE_RETRY seconds
+        :param target: (host, port) of the obs instance
+        :return: socket address or None if the host can not be resolved
+        """
+        address = self._addresses.get(target)
+        if address is not None or time.monotonic() < self._resolve_after.get(target, 0.0):
+            return address
+        try:
+            address = socket.getaddrinfo(target[0], target[1], socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+        except (OSError, OverflowError, UnicodeError) as exception:
+            self._resolve_after[target] = time.monotonic() + RESOLVE_RETRY
+            self.send_status[target] = 'could not resolve {0}: {1}'.format(target[0], exception)
+            return None
+        self._addresses[target] = address
+        self._resolve_after.pop(target, None)
+        return address
+
+    def remove_target(self, host: str, port: int):
+        """
+        Stops sending commands to an obs instance
+        :param host: host name or ip address of the obs instance
+        :param port: port the obs plugin listens on
+        """
+        target = (host, port)
+        if target in self.targets:
+            self.targets.remove(target)
+            del self._addresses[target]
+            self._resolve_after.pop(target, None)
+            del self.stats[target]
+            del self.telemetry[target]
+            self.send_status.pop(target, None)
 
     def start_server(self):
         """
@@ -30,9 +227,325 @@ class Server:
         """
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
+    def stop_server(self):
+        """
+        Closes the socket and the sender threads
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self.server_socket is not None:
+            self.server_socket.close()
+            self.server_socket = None
+
+    def _send_to(self, target: Tuple[str, int], data: bytes):
+        """
+        Sends data to one target and records its send status and latency
+        :param target: (host, port) of the obs instance
+        :param data: encoded command message
+        """
+        address = self.resolve(target)
+        if address is None:
+            self.record_send(target, self.send_status[target], 0.0)
+            return
+        start = time.perf_counter()
+        try:
+            self.server_socket.sendto(data, address)
+            error = None
+        except OSError as exception:
+            error = str(exception)
+        self.record_send(target, error, time.perf_counter() - start)
+
+    def record_send(self, target: Tuple[str, int], error: Optional[str], latency: float):
+        """
+        Records the send status and latency of a send to a target
+        :param target: (host, port) of the obs instance
+        :param error: Error message or None if the send worked
+        :param latency: Time the send took in seconds
+        """
+        stats = self.stats.get(target)
+        if stats is None:
+            return
+        if error is None:
+            self.send_status[target] = 'sent'
+            stats['sent'] += 1
+        else:
+            self.send_status[target] = error
+            stats['failed'] += 1
+        stats['last_latency'] = latency
+        stats['total_latency'] += latency
+
+    def record_telemetry(self, address: tuple, data: bytes) -> bool:
+        """
+        Adds a telemetry report sent back by the obs plugin to the stats of the target it came from.
+        Only totals are kept so a long show does not grow the stats
+        :param address: Socket address the report came from
+        :param data: Received message
+        :return: True if the message was a telemetry report of a target
+        """
+        target = next((target for target, target_address in self._addresses.items()
+                       if target_address == address), None)
+        if target is None:
+            return False
+        try:
+            report = json.loads(data.decode('utf-8'))
+        except (UnicodeDecodeError, json.decoder.JSONDecodeError):
+            return False
+        if not isinstance(report, dict) or report.get('arg') != 'telemetry':
+            return False
+        # Every value is read before any total changes so a malformed report is dropped as a whole
+        try:
+            counts = {key: max(int(report.get(key, 0)), 0)
+                      for key in ('messages', 'applied', 'created', 'updated', 'filters', 'lagged_frames')}
+            times = {key: max(float(report.get(key, 0)), 0.0) / 1e9
+                     for key in ('decode_ns', 'apply_ns', 'max_apply_ns', 'tick_late_ns')}
+            pending = max(int(report.get('pending', 0)), 0)
+        except (TypeError, ValueError, OverflowError):
+            return False
+        telemetry = self.telemetry[target]
+        telemetry['reports'] += 1
+        for key, count in counts.items():
+            telemetry[key] += count
+        telemetry['decode_time'] += times['decode_ns']
+        telemetry['apply_time'] += times['apply_ns']
+        telemetry['max_apply_time'] = max(telemetry['max_apply_time'], times['max_apply_ns'])
+        telemetry['max_tick_late'] = max(telemetry['max_tick_late'], times['tick_late_ns'])
+        telemetry['pending'] = pending
+        return True
+
+    def poll_telemetry(self) -> int:
+        """
+        Reads every telemetry report waiting on the socket without blocking. Only needed when sending with
+        send_command, AsyncSender records reports as they arrive
+        :return: number of reports recorded
+        """
+        recorded = 0
+        while self.server_socket is not None and select.select([self.server_socket], [], [], 0)[0]:
+            try:
+                data, address = self.server_socket.recvfrom(65536)
+            except OSError:
+                # Unbound before the first send or the last send was refused
+                break
+            recorded += self.record_telemetry(address, data)
+        return recorded
+
+    def addresses(self) -> List[Tuple[Tuple[str, int], tuple]]:
+        """
+        Returns every target with its resolved socket address
+        :return: list of (target, address) with address None for hosts that can not be resolved
+        """
+        return [(target, self.resolve(target)) for target in self.targets]
+
     def send_command(self, msg):
         """
-        Sends command to obs plugin client
+        Sends command to every obs plugin client. Targets are sent to in parallel when there is more than one
+        :param msg: command message
+        """
+        data = bytes(str(msg), "utf-8")
+        if len(self.targets) == 1:
+            self._send_to(self.targets[0], data)
+            return
+        # Keeps one sender thread per target and only recreates the threads when targets are added
+        if self._pool is None or self._pool_size < len(self.targets):
+            if self._pool is not None:
+                self._pool.shutdown()
+            self._pool = ThreadPoolExecutor(max_workers=len(self.targets), thread_name_prefix='obs-sender')
+            self._pool_size = len(self.targets)
+        futures = [self._pool.submit(self._send_to, target, data) for target in self.targets]
+        wait(futures)
+
+    def get_stats(self) -> Dict[str, dict]:
+        """
+        Returns the send status and latency stats of every target with the telemetry its plugin reported under
+        plugin, so time spent sending can be compared with time spent decoding and applying in obs
+        :return: dict keyed by host:port
+        """
+        target_stats = {}
+        for target in self.targets:
+            stats = dict(self.stats[target])
+            sent = stats['sent'] + stats['failed']
+            stats['mean_latency'] = stats['total_latency'] / sent if sent else 0.0
+            stats['status'] = self.send_status.get(target, '')
+            plugin = dict(self.telemetry[target])
+            plugin['mean_decode'] = plugin['decode_time'] / plugin['messages'] if plugin['messages'] else 0.0
+            plugin['mean_apply'] = plugin['apply_time'] / plugin['applied'] if plugin['applied'] else 0.0
+            stats['plugin'] = plugin
+            target_stats['{host}:{port}'.format(host=target[0], port=target[1])] = stats
+        return target_stats
+
+
+def format_stats(target_stats: Dict[str, dict]) -> str:
+    """
+    Formats the stats of Server.get_stats as one line per target for showing to the user
+    :param target_stats: Stats from Server.get_stats
+    :return: text with send and plugin timings in milliseconds
+    """
+    lines = []
+    for target, stats in target_stats.items():
+        plugin = stats['plugin']
+        lines.append('{target}: {status}, {sent} sent, {failed} failed, send {send:.2f} ms, decode {decode:.2f} ms, '
+                     'apply {apply:.2f} ms (max {max_apply:.2f} ms), {pending} pending, {lagged} lagged frames, ticks '
+                     'up to {late:.0f} ms late'.format(target=target, status=stats['status'] or 'nothing sent yet',
+                                                       sent=stats['sent'], failed=stats['failed'],
+                                                       send=stats['mean_latency'] * 1000,
+                                                       decode=plugin['mean_decode'] * 1000,
+                                                       apply=plugin['mean_apply'] * 1000,
+                                                       max_apply=plugin['max_apply_time'] * 1000,
+                                                       pending=plugin['pending'], lagged=plugin['lagged_frames'],
+                                                       late=plugin['max_tick_late'] * 1000))
+        if plugin['reports'] == 0:
+            lines[-1] += ', no telemetry received from the plugin'
+    return '\n'.join(lines)
+
+
+class _SenderProtocol(asyncio.DatagramProtocol):
+    """
+    Datagram protocol for AsyncSender. Errors are recorded against the server instead of being raised and
+    telemetry sent back by the plugins is recorded as it arrives
+    """
+
+    def __init__(self, server: Server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.server.record_telemetry(addr, data)
+
+    def error_received(self, exc):
+        for target in self.server.targets:
+            self.server.record_send(target, str(exc), 0.0)
+
+
+class AsyncSender:
+    """
+        Sends commands to the obs plugin from the asyncio event loop without blocking the user interface.
+        Crops are queued per source and only the newest crop of each source is sent, so bursts of remaps
+        are merged into one command sent at most once every min_interval seconds.
+        All methods must be called from the event loop thread.
+
+        Attributes
+        ----------
+        server : Server
+            Server whose socket, targets and stats are used
+        min_interval : float
+            Shortest time in seconds between two sends
+        queued : int
+            Number of crops queued since the sender was started
+        sent : int
+            Number of commands sent since the sender was started
+        """
+    server: Server
+    min_interval: float
+    queued: int
+    sent: int
+
+    def __init__(self, server: Server, min_interval: float = 0.05):
+        self.server = server
+        self.min_interval = min_interval
+        self.queued = 0
+        self.sent = 0
+        self._pending = {}
+        self._layouts = {}
+        self._commands = {}
+        self._transport = None
+        self._loop = None
+        self._flush_handle = None
+        self._flush_waiters = []
+        self._last_send = 0.0
+
+    async def start(self):
+        """
+        Creates the datagram endpoint on a duplicate of the server socket. The server must be started first
+        """
+        self._loop = asyncio.get_event_loop()
+        self._transport, _ = await self._loop.create_datagram_endpoint(lambda: _SenderProtocol(self.server),
+                                                                       sock=self.server.server_socket.dup())
+
+    def close(self):
+        """
+        Sends anything still queued and closes the endpoint
+        """
+        if self._transport is not None:
+            self.flush()
+            self._transport.close()
+            self._transport = None
+
+    def send_crops(self, os_name: str, exe: str, cameras: List[dict], source_id: str = '',
+                   layout: Optional[dict] = None):
+        """
+        Queues camera crops. A queued crop for the same source is replaced by the new one. Cameras nobody is bound to
+        all have an empty camName so they are told apart by their position instead
+        :param os_name: Platform of the capture source or the settings key of the source when using a scene export
+        :param exe: Window the capture source should use
+        :param cameras: Camera crops from build_camera_crops
+        :param source_id: OBS source id used when creating a source from a scene export
+        :param layout: Layout from camera_layout, replaces the queued layout of the window
+        """
+        self._layouts[(os_name, exe, source_id)] = layout
+        sources = self._pending.setdefault((os_name, exe, source_id), {})
+        for index, camera in enumerate(cameras):
+            sources[camera['camName'] or index] = camera
+            self.queued += 1
+        self._schedule()
+
+    def send_command(self, msg, key: tuple = None):
+        """
+        Queues any other command. Commands are sent in order after the queued crops
         :param msg: command message
+        :param key: Commands queued with the same key are merged and only the newest one is sent. Keys start with the
+                    kind of command, for example ('visible', name) or ('speaker',), so commands of different kinds
+                    are never merged even when a name matches
+        """
+        if key is None:
+            key = len(self._commands)
+        self._commands[key] = bytes(str(msg), "utf-8")
+        self._schedule()
+
+    async def wait_flushed(self):
+        """
+        Waits until everything queued so far has been sent
+        """
+        if self._flush_handle is None:
+            return
+        waiter = self._loop.create_future()
+        self._flush_waiters.append(waiter)
+        await waiter
+
+    def _schedule(self):
+        """
+        Schedules a flush as soon as the rate limit allows
+        """
+        if self._flush_handle is not None:
+            return
+        delay = max(0.0, self._last_send + self.min_interval - time.perf_counter())
+        self._flush_handle = self._loop.call_later(delay, self.flush)
+
+    def flush(self):
+        """
+        Sends every queued command to every target
         """
-        self.server_socket.sendto(bytes(str(msg), "utf-8"), ('localhost', self.port))
+        self._flush_handle = None
+        messages = [bytes(crop_command(os_name, exe, list(sources.values()), source_id,
+                                       self._layouts.get((os_name, exe, source_id))), "utf-8")
+                    for (os_name, exe, source_id), sources in self._pending.items()]
+        messages.extend(self._commands.values())
+        self._pending = {}
+        self._layouts = {}
+        self._commands = {}
+        for data in messages:
+            for target, address in self.server.addresses():
+                if address is None:
+                    self.server.record_send(target, self.server.send_status[target], 0.0)
+                    continue
+                start = time.perf_counter()
+                self._transport.sendto(data, address)
+                self.server.record_send(target, None, time.perf_counter() - start)
+            self.sent += 1
+        self._last_send = time.perf_counter()
+        waiters, self._flush_waiters = self._flush_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
@@ -5,7 +5,9 @@ import json
 from os import path
 from typing import List, Any
 
-import jsonschema
+from mappingUtils.lazy_import import lazy_import
+
+jsonschema = lazy_import('jsonschema')  # Imported when presets are first validated to keep startup fast
 
 
 class PresetHandler():
@@ -17,6 +19,9 @@ class PresetHandler():
     load_json(json_file)
         Loads provided json file
 
+    validate_presets()
+        Validates loaded presets
+
     get_preset_names()
         Returns preset names
 
@@ -47,18 +52,19 @@ class PresetHandler():
         self.json_file = None
         self.presets = None
 
-    def load_json(self, json_file):
+    def load_json(self, json_file, validate=True):
         """
         Will load a provided json file and grab the presets. Will also validate the presets to make sure they are correctly formatted.
         :param json_file: File contains presets in json format
+        :param validate: If False the presets are not validated and validate_presets should be called later
         :return: None
         """
         try:
             self.json_file = open(json_file, 'r', encoding='UTF-8')
             try:
                 self.presets = json.loads(self.json_file.read())["Presets"]
-                for preset in self.presets:
-                    jsonschema.validate(instance=preset, schema=self.schema)
+                if validate:
+                    self.validate_presets()
             except json.decoder.JSONDecodeError as exception:
                 raise exception
             except jsonschema.exceptions.ValidationError as exception:
@@ -66,14 +72,37 @@ class PresetHandler():
         except FileNotFoundError as exception:
             raise exception
 
+    def validate_presets(self):
+        """
+        Validates every loaded preset against the preset schema
+        :return: None
+        """
+        for preset in self.presets:
+            jsonschema.validate(instance=preset, schema=self.schema)
+
+    @staticmethod
+    def is_well_formed(preset):
+        """
+        Checks the fields of a preset the same way as the preset schema without importing jsonschema, so presets can
+        be listed before validate_presets has run
+        :param preset: Preset loaded from the preset file
+        :return: True if the preset has a name and a list of people
+        """
+        return (isinstance(preset, dict) and isinstance(preset.get('preset_name'), str)
+                and isinstance(preset.get('people'), list)
+                and all(isinstance(person, str) for person in preset['people']))
+
     def get_preset_names(self):
         """
-        Gets preset names from preset file
+        Gets preset names from preset file. Presets that are not well formed are left out
         :return: preset_list as list
         """
         preset_list: List[Any] = []
+        if not isinstance(self.presets, list):
+            return preset_list
         for preset in self.presets:
-            preset_list.append(preset["preset_name"])
+            if self.is_well_formed(preset):
+                preset_list.append(preset["preset_name"])
         return preset_list
 
     def get_people(self, preset_name):
@@ -83,7 +112,7 @@ class PresetHandler():
         :return: people_list as list
         """
         for preset in self.presets:
-            if preset["preset_name"] == preset_name:
+            if self.is_well_formed(preset) and preset["preset_name"] == preset_name:
                 return preset["people"]
 
     def edit_preset(self, original_preset_name, edited_preset):
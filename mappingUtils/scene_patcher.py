@@ -0,0 +1,335 @@
+"""
+Sets up camera sources in an exported OBS scene collection without OBS running.
+
+For every person of a preset a window capture source is created, or updated if one already exists, with a CamCrop
+filter set to the person's camera from a detected layout and the source is added to a scene. The sources are
+copied from the 'OBSMapper-PresetName' window capture source the same way Select Screenshot uses it.
+The collection is streamed, one top level value or source at a time, so large collections are never held in memory
+as a whole.
+"""
+import argparse  # Used to run the patcher from the command line
+import copy  # Used to copy the window capture source of a preset
+import json  # Used to read and write the collection
+import uuid  # Used to give new sources an id when the collection uses them
+from typing import Dict, IO, Iterator, List, Optional, Tuple  # Used for typing
+
+from mappingUtils import obs_plugin_server  # Used to build the crops the same way as the plugin commands
+from mappingUtils.preset_handler import PresetHandler  # Used to read the people of a preset
+
+SOURCE_PREFIX = 'OBSMapper-'
+
+# Settings of a scene item added by the patcher, the same as OBS uses for a newly added source
+SCENE_ITEM_DEFAULTS = {
+    'visible': True, 'locked': False, 'rot': 0.0, 'pos': {'x': 0.0, 'y': 0.0}, 'scale': {'x': 1.0, 'y': 1.0},
+    'align': 5, 'bounds_type': 0, 'bounds_align': 0, 'bounds': {'x': 0.0, 'y': 0.0},
+    'crop_left': 0, 'crop_top': 0, 'crop_right': 0, 'crop_bottom': 0, 'group_item_backup': False
+}
+
+
+class JsonStream:
+    """
+    Reads the values of a JSON document one at a time from a file, keeping only the value being read in memory.
+    Attributes
+    ----------
+    chunk_size : int
+        Number of characters read at least each time more of the file is needed
+    """
+    chunk_size: int
+
+    def __init__(self, file: IO[str], chunk_size: int = 1 << 16):
+        self.chunk_size = chunk_size
+        self._file = file
+        self._buffer = ''
+        self._position = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def __fill(self) -> bool:
+        """
+        Reads more of the file into the buffer, dropping what has already been read
+        :return: False at the end of the file
+        """
+        self._buffer = self._buffer[self._position:]
+        self._position = 0
+        # Reads at least as much as is buffered so a large value is not decoded over and over
+        data = self._file.read(max(self.chunk_size, len(self._buffer)))
+        if not data:
+            self._eof = True
+            return False
+        self._buffer += data
+        return True
+
+    def peek(self) -> str:
+        """
+        Skips whitespace and returns the next character without reading it
+        :return: next character or an empty string at the end of the file
+        """
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in ' \t\r\n':
+                self._position += 1
+            if self._position < len(self._buffer) or not self.__fill():
+                return self._buffer[self._position:self._position + 1]
+
+    def expect(self, character: str):
+        """
+        Reads the next character
+        :raises ValueError: if it is not the expected character
+        """
+        if self.peek() != character:
+            raise ValueError('Expected {0!r} at {1!r}'.format(character, self._buffer[self._position:][:40]))
+        self._position += 1
+
+    def value(self):
+        """
+        Reads and decodes the next value
+        :return: decoded value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+                # A number at the end of the buffer may continue in the part of the file not read yet
+                if end < len(self._buffer) or self._eof:
+                    self._position = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self.__fill()
+
+    def items(self) -> Iterator[Tuple[str, 'JsonStream']]:
+        """
+        Reads a JSON object member by member. The value of every key must be read before the next key is yielded
+        :return: iterator of (key, stream positioned at the value)
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self._position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key, self
+            if self.peek() == ',':
+                self._position += 1
+            else:
+                self.expect('}')
+                return
+
+    def elements(self) -> Iterator:
+        """
+        Reads a JSON array one decoded element at a time
+        :return: iterator of elements
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self._position += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self._position += 1
+            else:
+                self.expect(']')
+                return
+
+
+def load_layout(layout_file: str) -> List[dict]:
+    """
+    Reads the cameras of a layout written by bulk_ingest or stored in the layout cache
+    :param layout_file: JSON file with a cameras list of {'rect': [x, y, width, height], 'name': str}
+    :return: list of cameras
+    """
+    with open(layout_file, 'r', encoding='UTF-8') as layout:
+        return json.load(layout)['cameras']
+
+
+def plan_sources(preset_name: str, people: List[str], cameras: List[dict],
+                 y_offset: int = 0) -> Dict[str, Tuple[str, dict]]:
+    """
+    Pairs people with cameras. Cameras named in the layout keep their name and the rest get the preset's people in order
+    :param preset_name: Name of the preset
+    :param people: People of the preset
+    :param cameras: Cameras of the layout
+    :param y_offset: Offset added to the top of every crop
+    :return: dict of source name to (name of the preset's window capture source, CamCrop settings)
+    """
+    unbound = [person for person in people if person not in {camera.get('name') for camera in cameras}]
+    named = {}
+    for camera in cameras:
+        name = camera.get('name') or (unbound.pop(0) if unbound else '')
+        if name:
+            named[str(len(named))] = [camera['rect'], name]
+    plan = {}
+    for crop in obs_plugin_server.build_camera_crops(named, y_offset):
+        plan[crop['camName']] = (SOURCE_PREFIX + preset_name, {'relative': False, 'left': crop['x'], 'top': crop['y'],
+                                                               'cx': crop['x1'], 'cy': crop['y1']})
+    return plan
+
+
+def scan_collection(collection_file: str) -> Dict[str, object]:
+    """
+    Reads the parts of a collection needed before patching without keeping the sources
+    :param collection_file: Exported scene collection
+    :return: dict with the current scene, the names of every source, the names of the scenes, the window capture
+             sources of presets and whether sources have uuids
+    """
+    info = {'current_scene': None, 'names': set(), 'scenes': set(), 'templates': {}, 'uuids': False}
+    with open(collection_file, 'r', encoding='UTF-8') as collection:
+        for key, stream in JsonStream(collection).items():
+            if key == 'sources':
+                for source in stream.elements():
+                    info['names'].add(source.get('name'))
+                    if source.get('id') == 'scene':
+                        info['scenes'].add(source.get('name'))
+                    info['uuids'] = info['uuids'] or 'uuid' in source
+                    if str(source.get('name', '')).startswith(SOURCE_PREFIX):
+                        info['templates'][source['name']] = source
+            elif key == 'current_scene':
+                info['current_scene'] = stream.value()
+            else:
+                stream.value()
+    return info
+
+
+def crop_filter(settings: dict, uuids: bool) -> dict:
+    """
+    Returns a CamCrop filter with the given crop settings
+    """
+    crop = {'versioned_id': 'crop_filter', 'id': 'crop_filter', 'name': 'CamCrop', 'enabled': True,
+            'settings': dict(settings)}
+    if uuids:
+        crop['uuid'] = str(uuid.uuid4())
+    return crop
+
+
+def patch_source(source: dict, template: dict, crop: dict, uuids: bool):
+    """
+    Points an existing source at the preset's window and sets its CamCrop filter
+    """
+    source.setdefault('settings', {}).update(template.get('settings', {}))
+    filters = source.setdefault('filters', [])
+    for existing in filters:
+        if existing.get('name') == 'CamCrop':
+            existing.setdefault('settings', {}).update(crop)
+            return
+    filters.append(crop_filter(crop, uuids))
+
+
+def new_source(name: str, template: dict, crop: dict, uuids: bool) -> dict:
+    """
+    Creates a window capture source for a person from the preset's window capture source
+    """
+    source = copy.deepcopy(template)
+    source['name'] = name
+    source['filters'] = [crop_filter(crop, uuids)]
+    source['hotkeys'] = {}
+    if uuids:
+        source['uuid'] = str(uuid.uuid4())
+    return source
+
+
+def patch_scene(scene: dict, names: List[str], uuid_by_name: Dict[str, str]):
+    """
+    Adds an item to a scene for every named source that is not in it yet
+    """
+    settings = scene.setdefault('settings', {})
+    items = settings.setdefault('items', [])
+    present = {item.get('name') for item in items}
+    counter = settings.get('id_counter', max([item.get('id', 0) for item in items] + [0]))
+    for name in names:
+        if name in present:
+            continue
+        counter += 1
+        item = dict(copy.deepcopy(SCENE_ITEM_DEFAULTS), name=name, id=counter)
+        if name in uuid_by_name:
+            item['source_uuid'] = uuid_by_name[name]
+        items.append(item)
+    settings['id_counter'] = counter
+
+
+def patch_collection(collection_file: str, output_file: str, plan: Dict[str, Tuple[str, dict]],
+                     scene_name: Optional[str] = None) -> Dict[str, int]:
+    """
+    Writes a copy of a scene collection with a window capture source and CamCrop filter for every planned person
+    :param collection_file: Exported scene collection
+    :param output_file: File the patched collection is written to, must not be collection_file
+    :param plan: dict of source name to (window capture source to copy, CamCrop settings) from plan_sources
+    :param scene_name: Scene the sources are added to, defaults to the collection's current scene
+    :return: dict with the number of sources created and updated
+    :raises ValueError: if a preset has no window capture source or the scene does not exist
+    """
+    info = scan_collection(collection_file)
+    scene_name = scene_name or info['current_scene']
+    if scene_name not in info['scenes']:
+        raise ValueError('The collection does not have a scene named {0}'.format(scene_name))
+    for template_name, _ in plan.values():
+        if template_name not in info['templates']:
+            raise ValueError('The collection does not have a window capture source named {0}'.format(template_name))
+    uuids = info['uuids']
+    created = {name: new_source(name, info['templates'][template_name], crop, uuids)
+               for name, (template_name, crop) in plan.items() if name not in info['names']}
+    uuid_by_name = {name: source['uuid'] for name, source in created.items() if 'uuid' in source}
+    updated = 0
+    with open(collection_file, 'r', encoding='UTF-8') as collection, \
+            open(output_file, 'w', encoding='UTF-8') as output:
+        output.write('{')
+        for index, (key, stream) in enumerate(JsonStream(collection).items()):
+            output.write(',\n' if index else '\n')
+            output.write(json.dumps(key) + ': ')
+            if key != 'sources':
+                output.write(json.dumps(stream.value()))
+                continue
+            output.write('[')
+            count = 0
+            for source in stream.elements():
+                name = source.get('name')
+                if name in plan:
+                    template_name, crop = plan[name]
+                    patch_source(source, info['templates'][template_name], crop, uuids)
+                    if 'uuid' in source:
+                        uuid_by_name[name] = source['uuid']
+                    updated += 1
+                if name == scene_name and source.get('id') == 'scene':
+                    patch_scene(source, list(plan), uuid_by_name)
+                output.write((',\n' if count else '\n') + json.dumps(source))
+                count += 1
+            for source in created.values():
+                output.write((',\n' if count else '\n') + json.dumps(source))
+                count += 1
+            output.write('\n]')
+        output.write('\n}\n')
+    return {'created': len(created), 'updated': updated}
+
+
+def main():
+    """
+    Patches a scene collection from the command line
+    """
+    parser = argparse.ArgumentParser(description='Set up camera sources in an exported OBS scene collection')
+    parser.add_argument('collection', help='Exported scene collection JSON')
+    parser.add_argument('output', help='File the patched collection is written to')
+    parser.add_argument('--presets', required=True, help='presets.json with the people of every preset')
+    parser.add_argument('--preset', nargs=2, action='append', required=True, metavar=('NAME', 'LAYOUT'),
+                        help='Preset name and the layout JSON of its call, can be given many times')
+    parser.add_argument('--scene', default=None, help='Scene the sources are added to, defaults to the current scene')
+    parser.add_argument('--y-offset', type=int, default=0, help='Offset added to the top of every crop')
+    args = parser.parse_args()
+
+    presets = PresetHandler()
+    presets.load_json(args.presets)
+    plan = {}
+    for preset_name, layout_file in args.preset:
+        people = presets.get_people(preset_name)
+        if people is None:
+            parser.error('no preset named {0}'.format(preset_name))
+        plan.update(plan_sources(preset_name, people, load_layout(layout_file), args.y_offset))
+    try:
+        stats = patch_collection(args.collection, args.output, plan, args.scene)
+    except ValueError as error:
+        parser.error(str(error))
+    print('created {created} sources and updated {updated}'.format(**stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Records captured call window frames to a compact archive and replays them through the detector for offline profiling.
+
+An archive is a folder holding frames.raw, every frame's raw bytes appended one after another, and index.jsonl
+with one line per frame describing where its bytes are, the window geometry and the detected cameras.
+Frames are memory mapped when replaying so only the frames being processed are read from disk.
+"""
+from __future__ import annotations  # Keeps numpy annotations from importing it
+
+import argparse  # Used to run replays from the command line
+import json  # Used to read and write the archive index
+import os  # Used to create archive paths
+import time  # Used to timestamp frames and pace replays
+from typing import Dict, Iterator, List, Optional, Tuple  # Used for typing
+
+from mappingUtils import obs_plugin_server  # Used to build the commands sent during a replay
+from mappingUtils.lazy_import import lazy_import  # Used to import heavy modules on first use
+
+np = lazy_import('numpy')  # Used to memory map recorded frames
+
+FRAMES_FILE = 'frames.raw'
+INDEX_FILE = 'index.jsonl'
+
+
+class SessionRecorder:
+    """
+    Appends frames, window geometry and detection output to a session archive.
+    Attributes
+    ----------
+    archive_path : str
+        Folder the archive is written to
+    frame_count : int
+        Number of frames recorded
+    """
+    archive_path: str
+    frame_count: int
+
+    def __init__(self, archive_path: str):
+        self.archive_path = archive_path
+        if not os.path.exists(archive_path):
+            os.makedirs(archive_path)
+        self.frame_count = 0
+        self._frames = open(os.path.join(archive_path, FRAMES_FILE), 'ab')
+        self._index = open(os.path.join(archive_path, INDEX_FILE), 'a', encoding='UTF-8')
+        self._offset = self._frames.tell()
+
+    def record(self, frame: np.ndarray, geometry: Tuple[int, int, int, int], cameras: dict, window_title: str = None,
+               profile: str = None, exe: str = None):
+        """
+        Appends a frame and its detection output to the archive
+        :param frame: BGR frame that was processed
+        :param geometry: Screen position (x, y, x1, y1) of the window the frame came from
+        :param cameras: Cameras detected in this frame, as returned by process_frame
+        :param window_title: Title of the captured window or None if the frame came from a screenshot
+        :param profile: Name of the detector profile the frame was detected with or None
+        :param exe: Window string get_exe_name returned for the captured window or None
+        """
+        frame = np.ascontiguousarray(frame)
+        self._frames.write(frame.tobytes())
+        self._index.write(json.dumps({
+            'time': time.time(),
+            'offset': self._offset,
+            'shape': list(frame.shape),
+            'dtype': str(frame.dtype),
+            'geometry': [int(value) for value in geometry],
+            'window': window_title,
+            'profile': profile,
+            'exe': exe,
+            'rects': [[int(value) for value in cam[0]] for cam in cameras.values()]
+        }) + '\n')
+        # Every entry is flushed so an archive stays readable up to the last frame if the mapper crashes
+        self._frames.flush()
+        self._index.flush()
+        self._offset += frame.nbytes
+        self.frame_count += 1
+
+    def close(self):
+        """
+        Flushes and closes the archive files
+        """
+        self._frames.close()
+        self._index.close()
+
+
+class SessionReplay:
+    """
+    Reads a session archive recorded by SessionRecorder.
+    Attributes
+    ----------
+    archive_path : str
+        Folder the archive is read from
+    entries : list
+        Index entry of every recorded frame
+    """
+    archive_path: str
+    entries: List[dict]
+
+    def __init__(self, archive_path: str):
+        self.archive_path = archive_path
+        with open(os.path.join(archive_path, INDEX_FILE), 'r', encoding='UTF-8') as index:
+            self.entries = [json.loads(line) for line in index if line.strip()]
+        frames_path = os.path.join(archive_path, FRAMES_FILE)
+        if os.path.getsize(frames_path) > 0:
+            self._frames = np.memmap(frames_path, dtype=np.uint8, mode='r')
+        else:
+            self._frames = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def frame(self, index: int) -> np.ndarray:
+        """
+        Returns a recorded frame without copying it out of the archive
+        :param index: Position of the frame in the archive
+        :return: frame as a read only array
+        """
+        entry = self.entries[index]
+        dtype = np.dtype(entry['dtype'])
+        size = int(np.prod(entry['shape'])) * dtype.itemsize
+        return self._frames[entry['offset']:entry['offset'] + size].view(dtype).reshape(entry['shape'])
+
+    def __iter__(self) -> Iterator[Tuple[dict, np.ndarray]]:
+        for index, entry in enumerate(self.entries):
+            yield entry, self.frame(index)
+
+
+def replay_session(archive_path: str, image_proc, server: obs_plugin_server.Server = None,
+                   speed: Optional[float] = 1.0, os_name: str = 'Linux', exe: str = '') -> Dict[str, float]:
+    """
+    Pushes every frame of an archive back through the detector and optionally sends the crops to the obs plugin.
+    Every frame is detected with the profile it was recorded with and Linux crops are moved by the profile's
+    linux_y_offset the same way the mapper moves them
+    :param archive_path: Folder of the archive to replay
+    :param image_proc: ImageProcessing used to detect the cameras
+    :param server: Started Server to send crop commands through or None to only run detection
+    :param speed: Replay speed relative to the recording or None to replay as fast as possible
+    :param os_name: Platform sent in the crop command
+    :param exe: Window sent in the crop command, defaults to the recorded get_exe_name string
+    :return: dict of replay stats
+    """
+    replay = SessionReplay(archive_path)
+    detect_times = []
+    mismatches = 0
+    start = time.perf_counter()
+    first_time = None
+    for entry, frame in replay:
+        # Waits until the frame would have been captured in the original session
+        if speed is not None:
+            if first_time is None:
+                first_time = entry['time']
+            wait = (entry['time'] - first_time) / speed - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+        for profile in image_proc.profiles:
+            if profile.name == entry.get('profile'):
+                image_proc.profile = profile
+                break
+        detect_start = time.perf_counter()
+        cameras = image_proc.process_frame(np.array(frame), save_crops=False)
+        detect_times.append(time.perf_counter() - detect_start)
+        if [list(cam[0]) for cam in cameras.values()] != entry['rects']:
+            mismatches += 1
+        if server is not None:
+            y_offset = image_proc.profile.linux_y_offset if os_name == 'Linux' else 0
+            server.send_command(obs_plugin_server.crop_command(
+                os_name, exe or entry.get('exe') or entry['window'] or '', obs_plugin_server.build_camera_crops(cameras, y_offset)))
+    elapsed = time.perf_counter() - start
+    frames = len(replay)
+    return {
+        'frames': frames,
+        'elapsed': elapsed,
+        'fps': frames / elapsed if elapsed > 0 else 0.0,
+        'mean_detect': sum(detect_times) / frames if frames else 0.0,
+        'max_detect': max(detect_times) if detect_times else 0.0,
+        'mismatches': mismatches
+    }
+
+
+def main():
+    """
+    Replays a session archive from the command line and prints the replay stats
+    """
+    # pylint: disable=import-outside-toplevel
+    import tempfile
+    from mappingUtils.image_processing import ImageProcessing
+
+    parser = argparse.ArgumentParser(description='Replay a recorded OBS Call Mapper session')
+    parser.add_argument('archive', help='Folder of the session archive')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed relative to the recording')
+    parser.add_argument('--max-speed', action='store_true', help='Replay as fast as possible')
+    parser.add_argument('--send', action='store_true', help='Send the crops to the obs plugin')
+    parser.add_argument('--port', type=int, default=48387, help='Port of the obs plugin')
+    args = parser.parse_args()
+
+    server = None
+    if args.send:
+        server = obs_plugin_server.Server(args.port)
+        server.start_server()
+    with tempfile.TemporaryDirectory() as save_location:
+        stats = replay_session(args.archive, ImageProcessing(save_location), server,
+                               None if args.max_speed else args.speed)
+    for key, value in stats.items():
+        print('{key}: {value}'.format(key=key, value=value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Cheap per frame analysis of known camera tiles, used while watching a call after the cameras have been detected.
+"""
+from __future__ import annotations  # Keeps numpy annotations from importing it
+
+from typing import List, Optional, Sequence, Tuple  # Used for typing
+
+from mappingUtils.lazy_import import lazy_import  # Used to import heavy modules on first use
+
+cv2 = lazy_import('cv2')  # Used to match pixel colours
+np = lazy_import('numpy')  # Used to analyse all tiles at once
+
+
+class SpeakerDetector:
+    """
+    Finds the active speaker from the coloured ring call clients draw around the tile of whoever is talking.
+    Only a thin ring of pixels just inside each tile rect is read and all tiles are checked with one gather.
+    Ring pixels are stored tile after tile so the matches of every tile are summed with one reduceat.
+    Attributes
+    ----------
+    ring_colour : tuple
+        BGR colour of the speaking ring. Defaults to the Discord green
+    colour_tolerance : int
+        Largest difference per channel from ring_colour for a pixel to count as ring
+    inset : int
+        Pixels skipped inside the tile rect before the ring starts
+    ring_width : int
+        Width of the ring in pixels
+    min_fraction : float
+        Fraction of ring pixels that must match for a tile to be speaking
+    hold_frames : int
+        Number of frames a new speaker must be seen in before the speaker changes
+    speaker : int
+        Index of the current speaker tile or None
+    """
+    ring_colour: Tuple[int, int, int]
+    colour_tolerance: int
+    inset: int
+    ring_width: int
+    min_fraction: float
+    hold_frames: int
+    speaker: Optional[int]
+
+    def __init__(self, ring_colour: Tuple[int, int, int] = (90, 165, 35), colour_tolerance: int = 30,
+                 inset: int = 1, ring_width: int = 3, min_fraction: float = 0.7, hold_frames: int = 2):
+        self.ring_colour = ring_colour
+        self.colour_tolerance = colour_tolerance
+        self.inset = inset
+        self.ring_width = ring_width
+        self.min_fraction = min_fraction
+        self.hold_frames = hold_frames
+        self.speaker = None
+        self._candidate = None
+        self._candidate_frames = 0
+        self._pixels = None
+        self._tiles = None
+        self._counts = None
+        self._offsets = None
+        self._tile_count = 0
+        self._shape = None
+
+    def set_rects(self, rects: Sequence[Tuple[int, int, int, int]], frame_shape: Tuple[int, ...]):
+        """
+        Precomputes the flat index of every ring pixel of every tile
+        :param rects: (x, y, width, height) of every tile in frame coordinates
+        :param frame_shape: Shape of the frames that will be checked
+        """
+        height, width = frame_shape[:2]
+        pixels = []
+        tiles = []
+        counts = []
+        for tile, (x, y, tile_width, tile_height) in enumerate(rects):
+            left = max(x + self.inset, 0)
+            top = max(y + self.inset, 0)
+            right = min(x + tile_width - self.inset, width)
+            bottom = min(y + tile_height - self.inset, height)
+            if right - left <= 2 * self.ring_width or bottom - top <= 2 * self.ring_width:
+                continue
+            ring = np.zeros((bottom - top, right - left), bool)
+            ring[:self.ring_width, :] = True
+            ring[-self.ring_width:, :] = True
+            ring[:, :self.ring_width] = True
+            ring[:, -self.ring_width:] = True
+            rows, columns = np.nonzero(ring)
+            pixels.append((rows + top) * width + columns + left)
+            tiles.append(tile)
+            counts.append(rows.size)
+        self._pixels = np.concatenate(pixels) if pixels else np.zeros(0, np.int64)
+        self._tiles = np.array(tiles, np.int64)
+        self._counts = np.array(counts, np.float64)
+        self._offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64) if counts else None
+        self._tile_count = len(rects)
+        self._shape = (height, width)
+        self.speaker = None
+        self._candidate = None
+        self._candidate_frames = 0
+
+    def scores(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Returns the fraction of ring pixels matching the ring colour for every tile
+        :param frame: BGR or BGRA frame with the shape given to set_rects
+        :return: array of fractions
+        """
+        if self._pixels is None or frame.shape[:2] != self._shape:
+            raise ValueError('Frame does not match the tile rects, call set_rects first')
+        scores = np.zeros(self._tile_count)
+        if self._offsets is None:
+            return scores
+        ring = np.take(frame.reshape(-1, frame.shape[2]), self._pixels, axis=0)[:, :3].reshape(-1, 1, 3)
+        low = tuple(max(channel - self.colour_tolerance, 0) for channel in self.ring_colour)
+        high = tuple(min(channel + self.colour_tolerance, 255) for channel in self.ring_colour)
+        matches = cv2.inRange(np.ascontiguousarray(ring), low, high).ravel()
+        scores[self._tiles] = np.add.reduceat(matches, self._offsets, dtype=np.int64) / 255 / self._counts
+        return scores
+
+    def update(self, frame: np.ndarray) -> bool:
+        """
+        Checks a frame for the active speaker
+        :param frame: BGR or BGRA frame with the shape given to set_rects
+        :return: True if the speaker changed
+        """
+        scores = self.scores(frame)
+        best = int(np.argmax(scores)) if scores.size else None
+        found = best if best is not None and scores[best] >= self.min_fraction else None
+        if found == self.speaker:
+            self._candidate = None
+            self._candidate_frames = 0
+            return False
+        if found != self._candidate:
+            self._candidate = found
+            self._candidate_frames = 0
+        self._candidate_frames += 1
+        if self._candidate_frames >= self.hold_frames:
+            self.speaker = found
+            self._candidate = None
+            self._candidate_frames = 0
+            return True
+        return False
+
+
+class CameraOffClassifier:
+    """
+    Flags tiles showing an avatar on a flat background instead of a camera.
+    Every tile is sampled on the same small grid so the cost per tile stays flat however big the tiles are,
+    and the variance, colour entropy and change since the last frame of all tiles are found in one pass.
+    Attributes
+    ----------
+    grid : int
+        Number of samples along each side of a tile
+    entropy_threshold : float
+        Colour entropy in bits below which a tile can be camera off
+    variance_threshold : float
+        Brightness variance below which a tile can be camera off even with a detailed avatar
+    motion_threshold : float
+        Mean change in brightness since the last frame below which a tile can be camera off
+    hold_frames : int
+        Number of frames in a row a tile must be classified the same way before its state changes
+    camera_off : np.ndarray
+        True for every tile currently flagged as camera off
+    """
+    grid: int
+    entropy_threshold: float
+    variance_threshold: float
+    motion_threshold: float
+    hold_frames: int
+    camera_off: np.ndarray
+
+    def __init__(self, grid: int = 16, entropy_threshold: float = 3.0, variance_threshold: float = 150.0,
+                 motion_threshold: float = 1.0, hold_frames: int = 10):
+        self.grid = grid
+        self.entropy_threshold = entropy_threshold
+        self.variance_threshold = variance_threshold
+        self.motion_threshold = motion_threshold
+        self.hold_frames = hold_frames
+        self.camera_off = np.zeros(0, bool)
+        self._pixels = None
+        self._previous = None
+        self._streak = None
+        self._shape = None
+
+    def set_rects(self, rects: Sequence[Tuple[int, int, int, int]], frame_shape: Tuple[int, ...]):
+        """
+        Precomputes the flat index of every sample of every tile. Samples skip the outer tenth of each tile
+        so speaking rings and name labels are not counted
+        :param rects: (x, y, width, height) of every tile in frame coordinates
+        :param frame_shape: Shape of the frames that will be checked
+        """
+        height, width = frame_shape[:2]
+        rects = np.array(rects, np.float64).reshape(-1, 4)
+        steps = (np.arange(self.grid) + 0.5) / self.grid * 0.8 + 0.1
+        columns = np.clip(rects[:, None, 0] + steps[None, :] * rects[:, None, 2], 0, width - 1).astype(np.int64)
+        rows = np.clip(rects[:, None, 1] + steps[None, :] * rects[:, None, 3], 0, height - 1).astype(np.int64)
+        self._pixels = (rows[:, :, None] * width + columns[:, None, :]).reshape(len(rects), -1)
+        self.camera_off = np.zeros(len(rects), bool)
+        self._streak = np.zeros(len(rects), np.int32)
+        self._previous = None
+        self._shape = (height, width)
+
+    def features(self, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the brightness variance, colour entropy and brightness change of every tile
+        :param frame: BGR or BGRA frame with the shape given to set_rects
+        :return: (variance, entropy, motion) arrays
+        """
+        if self._pixels is None or frame.shape[:2] != self._shape:
+            raise ValueError('Frame does not match the tile rects, call set_rects first')
+        tiles, samples = self._pixels.shape
+        colours = np.take(frame.reshape(-1, frame.shape[2]), self._pixels.ravel(), axis=0)[:, :3]
+        colours = colours.reshape(tiles, samples, 3)
+        brightness = colours.astype(np.float32).mean(axis=2)
+        variance = brightness.var(axis=1)
+        # Quantises colours to 3 bits per channel and counts them for all tiles with one bincount
+        bins = ((colours[:, :, 0] >> 5).astype(np.int64) << 6) | ((colours[:, :, 1] >> 5) << 3) | (colours[:, :, 2] >> 5)
+        bins += np.arange(tiles)[:, None] * 512
+        probability = np.bincount(bins.ravel(), minlength=tiles * 512).reshape(tiles, 512) / samples
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy = -np.nansum(probability * np.log2(probability), axis=1)
+        if self._previous is None or self._previous.shape != brightness.shape:
+            motion = np.full(tiles, np.inf)
+        else:
+            motion = np.abs(brightness - self._previous).mean(axis=1)
+        self._previous = brightness
+        return variance, entropy, motion
+
+    def update(self, frame: np.ndarray) -> List[Tuple[int, bool]]:
+        """
+        Classifies every tile in a frame
+        :param frame: BGR or BGRA frame with the shape given to set_rects
+        :return: list of (tile index, camera off) for every tile whose state changed
+        """
+        variance, entropy, motion = self.features(frame)
+        looks_off = ((entropy < self.entropy_threshold) | (variance < self.variance_threshold)) & \
+                    (motion < self.motion_threshold)
+        differs = looks_off != self.camera_off
+        self._streak = np.where(differs, self._streak + 1, 0)
+        flipped = np.nonzero(self._streak >= self.hold_frames)[0]
+        self.camera_off[flipped] = looks_off[flipped]
+        self._streak[flipped] = 0
+        return [(int(tile), bool(self.camera_off[tile])) for tile in flipped]
@@ -0,0 +1,275 @@
+"""
+Event driven window tracking for Linux. The window list, titles and geometry are read from the EWMH properties of the
+X11 root window once and then kept current from PropertyNotify and ConfigureNotify events, so looking up a window never
+spawns wmctrl or xprop. Needs python-xlib, ImageProcessing falls back to wmctrl when it is not installed.
+"""
+import select  # Used to wait for X11 events without blocking stop
+import threading  # Used to read X11 events in the background
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple  # Used for typing
+
+
+class TrackedWindow(NamedTuple):
+    """
+    Top level window with the same fields as wmctrl.Window so either can be used to look up a window.
+    id is the hexadecimal window id and x, y, w and h are the screen position and size of the client area
+    """
+    id: str
+    wm_name: str
+    wm_class: str
+    x: int
+    y: int
+    w: int
+    h: int
+
+    @property
+    def geometry(self) -> Tuple[int, int, int, int]:
+        """
+        Screen position (x, y, x1, y1) of the window
+        """
+        return self.x, self.y, self.x + self.w, self.y + self.h
+
+
+class X11WindowTracker:
+    """
+    Keeps the top level windows of the X11 display and the active window in memory. A background thread reads the
+    events of the root window and of every client window and updates them, listeners are told when a window is moved
+    or resized.
+    Attributes
+    ----------
+    windows : dict
+        Tracked windows in _NET_CLIENT_LIST order. Key is the window id and value is the TrackedWindow
+    active : int
+        Id of the active window or 0 if no window is active
+    running : bool
+        True while the event thread is running
+    """
+    windows: Dict[int, TrackedWindow]
+    active: int
+    running: bool
+
+    def __init__(self):
+        self.windows = {}
+        self.active = 0
+        self.running = False
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._display = None
+        self._root = None
+        self._atoms = {}
+        self._xlib = None
+        self._thread = None
+
+    def start(self, display_name: Optional[str] = None) -> bool:
+        """
+        Connects to the display, reads the current windows and starts following events
+        :param display_name: X11 display to connect to, defaults to $DISPLAY
+        :return: True if tracking started, False if python-xlib is missing or the display can not be opened
+        """
+        try:
+            # python-xlib is optional. Xlib.threaded makes requests from other threads safe while events are read
+            import Xlib.threaded  # pylint: disable=import-outside-toplevel,unused-import
+            from Xlib import X, display, error  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            return False
+        try:
+            self._display = display.Display(display_name)
+        except (error.DisplayError, OSError):
+            return False
+        self._xlib = (X, error)
+        self._root = self._display.screen().root
+        for name in ('_NET_CLIENT_LIST', '_NET_ACTIVE_WINDOW', '_NET_WM_NAME', 'WM_NAME', 'UTF8_STRING'):
+            self._atoms[name] = self._display.intern_atom(name)
+        self._root.change_attributes(event_mask=X.PropertyChangeMask)
+        self.__read_clients()
+        self.__read_active()
+        self._display.flush()
+        self.running = True
+        self._thread = threading.Thread(target=self._follow_events, name='x11-windows', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """
+        Stops following events and closes the display
+        """
+        self.running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._display is not None:
+            self._display.close()
+            self._display = None
+
+    def subscribe(self, listener: Callable[[Optional[TrackedWindow], TrackedWindow], None]):
+        """
+        Calls listener with the previous and new window every time a tracked window is moved or resized.
+        Listeners are called from the event thread
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[Optional[TrackedWindow], TrackedWindow], None]):
+        """
+        Stops calling a listener
+        """
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def list(self) -> List[TrackedWindow]:
+        """
+        Returns every tracked window in _NET_CLIENT_LIST order
+        """
+        with self._lock:
+            return list(self.windows.values())
+
+    def by_name(self, window_title: str) -> List[TrackedWindow]:
+        """
+        Returns the tracked windows with exactly this title like wmctrl.Window.by_name
+        """
+        return [window for window in self.list() if window.wm_name == window_title]
+
+    def update(self, window: TrackedWindow):
+        """
+        Stores a window and tells the listeners if its position or size changed
+        :param window: New state of the window
+        """
+        window_id = int(window.id, 16)
+        with self._lock:
+            previous = self.windows.get(window_id)
+            self.windows[window_id] = window
+        if previous is not None and previous.geometry != window.geometry:
+            for listener in list(self._listeners):
+                listener(previous, window)
+
+    def remove(self, window_id: int):
+        """
+        Stops tracking a window that was closed
+        """
+        with self._lock:
+            self.windows.pop(window_id, None)
+
+    def activate(self, window_id: int):
+        """
+        Asks the window manager to raise and focus a window like wmctrl -a. active changes once it has
+        """
+        X, _ = self._xlib
+        from Xlib.protocol import event  # pylint: disable=import-outside-toplevel
+        window = self._display.create_resource_object('window', window_id)
+        # Source indication 2 tells the window manager the request comes from a pager so it is not refused
+        message = event.ClientMessage(window=window, client_type=self._atoms['_NET_ACTIVE_WINDOW'],
+                                      data=(32, [2, X.CurrentTime, 0, 0, 0]))
+        self._root.send_event(message, event_mask=X.SubstructureRedirectMask | X.SubstructureNotifyMask)
+        self._display.flush()
+
+    def pointer(self) -> Tuple[int, int]:
+        """
+        Returns the screen position of the pointer
+        """
+        reply = self._root.query_pointer()
+        return reply.root_x, reply.root_y
+
+    def move_pointer(self, x: int, y: int):
+        """
+        Moves the pointer to a screen position
+        """
+        self._root.warp_pointer(x, y)
+        self._display.flush()
+
+    def _follow_events(self):
+        """
+        Reads X11 events until stopped. running is False once this returns, however it returns
+        """
+        X, error = self._xlib
+        try:
+            while self.running:
+                try:
+                    if not self._display.pending_events():
+                        select.select([self._display], [], [], 0.2)
+                        continue
+                    event = self._display.next_event()
+                except error.ConnectionClosedError:
+                    # The X server went away, ImageProcessing goes back to wmctrl once running is False
+                    break
+                try:
+                    if event.type == X.PropertyNotify:
+                        self.__property_changed(event)
+                    elif event.type == X.ConfigureNotify:
+                        self.__read_window(event.window)
+                    elif event.type == X.DestroyNotify:
+                        self.remove(event.window.id)
+                except error.XError:
+                    # Mostly BadWindow when a window was closed before its change was read, it is dropped with the
+                    # next client list. Any other request error only loses this one change
+                    continue
+        finally:
+            self.running = False
+
+    def __property_changed(self, event):
+        """
+        Follows changes of the client list, the active window and window titles
+        """
+        if event.window.id == self._root.id:
+            if event.atom == self._atoms['_NET_CLIENT_LIST']:
+                self.__read_clients()
+            elif event.atom == self._atoms['_NET_ACTIVE_WINDOW']:
+                self.__read_active()
+        elif event.atom in (self._atoms['_NET_WM_NAME'], self._atoms['WM_NAME']):
+            self.__read_window(event.window)
+
+    def __read_clients(self):
+        """
+        Reads _NET_CLIENT_LIST, follows the events of new windows and drops closed ones
+        """
+        X, error = self._xlib
+        clients = self._root.get_full_property(self._atoms['_NET_CLIENT_LIST'], X.AnyPropertyType)
+        window_ids = list(clients.value) if clients is not None else []
+        with self._lock:
+            closed = [window_id for window_id in self.windows if window_id not in window_ids]
+        for window_id in closed:
+            self.remove(window_id)
+        for window_id in window_ids:
+            if window_id in self.windows:
+                continue
+            window = self._display.create_resource_object('window', window_id)
+            try:
+                window.change_attributes(event_mask=X.PropertyChangeMask | X.StructureNotifyMask)
+                self.__read_window(window)
+            except error.XError:
+                continue
+        # Keeps the order of the client list so windows are offered in the order wmctrl lists them
+        with self._lock:
+            self.windows = {window_id: self.windows[window_id] for window_id in window_ids
+                            if window_id in self.windows}
+
+    def __read_active(self):
+        """
+        Reads _NET_ACTIVE_WINDOW
+        """
+        X, _ = self._xlib
+        active = self._root.get_full_property(self._atoms['_NET_ACTIVE_WINDOW'], X.AnyPropertyType)
+        self.active = int(active.value[0]) if active is not None and len(active.value) > 0 else 0
+
+    def __read_window(self, window):
+        """
+        Reads the title, class and screen geometry of a window and stores it
+        """
+        name = window.get_full_property(self._atoms['_NET_WM_NAME'], self._atoms['UTF8_STRING'])
+        if name is not None:
+            wm_name = name.value.decode('utf-8', 'replace') if isinstance(name.value, bytes) else str(name.value)
+        else:
+            wm_name = window.get_wm_name() or ''
+        wm_class = window.get_wm_class()
+        geometry = window.get_geometry()
+        # Client windows are placed inside frames by the window manager so the position is read in root coordinates
+        position = self._root.translate_coords(window, 0, 0)
+        self.update(TrackedWindow('0x{0:08x}'.format(window.id), wm_name, '.'.join(wm_class) if wm_class else '',
+                                  position.x, position.y, geometry.width, geometry.height))
+
+
+def connect(display_name: Optional[str] = None) -> Optional[X11WindowTracker]:
+    """
+    Starts tracking the windows of a display
+    :param display_name: X11 display to connect to, defaults to $DISPLAY
+    :return: X11WindowTracker or None if python-xlib is missing or the display can not be opened
+    """
+    tracker = X11WindowTracker()
+    return tracker if tracker.start(display_name) else None
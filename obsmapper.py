@@ -1,20 +1,32 @@
 """
 Creates an interface for users to interact with and streamline the cam mapping process.
 """
+import asyncio  # Used to verify cached layouts without blocking the user interface
 import json  # Used to read in the source export from OBS to try and find a source matching the name of the preset
 import os  # Used to create proper paths for files and folders
 import platform  # Used to find out the users system to create proper scenes in OBS
+import threading  # Used to start the obs server once when startup and the user race to it
+import time  # Used to name recorded sessions
 import webbrowser  # Used to open folders
-from PIL import Image #  Used to create a blank image
 import io
-from typing import Dict, List, Union  # Used for type hinting
+from concurrent.futures import ThreadPoolExecutor  # Used for typing the detection threads
+from typing import List, Optional  # Used for type hinting
 
 import toga  # Used to create the user interface
 from toga import MainWindow
 from toga.style.pack import COLUMN, Pack, ROW, CENTER  # Used for styling widgets
 from toga.command import Group  # Used to add items to default command groups
 
-from mappingUtils import image_processing, preset_handler, obs_plugin_server
+from mappingUtils import image_processing, preset_handler, obs_plugin_server, layout_cache, tile_analysis
+from mappingUtils import detector_profiles  # Used to read custom detector profiles
+from mappingUtils.camera_layout import CameraLayout  # Used to rebind and send cameras as arrays
+from mappingUtils.layout_templates import TemplateLibrary  # Used to snap detection to known layouts
+from mappingUtils.cycle_profiler import CycleProfiler  # Used to profile mapping while debugging
+from mappingUtils.cpu_governor import CpuGovernor  # Used to keep detection from slowing down OBS
+from mappingUtils.lazy_import import lazy_import  # Used to import heavy modules on first use
+
+Image = lazy_import('PIL.Image')  # Used to create a blank image
+jsonschema = lazy_import('jsonschema')  # Used to catch presets that are not formatted correctly
 
 
 # noinspection PyAttributeOutsideInit
@@ -31,30 +43,71 @@ class ObsMapper(toga.App):
         File path for data to be stored in
     cam_images
         List of camera images to be displayed in application
-    cams
-        Dictionary of all camera images.
-        Key == path to camera screenshot
-        Value == list containing rect of camera location in window, name belonging to person who owns camera
+    layout
+        CameraLayout of the cameras in the window with the path of every camera image and the person bound to it.
+        After a detection this is the layout held by image_proc.detections
     image_proc
         Image processing class. See module image_processing for more information
     preset_handler
         Preset handler class. See module preset_handler for more information
     obs_server
         Obs plugin server class. See module obs_plugin_server for more information
+    obs_sender
+        Async sender used to send commands to the obs plugin from the event loop once startup has finished
+    obs_target_errors
+        Entries of obs_targets.json that were skipped because they could not be parsed
     new_preset
         Boolean to check if a preset is new or being edited
     obs_scenes
         OBS scenes from OBS export json file
+    obs_scenes_loading
+        Future of the scene export read by finish_startup, awaited before asking the user for an export
+    layout_cache
+        Layout cache class. See module layout_cache for more information
+    cache_key
+        (preset, window, window size, mask hash) of the current cameras in the layout cache
+    verify_cache
+        Boolean to check if layouts loaded from the cache are verified with a background capture
+    speaker_tracking
+        Boolean to check if the call window is being watched for the active speaker
+    camera_hiding
+        Boolean to check if the call window is being watched for cameras that are turned off
+    watching
+        Boolean to check if the call window is currently being watched
+    watch_fps
+        Frames per second checked while watching the call window
+    follow_window
+        Boolean to check if cameras are detected and mapped again when the call window is resized
+    profiler
+        Profiles capture, detect and send cycles while debugging. See module cycle_profiler for more information
+    governor
+        Limits the CPU used by detection. See module cpu_governor for more information
+    detect_executor
+        Lowered priority threads background detection and watching run on, None until startup has finished
     """
     main_window: MainWindow
     data_path: str
     cam_images: List[str]
-    cams: Dict[str, List[Union[list, str]]]
+    layout: CameraLayout
     new_preset: False
     image_proc: image_processing.ImageProcessing
     preset_handler: preset_handler.PresetHandler
     obs_server: obs_plugin_server.Server
+    obs_sender: obs_plugin_server.AsyncSender
+    obs_target_errors: List[str]
     obs_scenes: dict
+    obs_scenes_loading: asyncio.Future
+    layout_cache: layout_cache.LayoutCache
+    cache_key: tuple
+    verify_cache: bool
+    speaker_tracking: bool
+    camera_hiding: bool
+    watching: bool
+    watch_fps: int
+    follow_window: bool
+    profiler: CycleProfiler
+    detect_executor: Optional[ThreadPoolExecutor]
+    governor: CpuGovernor
 
     # pylint: disable=too-many-instance-attributes
     def startup(self):
@@ -64,16 +117,32 @@ class ObsMapper(toga.App):
         self.main_window = toga.MainWindow(title="OBS Call Mapper", size=(640, 381), resizeable=False)
         self.data_path = os.path.join(str(self.paths.data), 'OBS Call Mapper')
         self.cam_images = []
-        self.cams = {}
+        self.layout = CameraLayout()
         self.new_preset = False
+        self.cache_key = None
+        self.verify_cache = False
+        self.speaker_tracking = False
+        self.camera_hiding = False
+        self.watching = False
+        self.watch_fps = 20
+        self.follow_window = False
+        self._remap_handle = None
+        self.layout_cache = layout_cache.LayoutCache(os.path.join(self.data_path, 'layout_cache.json'))
         self.image_proc = image_processing.ImageProcessing(self.data_path, False)
+        self.profiler = CycleProfiler(os.path.join(self.data_path, 'profiles'))
+        self.governor = CpuGovernor()
+        self.detect_executor = None
         self.preset_handler = preset_handler.PresetHandler()
-        self.obs_server = obs_plugin_server.Server()
-        self.obs_server.start_server()
-        self.obs_scenes = self.get_obs_scene_export()
-        # Tries to load presets.json and creates a new preset if it does not already exist
+        self.obs_server = None
+        self.obs_sender = None
+        self.obs_scenes = None
+        self.obs_scenes_loading = None
+        self._obs_server_lock = threading.Lock()
+        self.obs_target_errors = []
+        # Tries to load presets.json and creates a new preset if it does not already exist.
+        # Presets are validated in finish_startup so the window is not held up
         try:
-            self.preset_handler.load_json(os.path.join(self.data_path, "presets.json"))
+            self.preset_handler.load_json(os.path.join(self.data_path, "presets.json"), validate=False)
         except FileNotFoundError:
             self.preset_handler.create_presets(os.path.join(self.data_path, "presets.json"))
 
@@ -97,9 +166,9 @@ class ObsMapper(toga.App):
             toga.Button(id='map_cameras', text='Map Cameras', style=Pack(width=200, height=34),
                         on_press=self.map_cameras),
         )
-        window_selection = toga.Selection(id='window_selection', items=list(self.image_proc.get_windows().keys()),
+        # Windows are added by finish_startup once the main window is showing
+        window_selection = toga.Selection(id='window_selection', items=["Select Screenshot"],
                                           style=Pack(width=280, height=34))
-        window_selection.items = window_selection.items + ["Select Screenshot"]
         right_content = toga.Box(id='option_pane', style=Pack(direction=COLUMN, alignment=CENTER))
         right_content.add(
             toga.Box(id='window_selection_box', style=Pack(direction=ROW, width=420, alignment=CENTER), children=[
@@ -137,7 +206,38 @@ class ObsMapper(toga.App):
             text='Open data folder',
             group=Group.FILE
         )
-        self.commands.add(obs_sources_command, debug_enable, open_data_folder)
+        verify_cache = toga.Command(
+            action=self.toggle_cache_verification,
+            text='Toggle cache verification',
+            group=Group.HELP
+        )
+        speaker_tracking = toga.Command(
+            action=self.toggle_speaker_tracking,
+            text='Toggle speaker tracking',
+            group=Group.HELP
+        )
+        camera_hiding = toga.Command(
+            action=self.toggle_camera_hiding,
+            text='Toggle hiding cameras that are off',
+            group=Group.HELP
+        )
+        session_recording = toga.Command(
+            action=self.toggle_session_recording,
+            text='Toggle session recording',
+            group=Group.HELP
+        )
+        obs_stats = toga.Command(
+            action=self.show_obs_stats,
+            text='Show OBS timings',
+            group=Group.HELP
+        )
+        follow_window = toga.Command(
+            action=self.toggle_follow_window,
+            text='Toggle remapping resized windows',
+            group=Group.HELP
+        )
+        self.commands.add(obs_sources_command, debug_enable, open_data_folder, verify_cache, speaker_tracking,
+                          camera_hiding, follow_window, session_recording, obs_stats)
         # Checks if the platform is a Windows machine and if so sets the split container to the content,
         # if it is not it will create scroll containers and then set it into the split container
         if platform.system() == 'Windows':
@@ -157,12 +257,153 @@ class ObsMapper(toga.App):
         # Checks to see if a preset already exists and if none exist it will open a window to create a new preset
         if len(self.preset_handler.get_preset_names()) == 0:
             self.edit_preset_window(new_preset_button)
+        self.add_background_task(self.finish_startup)
+        self.on_exit = self.save_on_exit
+
+    async def finish_startup(self, app):
+        """
+        Does the slow parts of startup in worker threads after the main window is shown.
+        Enumerates windows, reads the OBS scene export, opens the socket to OBS, loads the layout templates,
+        applies the CPU limits and validates the presets. Custom detector profiles are read first.
+        Window moves and resizes seen by the window tracker are followed from then on
+        """
+        loop = asyncio.get_event_loop()
+        self.governor = self.get_governor()
+        self.image_proc.governor = self.governor
+        self.detect_executor = self.governor.executor()
+        profile_errors = []
+        self.image_proc.profiles = detector_profiles.load_profiles(os.path.join(self.data_path,
+                                                                                'detector_profiles.json'),
+                                                                   profile_errors)
+        self.obs_scenes_loading = loop.run_in_executor(None, self.get_obs_scene_export)
+        windows, obs_scenes, _, self.image_proc.templates, _ = await asyncio.gather(
+            loop.run_in_executor(None, self.image_proc.get_windows),
+            self.obs_scenes_loading,
+            loop.run_in_executor(None, self.start_obs_server),
+            loop.run_in_executor(None, TemplateLibrary, os.path.join(self.data_path, 'layout_templates.json')),
+            loop.run_in_executor(None, self.governor.apply, self.image_proc))
+        # An export the user selected while this was loading is kept
+        if self.obs_scenes is None:
+            self.obs_scenes = obs_scenes
+        window_selection = self.main_window.widgets.get('window_selection')
+        window_selection.items = list(windows.keys()) + ['Select Screenshot']
+        self.warm_start(windows)
+        if self.image_proc.window_tracker is not None:
+            self.image_proc.window_tracker.subscribe(
+                lambda previous, window: loop.call_soon_threadsafe(self.window_changed, window))
+        # Hosts that can not be resolved are shown with their error under Show OBS timings and retried on later sends
+        if self.obs_target_errors:
+            self.main_window.error_dialog(title='OBS Targets', message='obs_targets.json has targets that were '
+                                                                      'skipped\n' + '\n'.join(self.obs_target_errors))
+        if profile_errors:
+            self.main_window.error_dialog(title='Detector Profiles', message='detector_profiles.json has profiles '
+                                                                            'that were skipped\n'
+                                                                            + '\n'.join(profile_errors))
+        obs_sender = obs_plugin_server.AsyncSender(self.obs_server)
+        await obs_sender.start()
+        self.obs_sender = obs_sender
+        try:
+            await loop.run_in_executor(None, self.preset_handler.validate_presets)
+        except jsonschema.exceptions.ValidationError as exception:
+            self.main_window.error_dialog(title='Preset Error', message='presets.json contains a preset that is '
+                                                                        'not formatted correctly\n' + exception.message)
+
+    def warm_start(self, windows: dict):
+        """
+        Selects the preset and window of the most recently used cached layout whose window is open at the cached size
+        and loads it, so cameras can be mapped straight after launch without capturing the window
+        :param windows: Open windows from ImageProcessing.get_windows
+        """
+        preset_names = self.preset_handler.get_preset_names()
+        for entry in self.layout_cache.recent():
+            if entry['preset'] not in preset_names or windows.get(entry['window'][0:28]) != entry['window']:
+                continue
+            geometry = self.image_proc.get_window_geometry(entry['window'])
+            if geometry is None or [geometry[2] - geometry[0], geometry[3] - geometry[1]] != list(entry['size']):
+                continue
+            preset_selection = self.main_window.widgets.get('preset_selection')
+            preset_selection.value = entry['preset']
+            self.main_window.widgets.get('window_selection').value = entry['window'][0:28]
+            self.load_preset(preset_selection)
+            return
+
+    def save_on_exit(self, app, **kwargs) -> bool:
+        """
+        Writes layout templates and cached layouts stored since the last save and closes a recorded session before
+        the app closes
+        :return: True so the app exits
+        """
+        self.image_proc.stop_recording()
+        if self.image_proc.templates is not None:
+            self.image_proc.templates.flush()
+        self.layout_cache.flush()
+        return True
+
+    def send_crops(self, os_name: str, exe: str, cameras: list, source_id: str = '', layout: dict = None):
+        """
+        Sends camera crops to the obs plugin. Crops go through obs_sender on the event loop once it is started
+        so rapid remaps are merged and never block the user interface
+        """
+        if self.obs_sender is not None:
+            self.obs_sender.send_crops(os_name, exe, cameras, source_id, layout)
+        else:
+            self.start_obs_server()
+            self.obs_server.send_command(obs_plugin_server.crop_command(os_name, exe, cameras, source_id, layout))
+
+    def start_obs_server(self):
+        """
+        Starts the server used to send cameras to the obs plugin if it has not been started yet.
+        Called from finish_startup's worker thread and from sends on the event loop so only one socket is opened
+        """
+        with self._obs_server_lock:
+            if self.obs_server is None:
+                obs_server = obs_plugin_server.Server(targets=self.get_obs_targets())
+                obs_server.start_server()
+                self.obs_server = obs_server
 
     def toggle_debugging(self, widget):
         """
-        Toggles debugging
+        Toggles debugging. While debugging the next capture, detect and send cycles are profiled and the profile
+        is saved to the profiles folder in the data folder
         """
         self.image_proc.toggle_debugging()
+        if self.image_proc.debug:
+            self.profiler.start()
+            self.main_window.info_dialog(title='Debugging', message='The next {0} times cameras are selected or mapped '
+                                         'will be profiled and saved to the profiles folder in the data folder'
+                                         .format(self.profiler.cycles))
+        else:
+            self.profiler.stop()
+
+    def toggle_session_recording(self, widget):
+        """
+        Toggles recording every captured frame and the cameras detected in it to a session archive in the sessions
+        folder of the data folder, so a slow or wrong detection can be replayed offline
+        """
+        recorder = self.image_proc.recorder
+        if recorder is None:
+            archive_path = os.path.join(self.data_path, 'sessions', time.strftime('session-%Y%m%d-%H%M%S'))
+            self.image_proc.start_recording(archive_path)
+            self.main_window.info_dialog(title='Session Recording', message='Every capture is now recorded to\n'
+                                         + archive_path)
+        else:
+            self.image_proc.stop_recording()
+            self.main_window.info_dialog(title='Session Recording', message='{0} frames were recorded to\n{1}'
+                                         .format(recorder.frame_count, recorder.archive_path))
+
+    def show_obs_stats(self, widget):
+        """
+        Shows the send timings of every obs instance next to the decode and apply timings its plugin reported and the
+        timings of the last capture, so a slow remap during a show can be traced to the mapper, the network or OBS
+        """
+        if self.obs_server is None:
+            stats = 'Nothing has been sent to OBS yet'
+        else:
+            if self.obs_sender is None:
+                self.obs_server.poll_telemetry()
+            stats = obs_plugin_server.format_stats(self.obs_server.get_stats())
+        metrics = image_processing.format_metrics(self.image_proc.metrics)
+        self.main_window.info_dialog(title='OBS Timings', message=stats + ('\n' + metrics if metrics else ''))
 
     def open_data_folder(self, widget):
         """
@@ -174,6 +415,40 @@ class ObsMapper(toga.App):
         export_json = await self.main_window.open_file_dialog('Select OBS Sources exported json', file_types=['json'])
         self.obs_scenes = self.get_obs_scene_export(export_json.as_posix())
 
+    def get_obs_targets(self):
+        """
+        Gets the obs instances to send cameras to from obs_targets.json in the data folder.
+        The file contains {"targets": ["host:port", ...]} and obs on this machine is used when it does not exist.
+        Targets with an invalid port are skipped and listed in obs_target_errors
+        :return: list of (host, port) or None
+        """
+        self.obs_target_errors = []
+        try:
+            with open(os.path.join(self.data_path, 'obs_targets.json'), 'r', encoding='UTF-8') as targets_file:
+                entries = json.load(targets_file)['targets']
+        except (FileNotFoundError, json.decoder.JSONDecodeError, KeyError, TypeError):
+            return None
+        targets = []
+        for entry in entries:
+            try:
+                targets.append(obs_plugin_server.parse_target(entry))
+            except ValueError as exception:
+                self.obs_target_errors.append(str(exception))
+        return targets or None
+
+    def get_governor(self) -> CpuGovernor:
+        """
+        Creates the CPU governor from cpu_governor.json in the data folder. The file can contain any of
+        {"cv_threads": 2, "nice": 10, "affinity": [2, 3], "budget": 0.5} and defaults are used for the rest
+        :return: CpuGovernor
+        """
+        try:
+            with open(os.path.join(self.data_path, 'cpu_governor.json'), 'r', encoding='UTF-8') as governor_file:
+                settings = json.load(governor_file)
+            return CpuGovernor.from_settings(settings)
+        except (FileNotFoundError, json.decoder.JSONDecodeError, ValueError):
+            return CpuGovernor()
+
     def get_obs_scene_export(self, file_path: str = ""):
         """
         Allows user to select scene export json file from OBS
@@ -215,10 +490,10 @@ class ObsMapper(toga.App):
         # If the current image is the first image in the list, wrap around to the last image. Else get previous image
         if cur_image - 1 < 0:
             image_viewer.image = toga.Image(self.cam_images[-1])
-            person_label.text = self.cams[str(image_viewer.image.path)][1]
+            person_label.text = self.layout.names()[self.layout.index(str(image_viewer.image.path))]
         else:
             image_viewer.image = toga.Image(self.cam_images[cur_image - 1])
-            person_label.text = self.cams[str(image_viewer.image.path)][1]
+            person_label.text = self.layout.names()[self.layout.index(str(image_viewer.image.path))]
 
     def next_image(self, widget):
         """
@@ -232,10 +507,10 @@ class ObsMapper(toga.App):
         # If the current image is the last image in the list, wrap around to the first image. Else get next image
         if cur_image + 1 == len(self.cam_images):
             image_viewer.image = toga.Image(self.cam_images[0])
-            person_label.text = self.cams[str(image_viewer.image.path)][1]
+            person_label.text = self.layout.names()[self.layout.index(str(image_viewer.image.path))]
         else:
             image_viewer.image = toga.Image(self.cam_images[cur_image + 1])
-            person_label.text = self.cams[str(image_viewer.image.path)][1]
+            person_label.text = self.layout.names()[self.layout.index(str(image_viewer.image.path))]
 
     async def get_cameras(self, widget):
         # pylint: disable=attribute-defined-outside-init
@@ -249,15 +524,21 @@ class ObsMapper(toga.App):
             :param screenshot: Path to the selected screenshot
             """
             # Gets camera information from image_processing and sets the image_viewer to the first camera
-            self.cams = self.image_proc.get_camera_pos(None, screenshot=screenshot)
-            self.cam_images = list(self.cams.keys())
+            with self.profiler.cycle('detect screenshot'):
+                self.image_proc.get_camera_pos(None, screenshot=screenshot)
+            self.layout = self.image_proc.layout
+            self.restore_cached_bindings(widget, screenshot)
+            self.cam_images = list(self.layout.paths)
             image_viewer = widget.window.widgets.get('image_viewer')
             image_viewer.image = toga.Image(self.cam_images[0])
-            # Checks to see if obs_scenes is set and if not makes the user select a file to set it
+            # Waits for the scene export finish_startup is reading and makes the user select a file if there is none
+            if self.obs_scenes is None and self.obs_scenes_loading is not None:
+                obs_scenes = await self.obs_scenes_loading
+                self.obs_scenes = self.obs_scenes or obs_scenes
             if self.obs_scenes is None:
                 export_json = await self.main_window.open_file_dialog('Select OBS Sources exported json', file_types=['json'])
                 self.obs_scenes = self.get_obs_scene_export(export_json.as_posix())
-        self.cams = {}
+        self.layout = CameraLayout()
         self.cam_images = []
         blank_img = Image.new('RGBA', size = (1,1))
         buffer = io.BytesIO()
@@ -272,12 +553,16 @@ class ObsMapper(toga.App):
                                               file_types=['jpg', 'jpeg', 'png'])
             await get_from_screenshot(screenshot.as_posix())
         else:
-            # If a window is selected then get the window title and set cams and image_viewer
+            # If a window is selected then get the window title and set layout and image_viewer
             window_dict = self.image_proc.get_windows()
             for k in window_dict.keys():
                 if k.startswith(selected_window):
-                    self.cams = self.image_proc.get_camera_pos(k)
-                    self.cam_images = list(self.cams.keys())
+                    with self.profiler.cycle('capture and detect'):
+                        self.image_proc.get_camera_pos(k)
+                        self.profiler.note(image_processing.format_metrics(self.image_proc.metrics))
+                    self.layout = self.image_proc.layout
+                    self.restore_cached_bindings(widget, k)
+                    self.cam_images = list(self.layout.paths)
                     image_viewer = widget.window.widgets.get('image_viewer')
                     image_viewer.image = toga.Image(self.cam_images[0])
                     return
@@ -293,8 +578,208 @@ class ObsMapper(toga.App):
         if cam_selection.value is None:
             return
         # Sets the name of the current camera to the person and sets the label so the user knows who it belongs to
-        self.cams[str(image_viewer.image.path)][1] = cam_selection.value
+        self.layout.bind(self.layout.index(str(image_viewer.image.path)), cam_selection.value)
         person_label.text = cam_selection.value
+        self.cache_layout()
+
+    def cache_layout(self):
+        """
+        Stores the current cameras and the people bound to them in the layout cache
+        """
+        if self.cache_key is not None and len(self.layout) > 0:
+            self.layout_cache.put(*self.cache_key, self.layout.to_cameras())
+
+    def restore_cached_bindings(self, widget, window_title: str):
+        """
+        Binds people to freshly detected cameras from the cached layout of the same window and saves the layout
+        :param window_title: Title of the detected window or path of the screenshot
+        """
+        preset_selection = widget.app.main_window.widgets.get('preset_selection')
+        x, y, x1, y1 = self.image_proc.window_geometry
+        self.cache_key = (str(preset_selection.value), window_title, (x1 - x, y1 - y), self.image_proc.mask_hash)
+        cached = self.layout_cache.get(*self.cache_key)
+        if cached is not None and len(cached) == len(self.layout):
+            for index, cached_cam in enumerate(cached.values()):
+                self.layout.bind(index, cached_cam[1])
+        self.cache_layout()
+
+    async def verify_cached_layout(self, widget, window_title: str):
+        """
+        Captures the window in the background and replaces the cached cameras if the layout changed
+        :param window_title: Title of the window the cached layout belongs to
+        """
+        cached_mask = self.cache_key[3]
+        # The window is activated on this thread, only waiting for it and detecting run in a worker thread
+        is_active = self.image_proc.activate_window(window_title)
+        if is_active is None:
+            return
+        await asyncio.get_event_loop().run_in_executor(self.detect_executor, self.image_proc.get_camera_pos,
+                                                       window_title, None, is_active)
+        if self.image_proc.mask_hash == cached_mask:
+            return
+        # Keeps people bound to cameras that did not move
+        layout = self.image_proc.layout
+        layout.copy_bindings(self.layout)
+        self.layout = layout
+        self.cam_images = list(self.layout.paths)
+        if len(self.cam_images) > 0:
+            image_viewer = widget.window.widgets.get('image_viewer')
+            image_viewer.image = toga.Image(self.cam_images[0])
+            widget.window.widgets.get('person_label').text = self.layout.names()[0]
+        self.cache_key = self.cache_key[:3] + (self.image_proc.mask_hash,)
+        self.cache_layout()
+
+    async def toggle_speaker_tracking(self, widget):
+        """
+        Toggles watching the call window for the active speaker and sending them to the obs plugin
+        """
+        self.speaker_tracking = not self.speaker_tracking
+        await self.watch_call()
+
+    async def toggle_camera_hiding(self, widget):
+        """
+        Toggles watching the call window for cameras that are turned off and hiding their sources in obs
+        """
+        self.camera_hiding = not self.camera_hiding
+        await self.watch_call()
+
+    def send_command(self, msg, key: tuple = None):
+        """
+        Sends a command to the obs plugin through obs_sender once it is started
+        :param msg: command message
+        :param key: Commands with the same key waiting to be sent are merged
+        """
+        if self.obs_sender is not None:
+            self.obs_sender.send_command(msg, key=key)
+        else:
+            self.start_obs_server()
+            self.obs_server.send_command(msg)
+
+    async def watch_call(self):
+        """
+        Watches the selected call window while speaker tracking or camera hiding is on.
+        One frame is grabbed every tick and shared by the speaker detector and the camera off classifier
+        """
+        if self.watching:
+            return
+        window_selection = self.main_window.widgets.get('window_selection')
+        geometry = None
+        if len(self.layout) > 0 and window_selection.value != 'Select Screenshot':
+            # Cameras restored from the layout cache come without a capture, so the watched region is read first
+            geometry = self.image_proc.get_window_geometry(self.image_proc.windows.get(window_selection.value,
+                                                                                       window_selection.value))
+        if geometry is None or geometry[2] <= geometry[0] or geometry[3] <= geometry[1]:
+            self.speaker_tracking = False
+            self.camera_hiding = False
+            return
+        self.image_proc.window_geometry = geometry
+        self.watching = True
+        names = self.layout.names()
+        speaker_detector = tile_analysis.SpeakerDetector()
+        camera_off = tile_analysis.CameraOffClassifier()
+        loop = asyncio.get_event_loop()
+
+        def check_frame():
+            frame = self.image_proc.grab_frame()
+            speaker_changed = self.speaker_tracking and speaker_detector.update(frame)
+            visibility_changes = camera_off.update(frame) if self.camera_hiding else []
+            return speaker_changed, visibility_changes
+
+        def set_visible(tile, visible):
+            # Tiles nobody is bound to have no source in OBS to show or hide
+            if names[tile]:
+                self.send_command(obs_plugin_server.visibility_command(names[tile], visible),
+                                  key=('visible', names[tile]))
+        try:
+            frame = await loop.run_in_executor(self.detect_executor, self.image_proc.grab_frame)
+            speaker_detector.set_rects(self.layout.rect_tuples(), frame.shape)
+            camera_off.set_rects(self.layout.rect_tuples(), frame.shape)
+            while self.speaker_tracking or self.camera_hiding:
+                start = loop.time()
+                speaker_changed, visibility_changes = await loop.run_in_executor(self.detect_executor, check_frame)
+                if speaker_changed:
+                    speaker = names[speaker_detector.speaker] if speaker_detector.speaker is not None else ''
+                    self.send_command(obs_plugin_server.speaker_command(speaker), key=('speaker',))
+                for tile, off in visibility_changes:
+                    set_visible(tile, not off)
+                # Shows hidden cameras again once camera hiding is turned off
+                if not self.camera_hiding and camera_off.camera_off.any():
+                    for tile in camera_off.camera_off.nonzero()[0]:
+                        set_visible(tile, True)
+                    camera_off.camera_off[:] = False
+                # Waits for the next tick or longer if watching has used up its CPU budget
+                throttle = self.governor.throttle()
+                self.image_proc.metrics['cpu_usage'] = self.governor.usage
+                self.image_proc.metrics['cpu_budget'] = self.governor.budget
+                await asyncio.sleep(max(1 / self.watch_fps - (loop.time() - start), throttle))
+        finally:
+            # Hidden cameras are shown again and watching can be started again even if a grab failed
+            for tile in camera_off.camera_off.nonzero()[0]:
+                set_visible(tile, True)
+            self.speaker_tracking = False
+            self.camera_hiding = False
+            self.watching = False
+
+    def window_changed(self, window):
+        """
+        Follows the selected call window when the window tracker sees it move or get resized.
+        OBS captures the window itself so a move only moves the region watched for speakers, a resize detects and
+        maps the cameras again once the window has stopped changing if follow_window is on
+        :param window: TrackedWindow that changed
+        """
+        window_selection = self.main_window.widgets.get('window_selection')
+        if len(self.layout) == 0 or window.wm_name[0:28] != window_selection.value:
+            return
+        geometry = self.image_proc.get_window_geometry(window.wm_name)
+        if geometry is None:
+            return
+        x, y, x1, y1 = self.image_proc.window_geometry
+        if (geometry[2] - geometry[0], geometry[3] - geometry[1]) == (x1 - x, y1 - y):
+            self.image_proc.window_geometry = geometry
+            return
+        if self.follow_window:
+            if self._remap_handle is not None:
+                self._remap_handle.cancel()
+            self._remap_handle = asyncio.get_event_loop().call_later(
+                0.5, lambda: asyncio.ensure_future(self.remap_window(window_selection, window.wm_name)))
+
+    async def remap_window(self, widget, window_title: str):
+        """
+        Detects the cameras of a resized window and maps them. People stay bound to the camera in the same position
+        when the number of cameras did not change, unless the layout cache has a layout for the new size
+        :param window_title: Title of the resized window
+        """
+        self._remap_handle = None
+        names = self.layout.names()
+        is_active = self.image_proc.activate_window(window_title)
+        if is_active is None:
+            return
+        await asyncio.get_event_loop().run_in_executor(self.detect_executor, self.image_proc.get_camera_pos,
+                                                       window_title, None, is_active)
+        layout = self.image_proc.layout
+        if len(layout) == 0:
+            return
+        if len(layout) == len(names):
+            for index, name in enumerate(names):
+                layout.bind(index, name)
+        self.layout = layout
+        self.restore_cached_bindings(widget, window_title)
+        self.cam_images = list(self.layout.paths)
+        widget.window.widgets.get('image_viewer').image = toga.Image(self.cam_images[0])
+        widget.window.widgets.get('person_label').text = self.layout.names()[0]
+        await self.map_cameras(widget)
+
+    def toggle_follow_window(self, widget):
+        """
+        Toggles detecting and mapping the cameras again when the call window is resized
+        """
+        self.follow_window = not self.follow_window
+
+    def toggle_cache_verification(self, widget):
+        """
+        Toggles capturing the window in the background to check layouts loaded from the cache
+        """
+        self.verify_cache = not self.verify_cache
 
     def load_preset(self, widget):
         """
@@ -305,9 +790,28 @@ class ObsMapper(toga.App):
         person_label = widget.window.widgets.get('person_label')
         # Loads selected preset and resets cam names to blank
         cam_selection.items = self.preset_handler.get_people(preset_selection.value)
-        for cam in self.cams.values():
-            cam[1] = ''
+        self.layout.unbind_all()
         person_label.text = ''
+        # Starts from the cached layout of the selected window so cameras can be mapped without capturing again
+        window_title = widget.window.widgets.get('window_selection').value
+        if window_title is None or window_title == 'Select Screenshot':
+            return
+        # The selection shows the first 28 characters of the title, layouts are cached under the full title
+        window_title = self.image_proc.windows.get(window_title, window_title)
+        geometry = self.image_proc.get_window_geometry(window_title)
+        if geometry is None:
+            return
+        size = (geometry[2] - geometry[0], geometry[3] - geometry[1])
+        entry = self.layout_cache.find(str(preset_selection.value), window_title, size)
+        if entry is None:
+            return
+        self.cache_key = (str(preset_selection.value), window_title, size, entry['mask'])
+        self.layout = CameraLayout.from_cameras(self.layout_cache.get(*self.cache_key))
+        self.cam_images = list(self.layout.paths)
+        widget.window.widgets.get('image_viewer').image = toga.Image(self.cam_images[0])
+        person_label.text = self.layout.names()[0]
+        if self.verify_cache:
+            asyncio.ensure_future(self.verify_cached_layout(widget, window_title))
 
     def delete_preset(self, widget):
         """
@@ -538,52 +1042,46 @@ class ObsMapper(toga.App):
 
         return text_len_validation
 
-    def map_cameras(self, widget):
+    async def map_cameras(self, widget):
+        """
+        Maps cameras to obs. While profiling, the send cycle lasts until obs_sender has sent the crops and the wait
+        is timed on its own
+        """
+        with self.profiler.cycle('send') as profiled:
+            self.send_camera_crops(widget)
+            if self.obs_sender is not None and profiled:
+                with self.profiler.paused('flush wait'):
+                    await self.obs_sender.wait_flushed()
+
+    def send_camera_crops(self, widget):
         """
-        Maps cameras to obs
+        Builds the camera crops and sends them to obs
         """
         window_selection = widget.window.widgets.get('window_selection')
+        # Linux window captures include the titlebar so the crops are moved by the offset of the client's profile
+        y_offset = self.image_proc.profile.linux_y_offset if platform.system() == 'Linux' else 0
+        cams = self.layout
+        # The layout lets the plugin move the crops itself when the call window is resized
+        x, y, x1, y1 = self.image_proc.window_geometry
+        layout = None
+        if x1 > x and y1 > y:
+            layout = obs_plugin_server.camera_layout(cams, (x1 - x, y1 - y), self.image_proc.profile.margins, y_offset)
         # If a screenshot is selected, uses scene info to get needed exe information
         if window_selection.value == 'Select Screenshot':
-            cameras = []
-            # Loops through all cameras and makes needed cam json information to create a new source or edit an existing one
-            for cam in self.cams.values():
-                if platform.system() == 'Linux':
-                    cameras.append(
-                        {'camName': cam[1], "x": cam[0][0], "x1": cam[0][2], "y": int(cam[0][1]) - 40, "y1": cam[0][3]})
-                else:
-                    cameras.append(
-                        {'camName': cam[1], "x": cam[0][0], "x1": cam[0][2], "y": int(cam[0][1]), "y1": cam[0][3]})
+            # Makes needed cam json information to create a new source or edit an existing one
+            cameras = obs_plugin_server.build_camera_crops(cams, y_offset, layout)
             # Gets scene information and sends command to OBS plugin to create a new or edit an existing scene
             scene = self.get_source_info_from_json(widget)
             settings = list(dict(scene['settings']).items())
-            obs_cams_send = str({
-                "arg": "crop camera",
-                "os": settings[0][0],
-                "exe": settings[0][1],
-                "cameras": cameras,
-                "id": scene['id']  #
-            })
-            self.obs_server.send_command(obs_cams_send)
+            self.send_crops(settings[0][0], settings[0][1], cameras, scene['id'], layout)
         else:
             cameras = []
-            # Loops through all cameras and makes needed cam json information to create a new source or edit an existing one
-            for cam in self.cams.values():
-                if platform.system() == 'Windows':
-                    cameras.append(
-                        {'camName': cam[1], "x": cam[0][0], "x1": cam[0][2], "y": int(cam[0][1]), "y1": cam[0][3]})
-                if platform.system() == 'Linux':
-                    cameras.append(
-                        {'camName': cam[1], "x": cam[0][0], "x1": cam[0][2], "y": int(cam[0][1]) - 40, "y1": cam[0][3]})
+            # Makes needed cam json information to create a new source or edit an existing one
+            if platform.system() in ('Windows', 'Linux'):
+                cameras = obs_plugin_server.build_camera_crops(cams, y_offset, layout)
             # Sends information to OBS plugin to create or edit an existing scene
-            obs_cams_send = str({
-                "arg": "crop camera",
-                "os": platform.system(),
-                "exe": self.image_proc.get_exe_name(window_selection.value),
-                "cameras": cameras,
-                "id": ''
-            })
-            self.obs_server.send_command(obs_cams_send)
+            self.send_crops(platform.system(), self.image_proc.get_exe_name(window_selection.value), cameras,
+                            layout=layout)
 
     def get_source_info_from_json(self, widget):
         """
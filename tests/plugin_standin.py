@@ -0,0 +1,225 @@
+"""
+Python stand-in for OBSCallMap.lua. Listens on the plugin port, decodes commands the same way the Lua script does
+and keeps the resulting sources and crops in memory with a timestamp for every message, so the mapper can be
+measured without OBS running.
+"""
+import json  # Used to decode commands like dkjson in the plugin
+import math  # Used to round crops like the plugin
+import socket  # Used to listen on the plugin port
+import threading  # Used to receive commands in the background
+import time  # Used to timestamp commands
+from typing import Dict, List, Optional, Tuple  # Used for typing
+
+
+def relative_crop(entry: dict, width: int, height: int) -> Optional[Dict[str, int]]:
+    """
+    Recomputes the crop of a camera for a new source size like relative_crop in OBSCallMap.lua.
+    The box around every camera is scaled to fit the new content area without stretching it and kept at the same
+    relative position
+    :param entry: Relative crop of the source with its camera, layout and chrome
+    :param width: New width of the source
+    :param height: New height of the source
+    :return: dict of left, top, cx and cy or None if the source or the box is empty
+    """
+    cam, layout = entry['cam'], entry['layout']
+    left, top, right, bottom = entry['chrome']
+    content_width, content_height = width - left - right, height - top - bottom
+    margins = layout['margins']
+    detected_width = layout['w'] - margins[0] - margins[2]
+    detected_height = layout['h'] - margins[1] - margins[3]
+    box_x, box_y, box_width, box_height = layout['box']
+    if min(content_width, content_height, detected_width, detected_height, box_width, box_height) <= 0:
+        return None
+    scale = min(content_width / detected_width, content_height / detected_height)
+    scaled_width, scaled_height = box_width * detected_width * scale, box_height * detected_height * scale
+    scaled_x = left + (box_x + box_width / 2) * content_width - scaled_width / 2
+    scaled_y = top + (box_y + box_height / 2) * content_height - scaled_height / 2
+    # Rounds halves up like math.floor(value + 0.5) in Lua
+    return {'left': math.floor(scaled_x + (cam['nx'] - box_x) / box_width * scaled_width + 0.5),
+            'top': math.floor(scaled_y + (cam['ny'] - box_y) / box_height * scaled_height + 0.5),
+            'cx': math.floor(cam['nw'] / box_width * scaled_width + 0.5),
+            'cy': math.floor(cam['nh'] / box_height * scaled_height + 0.5)}
+
+
+class PluginStandIn:
+    """
+    Receives and applies plugin commands in a background thread.
+    Attributes
+    ----------
+    port : int
+        Port the stand-in listens on. Port 0 picks a free port
+    sources : dict
+        Simulated OBS sources. Key is the source name and value is the capture window, CamCrop settings, size and
+        the relative crop used to follow resizes
+    timings : list
+        (received, applied, message size) for every command using time.perf_counter
+    errors : list
+        Messages that could not be decoded
+    speaker : str
+        Source name of the last active speaker
+    send_telemetry : bool
+        Reply to every command with a telemetry report like the plugin does after every tick
+    """
+    port: int
+    sources: Dict[str, dict]
+    timings: List[Tuple[float, float, int]]
+    errors: List[bytes]
+    speaker: str
+    send_telemetry: bool
+
+    def __init__(self, port: int = 48387, host: str = '127.0.0.1', send_telemetry: bool = False):
+        self.sources = {}
+        self.timings = []
+        self.errors = []
+        self.speaker = ''
+        self.send_telemetry = send_telemetry
+        self._created = 0
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self._socket.bind((host, port))
+        self._socket.settimeout(0.1)
+        self.port = self._socket.getsockname()[1]
+        self._received = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Starts receiving commands
+        """
+        self._running = True
+        self._thread = threading.Thread(target=self._receive, name='plugin-standin', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops receiving commands and closes the socket
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        self._socket.close()
+
+    def _receive(self):
+        """
+        Receives commands until stopped
+        """
+        while self._running:
+            try:
+                data, address = self._socket.recvfrom(65536)
+            except socket.timeout:
+                continue
+            received = time.perf_counter_ns()
+            created = self._created
+            try:
+                args = self.decode(data.decode('utf-8'))
+                decoded = time.perf_counter_ns()
+                self.apply(args)
+            except (ValueError, KeyError, TypeError):
+                decoded = received
+                self.errors.append(data)
+            applied = time.perf_counter_ns()
+            if self.send_telemetry:
+                report = {'arg': 'telemetry', 'messages': 1, 'decode_ns': decoded - received, 'applied': 1,
+                          'apply_ns': applied - decoded, 'max_apply_ns': applied - decoded, 'pending': 0,
+                          'created': self._created - created, 'filters': self._created - created,
+                          'updated': 0, 'lagged_frames': 0, 'tick_late_ns': 0}
+                self._socket.sendto(json.dumps(report).encode('utf-8'), address)
+            with self._received:
+                self.timings.append((received / 1e9, applied / 1e9, len(data)))
+                self._received.notify_all()
+
+    def handle(self, data: str):
+        """
+        Decodes and applies a command like client() in OBSCallMap.lua
+        :param data: command message
+        """
+        self.apply(self.decode(data))
+
+    @staticmethod
+    def decode(data: str) -> dict:
+        """
+        Decodes a command like client() in OBSCallMap.lua
+        """
+        return json.loads(data.replace("'", '"'))
+
+    def apply(self, args: dict):
+        """
+        Applies a decoded command like apply_update in OBSCallMap.lua
+        """
+        if args['arg'] == 'crop camera':
+            self.crop_cam(args['exe'], args['cameras'], args['os'], args['id'], args.get('layout'))
+        elif args['arg'] == 'active speaker':
+            self.speaker = args['camName']
+        elif args['arg'] == 'camera visibility':
+            self.sources.setdefault(args['camName'], {'crop': {}})['visible'] = args['visible'] == 1
+
+    def crop_cam(self, win_title: str, cam_info: List[dict], os_name: str, source_id: str, layout: dict = None):
+        """
+        Creates or updates a source and its CamCrop filter for every camera like crop_cam in OBSCallMap.lua.
+        New sources have no size until resize is called, like OBS sources before they render
+        """
+        for cam in cam_info:
+            if cam['camName'] not in self.sources:
+                self._created += 1
+            source = self.sources.setdefault(cam['camName'], {'id': source_id, 'crop': {}})
+            source['os'] = os_name
+            source['window'] = win_title
+            source['crop'].update({'left': cam['x'], 'top': cam['y'], 'cx': cam['x1'], 'cy': cam['y1']})
+            source.pop('relative', None)
+            if layout is not None and 'nx' in cam:
+                source['relative'] = {'cam': cam, 'layout': layout, 'size': (0, 0), 'chrome': None}
+                self.__set_baseline(source['relative'], *source.get('size', (0, 0)))
+
+    @staticmethod
+    def __set_baseline(entry: dict, width: int, height: int):
+        """
+        Records the size a relative crop was set for like set_crop_baseline in OBSCallMap.lua
+        """
+        if width == 0 or height == 0:
+            return
+        layout = entry['layout']
+        y_offset = layout['yOffset']
+        left, top, right, bottom = layout['margins']
+        entry['size'] = (width, height)
+        # Chrome is measured from the source edges so it stays the same size when the source is resized
+        entry['chrome'] = (left, top + y_offset, width - (layout['w'] - right),
+                           height - (layout['h'] - bottom + y_offset))
+
+    def resize(self, cam_name: str, width: int, height: int):
+        """
+        Simulates the capture source of a camera changing size and recomputes its crop like check_resizes
+        in OBSCallMap.lua. The first size of a new source only records the baseline
+        """
+        source = self.sources[cam_name]
+        source['size'] = (width, height)
+        entry = source.get('relative')
+        if entry is None:
+            return
+        if entry['chrome'] is None:
+            self.__set_baseline(entry, width, height)
+            return
+        if entry['size'] == (width, height):
+            return
+        entry['size'] = (width, height)
+        crop = relative_crop(entry, width, height)
+        if crop is not None:
+            source['crop'].update(crop)
+
+    def reset(self):
+        """
+        Forgets the timings and errors of the commands received so far
+        """
+        with self._received:
+            self.timings.clear()
+            self.errors.clear()
+
+    def wait_for(self, count: int, timeout: float = 5.0) -> bool:
+        """
+        Waits until count commands have been received
+        :param count: Total number of commands to wait for
+        :param timeout: Longest time to wait in seconds
+        :return: True if the commands were received
+        """
+        with self._received:
+            return self._received.wait_for(lambda: len(self.timings) >= count, timeout)
@@ -0,0 +1,54 @@
+"""
+Creates synthetic call window frames with a known gallery of camera tiles on a black background.
+"""
+import math  # Used to lay out the gallery grid
+from typing import List, Tuple  # Used for typing
+
+import numpy as np  # Used to draw the frames
+
+
+def gallery_rects(tiles: int, width: int = 1920, height: int = 1080, gap: int = 8) -> List[Tuple[int, int, int, int]]:
+    """
+    Returns the rect (x, y, width, height) of every tile in a gallery laid out like a call client grid
+    :param tiles: Number of camera tiles
+    :param width: Width of the frame
+    :param height: Height of the frame
+    :param gap: Black gap between tiles and around the gallery
+    :return: list of tile rects
+    """
+    columns = math.ceil(math.sqrt(tiles))
+    rows = math.ceil(tiles / columns)
+    tile_width = (width - gap * (columns + 1)) // columns
+    tile_height = (height - gap * (rows + 1)) // rows
+    # Keeps tiles 16:9 like camera feeds and narrow enough for the detector to not treat them as the window
+    tile_width = min(tile_width, tile_height * 16 // 9, width - 160)
+    tile_height = tile_width * 9 // 16
+    left = (width - columns * tile_width - (columns - 1) * gap) // 2
+    top = (height - rows * tile_height - (rows - 1) * gap) // 2
+    rects = []
+    for index in range(tiles):
+        row, column = divmod(index, columns)
+        rects.append((left + column * (tile_width + gap), top + row * (tile_height + gap), tile_width, tile_height))
+    return rects
+
+
+def gallery_frame(tiles: int, width: int = 1920, height: int = 1080, gap: int = 8,
+                  seed: int = 0) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]]]:
+    """
+    Draws a BGR frame of a call gallery. Every tile is a noisy colour gradient so no tile pixel is pure black
+    :param tiles: Number of camera tiles
+    :param width: Width of the frame
+    :param height: Height of the frame
+    :param gap: Black gap between tiles and around the gallery
+    :param seed: Seed for the tile colours
+    :return: frame and the rect of every tile
+    """
+    rng = np.random.default_rng(seed)
+    frame = np.zeros((height, width, 3), np.uint8)
+    rects = gallery_rects(tiles, width, height, gap)
+    for x, y, tile_width, tile_height in rects:
+        base = rng.integers(40, 200, 3)
+        gradient = np.linspace(0, 40, tile_width, dtype=np.int16)[None, :, None]
+        noise = rng.integers(0, 16, (tile_height, tile_width, 3), dtype=np.int16)
+        frame[y:y + tile_height, x:x + tile_width] = np.clip(base + gradient + noise, 20, 255).astype(np.uint8)
+    return frame, rects
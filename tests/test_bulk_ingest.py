@@ -0,0 +1,34 @@
+import json
+import shutil
+from mappingUtils import bulk_ingest, image_processing
+
+
+def test_find_screenshots(tmp_path):
+    shutil.copyfile('tests/discord_test.png', str(tmp_path / 'a.png'))
+    shutil.copyfile('tests/discord_test.png', str(tmp_path / 'b.PNG'))
+    (tmp_path / 'notes.txt').write_text('')
+    found = bulk_ingest.find_screenshots([str(tmp_path), str(tmp_path / '*.png')])
+    assert [path.split('/')[-1] for path in found] == ['a.png', 'b.PNG']
+
+
+def test_ingest_matches_single_detection(tmp_path):
+    for name in ('a', 'b', 'c'):
+        shutil.copyfile('tests/discord_test.png', str(tmp_path / (name + '.png')))
+    stats = bulk_ingest.ingest(bulk_ingest.find_screenshots([str(tmp_path)]), str(tmp_path / 'layouts'), workers=2)
+    assert stats['layouts'] == 3
+    assert not stats['errors']
+    ip = image_processing.ImageProcessing(str(tmp_path), False)
+    expected = [list(cam[0]) for cam in ip.get_camera_pos(None, screenshot='tests/discord_test.png').values()]
+    with open(str(tmp_path / 'layouts' / 'b.json'), encoding='UTF-8') as layout_file:
+        layout = json.load(layout_file)
+    assert [camera['rect'] for camera in layout['cameras']] == expected
+    assert layout['size'] == [1922, 1082]
+
+
+def test_layout_paths_do_not_clash(tmp_path):
+    screenshots = [str(tmp_path / 'a' / 'call.png'), str(tmp_path / 'b' / 'call.jpg'), str(tmp_path / 'a' / 'talk.png')]
+    paths = bulk_ingest.layout_paths(screenshots, 'layouts')
+    assert [path.split('/')[-1] for path in paths.values()] == ['a_call_png.json', 'b_call_jpg.json', 'talk.json']
+    clashing = [str(tmp_path / 'a' / 'c.png'), str(tmp_path / 'b' / 'c.png'), str(tmp_path / 'a_c_png.png')]
+    paths = bulk_ingest.layout_paths(clashing, 'layouts')
+    assert [path.split('/')[-1] for path in paths.values()] == ['a_c_png.json', 'b_c_png.json', 'a_c_png-2.json']
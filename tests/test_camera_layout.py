@@ -0,0 +1,57 @@
+from mappingUtils import camera_layout, image_processing, obs_plugin_server
+from tests.synthetic_frames import gallery_frame
+
+CAMERAS = {'0.jpg': [(8, 301, 949, 534), 'Luna'], '1.jpg': [(962, 301, 949, 534), '']}
+
+
+def test_round_trip_cameras_dict():
+    layout = camera_layout.CameraLayout.from_cameras(CAMERAS, ['James', 'Luna'])
+    assert layout.cameras['person'].tolist() == [1, -1]
+    assert layout.to_cameras() == CAMERAS
+
+
+def test_transforms_keep_ids_and_bindings():
+    layout = camera_layout.CameraLayout.from_cameras(CAMERAS)
+    moved = layout.offset(0, -40).scale(0.5)
+    assert moved.rect_tuples() == [(4, 130, 474, 267), (481, 130, 474, 267)]
+    assert moved.names() == ['Luna', '']
+    assert layout.rect_tuples()[0] == (8, 301, 949, 534)
+
+
+def test_diff_and_copy_bindings():
+    layout = camera_layout.CameraLayout.from_cameras(CAMERAS)
+    changed = layout.offset(0, 0)
+    changed.cameras['x'][1] += 10
+    changed.bind(0, 'James')
+    assert changed.diff(layout) == {'added': [], 'removed': [], 'moved': [1], 'rebound': [0]}
+    assert camera_layout.CameraLayout().diff(layout)['removed'] == [0, 1]
+    fresh = camera_layout.CameraLayout.from_cameras({'a.jpg': [(8, 301, 949, 534), ''], 'b.jpg': [(0, 0, 5, 5), '']})
+    assert fresh.copy_bindings(layout) == 1
+    assert fresh.names() == ['Luna', '']
+
+
+def test_crops_match_wire_format(tmp_path):
+    ip = image_processing.ImageProcessing(str(tmp_path))
+    ip.process_frame(gallery_frame(9)[0], save_crops=False)
+    (x, y, width, height), name = next(iter(ip.cameras.values()))
+    relative = obs_plugin_server.camera_layout(ip.cameras, (1920, 1080), (0, 40, 0, 60), -40)
+    assert ip.layout.crops(-40, relative)[0] == {'camName': name, 'x': x, 'x1': width, 'y': y - 40, 'y1': height,
+                                                 'nx': round(x / 1920, 5), 'ny': round((y - 40) / 980, 5),
+                                                 'nw': round(width / 1920, 5), 'nh': round(height / 980, 5)}
+
+def test_append_keeps_ids_unique():
+    layout = camera_layout.CameraLayout([(0, 0, 10, 10)], ['Luna'])
+    layout.cameras['id'][0] = 7
+    assert layout.append((10, 0, 10, 10), 'b.jpg', 'James') == 1
+    assert layout.cameras['id'].tolist() == [7, 8]
+    assert layout.names() == ['', 'James']
+    assert layout.index('b.jpg') == 1
+
+
+def test_empty_layout_creates_array_on_first_append():
+    layout = camera_layout.CameraLayout()
+    assert len(layout) == 0 and layout.names() == [] and layout.to_cameras() == {}
+    layout.unbind_all()
+    assert layout._cameras is None
+    layout.append((1, 2, 3, 4), '0.jpg', 'Luna')
+    assert layout.to_cameras() == {'0.jpg': [(1, 2, 3, 4), 'Luna']}
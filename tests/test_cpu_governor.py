@@ -0,0 +1,92 @@
+import os
+import cv2
+import psutil
+import pytest
+from mappingUtils import cpu_governor, image_processing
+
+
+class FakeClock:
+    def __init__(self):
+        self.cpu = 0.0
+        self.wall = 0.0
+
+    def spin(self, seconds):
+        self.cpu += seconds
+        self.wall += seconds
+
+    def sleep(self, seconds):
+        self.wall += seconds
+
+    def governor(self, **settings):
+        return cpu_governor.CpuGovernor(cpu_clock=lambda: self.cpu, wall_clock=lambda: self.wall, sleep=self.sleep,
+                                        **settings)
+
+
+def test_apply_caps_threads_and_priority(tmp_path):
+    ip = image_processing.ImageProcessing(str(tmp_path), False)
+    threads = cv2.getNumThreads()
+    nice = psutil.Process().nice()
+    try:
+        cpu_governor.CpuGovernor(cv_threads=1, nice=19).apply(ip)
+        assert cv2.getNumThreads() == 1
+        assert ip.strip_workers == 1
+        assert psutil.Process().nice() == nice
+    finally:
+        cv2.setNumThreads(threads)
+
+
+def test_executor_threads_run_at_lowered_priority():
+    nice = psutil.Process().nice()
+    with cpu_governor.CpuGovernor(nice=19).executor(1) as executor:
+        # Linux keeps a niceness for every thread and 0 is the calling thread
+        thread_nice = executor.submit(os.getpriority, os.PRIO_PROCESS, 0).result()
+    assert psutil.Process().nice() == nice
+    assert thread_nice == 19
+
+
+def test_from_settings_checks_types():
+    governor = cpu_governor.CpuGovernor.from_settings({'cv_threads': 1, 'budget': 0.25, 'unknown': True})
+    assert (governor.cv_threads, governor.budget) == (1, 0.25)
+    for settings in ([], {'nice': 'ten'}, {'affinity': 2}, {'budget': None}, {'cv_threads': 0}):
+        with pytest.raises(ValueError):
+            cpu_governor.CpuGovernor.from_settings(settings)
+
+
+def test_throttle_within_budget():
+    clock = FakeClock()
+    governor = clock.governor(budget=1.0)
+    assert governor.throttle() == 0.0
+    clock.spin(0.01)
+    clock.sleep(0.04)
+    assert governor.throttle() == 0.0
+
+
+def test_throttle_over_budget():
+    clock = FakeClock()
+    governor = clock.governor(budget=0.1)
+    governor.throttle()
+    clock.spin(0.2)
+    # The CPU time used past the budget drains at 0.1 CPU seconds per second
+    assert governor.throttle() == pytest.approx((0.2 - 0.1 * 0.2) / 0.1)
+
+
+def test_wait_keeps_usage_near_budget():
+    clock = FakeClock()
+    governor = clock.governor(budget=0.25)
+    governor.throttle()
+    for _ in range(10):
+        clock.spin(0.01)
+        governor.wait()
+    assert clock.cpu / clock.wall == pytest.approx(0.25)
+
+
+def test_usage_is_shown_in_metrics(tmp_path):
+    clock = FakeClock()
+    governor = clock.governor(budget=0.5)
+    governor.throttle()
+    clock.spin(1.0)
+    governor.throttle()
+    ip = image_processing.ImageProcessing(str(tmp_path), False)
+    ip.governor = governor
+    ip.get_camera_pos(None, screenshot='tests/discord_test.png')
+    assert image_processing.format_metrics(ip.metrics) == 'detection used 100% of a core with a budget of 50%'
@@ -0,0 +1,93 @@
+import os
+from mappingUtils import cycle_profiler
+
+
+def busy():
+    return sum(i * i for i in range(10000))
+
+
+def test_inactive_profiler_writes_nothing(tmp_path):
+    profiler = cycle_profiler.CycleProfiler(str(tmp_path / 'profiles'), cycles=2)
+    with profiler.cycle('detect'):
+        busy()
+    assert profiler.stop() is None
+    assert not os.path.exists(str(tmp_path / 'profiles'))
+
+
+def test_profile_saved_after_cycles(tmp_path):
+    profiler = cycle_profiler.CycleProfiler(str(tmp_path / 'profiles'), cycles=2)
+    profiler.start()
+    with profiler.cycle('detect'):
+        busy()
+    assert profiler.active
+    with profiler.cycle('send'):
+        busy()
+    assert not profiler.active
+    prof, summary = profiler.last_output
+    assert os.path.isfile(prof)
+    with open(summary, encoding='UTF-8') as summary_file:
+        text = summary_file.read()
+    assert text.startswith('2 cycles profiled')
+    assert 'busy' in text
+
+
+def test_stop_saves_partial_profile(tmp_path):
+    profiler = cycle_profiler.CycleProfiler(str(tmp_path / 'profiles'), cycles=5)
+    profiler.start()
+    with profiler.cycle('detect'):
+        busy()
+    assert profiler.stop() is not None
+    assert not profiler.active
+
+
+def test_profiles_do_not_overwrite_each_other(tmp_path):
+    profiler = cycle_profiler.CycleProfiler(str(tmp_path / 'profiles'), cycles=1)
+    outputs = set()
+    for _ in range(3):
+        profiler.start()
+        with profiler.cycle('send'):
+            busy()
+        outputs.add(profiler.last_output)
+    assert len(outputs) == 3
+    assert len(os.listdir(str(tmp_path / 'profiles'))) == 6
+
+
+def test_stop_while_cycle_is_open(tmp_path):
+    profiler = cycle_profiler.CycleProfiler(str(tmp_path / 'profiles'), cycles=2)
+    profiler.start()
+    with profiler.cycle('detect'):
+        busy()
+    with profiler.cycle('send'):
+        with profiler.paused('flush wait'):
+            profiler.stop()
+    assert not profiler.active
+    with open(profiler.last_output[1], encoding='UTF-8') as summary_file:
+        assert summary_file.read().startswith('1 cycles profiled')
+
+
+def test_overlapping_cycle_is_not_profiled(tmp_path):
+    profiler = cycle_profiler.CycleProfiler(str(tmp_path / 'profiles'), cycles=2)
+    profiler.start()
+    with profiler.cycle('send') as profiled:
+        with profiler.paused('flush wait'):
+            with profiler.cycle('detect') as overlapping:
+                busy()
+    assert profiled and not overlapping
+    assert profiler.remaining == 1
+    profiler.stop()
+    with open(profiler.last_output[1], encoding='UTF-8') as summary_file:
+        text = summary_file.read()
+    assert '(flush wait' in text
+    assert 'busy' not in text
+
+
+def test_notes_are_listed_with_their_cycle(tmp_path):
+    profiler = cycle_profiler.CycleProfiler(str(tmp_path / 'profiles'), cycles=1)
+    profiler.note('before any cycle')
+    profiler.start()
+    with profiler.cycle('capture and detect'):
+        profiler.note('capture waited 12.0 ms for the window over 3 grabs')
+    with open(profiler.last_output[1], encoding='UTF-8') as summary_file:
+        text = summary_file.read()
+    assert '(capture waited 12.0 ms for the window over 3 grabs)' in text
+    assert 'before any cycle' not in text
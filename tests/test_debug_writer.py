@@ -0,0 +1,67 @@
+import os
+import numpy as np
+from mappingUtils import debug_writer, image_processing
+
+
+def test_images_numbered_by_frame(tmp_path):
+    writer = debug_writer.DebugWriter(str(tmp_path), scale=1)
+    image = np.full((20, 30, 3), 128, np.uint8)
+    writer.submit('window', image)
+    writer.submit('mask', lambda: image[:, :, 0], mask=True)
+    writer.submit('window', image)
+    writer.flush()
+    assert sorted(os.listdir(writer.session_location)) == ['000001-mask.png', '000001-window.png',
+                                                           '000002-window.png']
+    assert writer.written == 3
+
+
+def test_images_downscaled(tmp_path):
+    import cv2
+    writer = debug_writer.DebugWriter(str(tmp_path), scale=0.5)
+    writer.submit('window', np.zeros((40, 60, 3), np.uint8))
+    writer.flush()
+    assert cv2.imread(os.path.join(writer.session_location, '000001-window.png')).shape == (20, 30, 3)
+
+
+def test_full_queue_drops(tmp_path):
+    writer = debug_writer.DebugWriter(str(tmp_path), max_queue=1)
+    results = [writer.submit('window', lambda: np.zeros((10, 10), np.uint8)) for _ in range(50)]
+    writer.flush()
+    assert writer.dropped == results.count(False)
+
+
+def test_size_cap_removes_oldest(tmp_path):
+    old_session = tmp_path / 'old'
+    old_session.mkdir()
+    (old_session / 'big.png').write_bytes(b'0' * 5000)
+    writer = debug_writer.DebugWriter(str(tmp_path), scale=1, compression=0, max_bytes=4000)
+    image = np.random.default_rng(0).integers(0, 255, (20, 20, 3), dtype=np.uint8)
+    for _ in range(5):
+        writer.submit('window', image)
+    writer.flush()
+    assert not old_session.exists()
+    files = sorted(os.listdir(writer.session_location))
+    assert files[-1] == '000005-window.png'
+    assert '000001-window.png' not in files
+    assert sum(os.path.getsize(os.path.join(writer.session_location, file)) for file in files) <= 4000
+
+
+def test_debug_detection_writes_images(tmp_path):
+    ip = image_processing.ImageProcessing(str(tmp_path), True)
+    ip.get_camera_pos(None, screenshot='tests/discord_test.png')
+    ip.debug_writer.flush()
+    assert sorted(os.listdir(ip.debug_writer.session_location)) == [
+        '000001-edged.png', '000001-erosion.png', '000001-mask.png', '000001-processed_image.png',
+        '000001-window.png']
+
+
+def test_failed_images_are_counted(tmp_path):
+    writer = debug_writer.DebugWriter(str(tmp_path), scale=1)
+
+    def broken():
+        raise ValueError('no frame')
+    writer.submit('window', broken)
+    writer.submit('mask', np.zeros((10, 10), np.uint8), mask=True)
+    writer.flush()
+    assert (writer.written, writer.failed) == (1, 1)
+    assert writer.last_error == 'window: no frame'
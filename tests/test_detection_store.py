@@ -0,0 +1,27 @@
+import os
+from mappingUtils import detection_store, image_processing
+from tests.synthetic_frames import gallery_frame
+
+
+def test_store_drops_oldest_generation(tmp_path):
+    store = detection_store.DetectionStore(str(tmp_path), max_generations=2)
+    first = store.begin()
+    path = store.add(0, (0, 0, 10, 10))
+    open(path, 'w').close()
+    store.begin()
+    assert store.get(first) is not None
+    store.begin()
+    assert store.get(first) is None
+    assert not os.path.exists(path)
+    assert len(store.generations()) == 2
+
+
+def test_detection_does_not_keep_stale_cameras(tmp_path):
+    ip = image_processing.ImageProcessing(str(tmp_path))
+    ip.process_frame(gallery_frame(9)[0])
+    cameras = ip.process_frame(gallery_frame(4)[0])
+    assert len(cameras) == 4
+    assert ip.layout.to_cameras() == cameras
+    assert ip.layout is ip.detections.layout()
+    assert len(os.listdir(ip.save_location)) <= ip.detections.max_generations * 9
+
@@ -0,0 +1,62 @@
+import json
+import numpy as np
+from mappingUtils import detector_profiles, image_processing
+from tests.synthetic_frames import gallery_frame
+
+
+def zoom_frame():
+    gallery, rects = gallery_frame(4, 1280, 616, seed=4)
+    gallery[gallery.max(axis=2) == 0] = 26
+    frame = np.full((720, 1280, 3), 26, np.uint8)
+    frame[40:656] = gallery
+    # Toolbars with buttons that would be found as tiles if they were searched
+    frame[:40] = 60
+    frame[660:716, 20:120] = 200
+    frame[660:716, 140:240] = 200
+    # The detector finds the top and left edges one pixel outside of every tile
+    return frame, [(x - 1, y + 39, width + 1, height + 1) for x, y, width, height in rects]
+
+
+def test_classify_by_window_class():
+    assert detector_profiles.classify('Chrome_WidgetWin_1 Discord.exe').name == 'Discord'
+    assert detector_profiles.classify('zoom.zoom').name == 'Zoom'
+    assert detector_profiles.classify('Chrome_WidgetWin_1 ms-teams.exe').name == 'Teams'
+    assert detector_profiles.classify('gnome-terminal') is detector_profiles.DISCORD
+
+
+def test_custom_profiles_take_priority(tmp_path):
+    profiles_file = tmp_path / 'detector_profiles.json'
+    profiles_file.write_text(json.dumps({'profiles': [{'name': 'Jitsi', 'window_classes': ['zoom', 'jitsi'],
+                                                       'margins': [0, 10, 0, 0]}]}))
+    profiles = detector_profiles.load_profiles(str(profiles_file))
+    assert detector_profiles.classify('zoom.zoom', profiles).name == 'Jitsi'
+    assert detector_profiles.load_profiles(str(tmp_path / 'missing.json')) == detector_profiles.PROFILES
+
+
+def test_region_inside_margins():
+    profile = detector_profiles.DetectorProfile('Test', margins=(10, 40, 10, 60), roi=(0.0, 0.0, 0.5, 1.0))
+    assert profile.region(1280, 720) == (10, 40, 640, 660)
+
+
+def test_zoom_profile_detects_tiles_in_window_coordinates(tmp_path):
+    frame, rects = zoom_frame()
+    ip = image_processing.ImageProcessing(str(tmp_path))
+    assert ip.process_frame(frame, save_crops=False) == {}
+    ip.profile = detector_profiles.ZOOM
+    cameras = ip.process_frame(frame, save_crops=False)
+    assert sorted(cam[0] for cam in cameras.values()) == sorted(rects)
+
+
+def test_invalid_custom_profiles_are_skipped(tmp_path):
+    profiles_file = tmp_path / 'detector_profiles.json'
+    profiles_file.write_text(json.dumps({'profiles': [{'name': 'Short margins', 'margins': [0, 60]},
+                                                      {'name': 'Typo', 'window_class': ['jitsi']},
+                                                      {'name': 'Backwards', 'roi': [0.5, 0, 0.2, 1]},
+                                                      {'name': 'Jitsi', 'window_classes': ['jitsi']}]}))
+    errors = []
+    profiles = detector_profiles.load_profiles(str(profiles_file), errors)
+    assert [profile.name for profile in profiles] == ['Jitsi', 'Discord', 'Zoom', 'Teams']
+    assert [error.split(':')[0] for error in errors] == ['Short margins', 'Typo', 'Backwards']
+    profiles_file.write_text('{"profiles": ')
+    assert detector_profiles.load_profiles(str(profiles_file), errors) == detector_profiles.PROFILES
+    assert len(errors) == 4
@@ -1,7 +1,10 @@
 import pytest
-from mappingUtils import image_processing
+import wmctrl
+from mappingUtils import image_processing, detector_profiles, x11_windows
 import os
+import numpy as np
 from PIL import Image
+from tests.synthetic_frames import gallery_frame
 
 def test_get_windows_dict():
     ip = image_processing.ImageProcessing(os.getcwd(), False)
@@ -59,4 +62,49 @@ def test_toggle_debug_off():
     ip = image_processing.ImageProcessing(os.getcwd(), True)
     assert ip.toggle_debugging() is None
 
+def test_strip_detection_matches_single_pass(tmp_path):
+    single = image_processing.ImageProcessing(str(tmp_path), False)
+    single.strip_workers = 1
+    strips = image_processing.ImageProcessing(str(tmp_path), False)
+    strips.strip_workers = 4
+    strips.strip_min_pixels = 0
+    for frame, _ in (gallery_frame(9, 7680, 4320, seed=1), gallery_frame(49, 3840, 2160, seed=2)):
+        single.cameras = {}
+        strips.cameras = {}
+        expected = single.process_frame(frame, save_crops=False)
+        assert strips.process_frame(frame, save_crops=False) == expected
+        assert strips.mask_hash == single.mask_hash
 
+def test_capture_waits_for_stable_active_window(tmp_path):
+    ip = image_processing.ImageProcessing(str(tmp_path), False)
+    ip.capture_poll_interval = 0
+    # Controls fade out over the first grabs and the window only becomes active on the third check
+    frames = iter([np.full((64, 64, 4), value, np.uint8) for value in (200, 120, 40, 40, 40)])
+    checks = iter([False, False, True, True, True, True])
+    shot = ip.wait_until_ready(lambda: next(frames), lambda: next(checks))
+    assert shot[0, 0, 0] == 40
+    assert ip.metrics['capture_grabs'] == 4
+
+def test_capture_times_out_on_inactive_window(tmp_path):
+    ip = image_processing.ImageProcessing(str(tmp_path), False)
+    ip.capture_timeout = 0.05
+    ip.capture_poll_interval = 0.01
+    shot = ip.wait_until_ready(lambda: np.zeros((8, 8, 4), np.uint8), lambda: False)
+    assert shot.shape == (8, 8, 4)
+    assert ip.metrics['capture_grabs'] == 1
+    assert ip.metrics['capture_wait'] >= 0.05
+    assert image_processing.format_metrics(ip.metrics).endswith('over 1 grabs')
+
+def test_window_geometry_matches_on_both_backends(tmp_path, monkeypatch):
+    ip = image_processing.ImageProcessing(str(tmp_path), False)
+    titlebar = detector_profiles.DISCORD.titlebar
+    # wmctrl reports the window with its frame while the tracker reads the client area below the titlebar
+    framed = wmctrl.Window('0x0000000a', 0, 1, 100, 200, 800, 600 + titlebar, 'discord.discord', 'host', 'General')
+    monkeypatch.setattr(wmctrl.Window, 'by_name', staticmethod(lambda title: [framed]))
+    ip.window_tracker = None
+    wmctrl_geometry = ip.get_window_geometry('General')
+    tracker = x11_windows.X11WindowTracker()
+    tracker.update(x11_windows.TrackedWindow('0x0000000a', 'General', 'discord.discord', 100, 200 + titlebar, 800, 600))
+    tracker.running = True
+    ip.window_tracker = tracker
+    assert ip.get_window_geometry('General') == wmctrl_geometry == (100, 200 + titlebar, 900, 800 + titlebar)
@@ -0,0 +1,55 @@
+import numpy as np
+from mappingUtils import layout_cache
+
+
+def test_get_empty_cache(tmp_path):
+    cache = layout_cache.LayoutCache(str(tmp_path / 'layout_cache.json'))
+    assert cache.get('TestingPreset', 'General', (1920, 1080)) is None
+
+def test_put_and_get_persists(tmp_path):
+    cache = layout_cache.LayoutCache(str(tmp_path / 'layout_cache.json'))
+    cache.put('TestingPreset', 'General', (1920, 1080), 'abc', {'0.jpg': [(8, 301, 949, 534), 'Luna']})
+    cache = layout_cache.LayoutCache(str(tmp_path / 'layout_cache.json'))
+    cameras = cache.get('TestingPreset', 'General', (1920, 1080))
+    assert list(cameras.values()) == [[(8, 301, 949, 534), 'Luna']]
+
+def test_get_different_mask(tmp_path):
+    cache = layout_cache.LayoutCache(str(tmp_path / 'layout_cache.json'))
+    cache.put('TestingPreset', 'General', (1920, 1080), 'abc', {'0.jpg': [(8, 301, 949, 534), 'Luna']})
+    assert cache.get('TestingPreset', 'General', (1920, 1080), 'def') is None
+    assert cache.get('TestingPreset2', 'General', (1920, 1080)) is None
+
+def test_put_removes_least_recently_used(tmp_path):
+    cache = layout_cache.LayoutCache(str(tmp_path / 'layout_cache.json'), max_entries=1)
+    cache.put('TestingPreset', 'General', (1920, 1080), 'abc', {})
+    cache.put('TestingPreset', 'General', (1280, 720), 'abc', {})
+    assert len(cache.entries) == 1
+    assert cache.entries[0]['size'] == [1280, 720]
+
+def test_mask_hash_stable():
+    mask = np.zeros((1080, 1920), np.uint8)
+    mask[300:800, 10:950] = 255
+    assert layout_cache.mask_hash(mask) == layout_cache.mask_hash(mask.copy())
+    mask[300:800, 960:1900] = 255
+    assert layout_cache.mask_hash(mask) != layout_cache.mask_hash(np.zeros((1080, 1920), np.uint8))
+
+def test_mask_hash_of_shrunk_mask():
+    mask = np.zeros((1080, 1920), np.uint8)
+    mask[300:800, 10:950] = 255
+    assert layout_cache.mask_hash(layout_cache.shrink_mask(mask)) == layout_cache.mask_hash(mask)
+
+def test_rebinding_does_not_copy_images_or_save(tmp_path):
+    image = tmp_path / '0.jpg'
+    image.write_bytes(b'first')
+    cache = layout_cache.LayoutCache(str(tmp_path / 'layout_cache.json'), save_interval=60)
+    cache.put('TestingPreset', 'General', (1920, 1080), 'abc', {str(image): [(8, 301, 949, 534), '']})
+    image.write_bytes(b'second')
+    cache.put('TestingPreset', 'General', (1920, 1080), 'abc', {str(image): [(8, 301, 949, 534), 'Luna']})
+    cameras = cache.get('TestingPreset', 'General', (1920, 1080))
+    with open(list(cameras.keys())[0], 'rb') as cached_image:
+        assert cached_image.read() == b'first'
+    assert list(layout_cache.LayoutCache(str(tmp_path / 'layout_cache.json')).get(
+        'TestingPreset', 'General', (1920, 1080)).values()) == [[(8, 301, 949, 534), '']]
+    cache.flush()
+    assert list(layout_cache.LayoutCache(str(tmp_path / 'layout_cache.json')).get(
+        'TestingPreset', 'General', (1920, 1080)).values()) == [[(8, 301, 949, 534), 'Luna']]
@@ -0,0 +1,70 @@
+import numpy as np
+from mappingUtils import image_processing, layout_cache, layout_templates
+from tests.synthetic_frames import gallery_frame
+
+
+def small_mask(frame):
+    return layout_cache.shrink_mask(np.where(frame[:, :, :3].max(axis=2) <= 1, 255, 0).astype(np.uint8))
+
+
+def test_match_empty_library():
+    library = layout_templates.TemplateLibrary()
+    frame, _ = gallery_frame(4)
+    assert library.match(small_mask(frame), (1920, 1080)) == (None, 0.0)
+
+
+def test_add_and_snap_persists(tmp_path):
+    library = layout_templates.TemplateLibrary(str(tmp_path / 'templates.json'))
+    frame, rects = gallery_frame(4)
+    library.add(small_mask(frame), (1920, 1080), rects)
+    library = layout_templates.TemplateLibrary(str(tmp_path / 'templates.json'))
+    snapped, score = library.match(small_mask(frame), (1920, 1080))
+    assert snapped == [tuple(rect) for rect in rects]
+    assert score == 1.0
+
+
+def test_snap_picks_matching_layout():
+    library = layout_templates.TemplateLibrary()
+    for tiles in (1, 4, 9, 49):
+        frame, rects = gallery_frame(tiles)
+        library.add(small_mask(frame), (1920, 1080), rects)
+    frame, rects = gallery_frame(9, seed=3)
+    snapped, _ = library.match(small_mask(frame), (1920, 1080))
+    assert len(snapped) == 9
+    frame, _ = gallery_frame(16)
+    assert library.match(small_mask(frame), (1920, 1080))[0] is None
+
+
+def test_add_replaces_matching_template():
+    library = layout_templates.TemplateLibrary()
+    frame, rects = gallery_frame(4)
+    library.add(small_mask(frame), (1920, 1080), rects)
+    library.add(small_mask(frame), (1920, 1080), rects)
+    assert len(library.templates) == 1
+
+
+def test_add_saves_at_most_once_per_interval(tmp_path):
+    library = layout_templates.TemplateLibrary(str(tmp_path / 'templates.json'), save_interval=60)
+    for tiles in (1, 4):
+        frame, rects = gallery_frame(tiles)
+        library.add(small_mask(frame), (1920, 1080), rects)
+    assert len(layout_templates.TemplateLibrary(str(tmp_path / 'templates.json')).templates) == 1
+    library.flush()
+    assert len(layout_templates.TemplateLibrary(str(tmp_path / 'templates.json')).templates) == 2
+
+
+def test_process_frame_snaps_after_full_detection(tmp_path, monkeypatch):
+    ip = image_processing.ImageProcessing(str(tmp_path), False)
+    ip.templates = layout_templates.TemplateLibrary()
+    frame, _ = gallery_frame(9)
+    detected = [cam[0] for cam in ip.process_frame(frame, save_crops=False).values()]
+    assert not ip.metrics['snapped']
+    ip.cameras = {}
+
+    # The full detector adds its result to the library, a snapped frame must not get that far
+    def full_detection(*args):
+        raise AssertionError('full detector ran')
+    monkeypatch.setattr(ip.templates, 'add', full_detection)
+    snapped = [cam[0] for cam in ip.process_frame(frame, save_crops=False).values()]
+    assert ip.metrics['snapped']
+    assert snapped == [tuple(rect) for rect in detected]
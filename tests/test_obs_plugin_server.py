@@ -1,3 +1,4 @@
+import time
 import pytest
 from mappingUtils import obs_plugin_server
 
@@ -8,4 +9,221 @@ def test_start_server():
 def test_send_command():
     server = obs_plugin_server.Server()
     server.start_server()
-    assert server.send_command('Hello') is None
\ No newline at end of file
+    assert server.send_command('Hello') is None
+
+def test_parse_target():
+    assert obs_plugin_server.parse_target('192.168.1.20:4455') == ('192.168.1.20', 4455)
+    assert obs_plugin_server.parse_target('backup') == ('backup', 48387)
+    with pytest.raises(ValueError):
+        obs_plugin_server.parse_target('backup:48a87')
+
+def test_unresolvable_target_does_not_stop_sends():
+    server = obs_plugin_server.Server(targets=[('obs.invalid', 48387), ('127.0.0.1', 48388)])
+    server.start_server()
+    server.send_command('Hello')
+    stats = server.get_stats()
+    server.stop_server()
+    assert stats['obs.invalid:48387']['failed'] == 1
+    assert stats['obs.invalid:48387']['status'].startswith('could not resolve obs.invalid')
+    assert stats['127.0.0.1:48388']['sent'] == 1
+
+def test_send_command_multiple_targets():
+    server = obs_plugin_server.Server(targets=[('localhost', 48387), ('127.0.0.1', 48388)])
+    server.start_server()
+    server.send_command('Hello')
+    stats = server.get_stats()
+    server.stop_server()
+    assert stats['localhost:48387']['sent'] == 1
+    assert stats['127.0.0.1:48388']['status'] == 'sent'
+
+def test_remove_target():
+    server = obs_plugin_server.Server()
+    server.add_target('127.0.0.1', 48388)
+    server.remove_target('localhost', 48387)
+    assert server.targets == [('127.0.0.1', 48388)]
+
+def test_crop_command_decoded_by_plugin():
+    from tests.plugin_standin import PluginStandIn
+    standin = PluginStandIn(port=0)
+    standin.start()
+    server = obs_plugin_server.Server(targets=[('127.0.0.1', standin.port)])
+    server.start_server()
+    cameras = obs_plugin_server.build_camera_crops({'0.jpg': [(8, 301, 949, 534), 'Luna']}, -40)
+    server.send_command(obs_plugin_server.crop_command('Linux', 'General', cameras))
+    assert standin.wait_for(1)
+    standin.stop()
+    assert standin.sources['Luna']['crop'] == {'left': 8, 'top': 261, 'cx': 949, 'cy': 534}
+
+def test_async_sender_coalesces_crops():
+    import asyncio
+    from tests.plugin_standin import PluginStandIn
+    standin = PluginStandIn(port=0)
+    standin.start()
+    server = obs_plugin_server.Server(targets=[('127.0.0.1', standin.port)])
+    server.start_server()
+
+    async def send():
+        sender = obs_plugin_server.AsyncSender(server, min_interval=0.05)
+        await sender.start()
+        for x in range(5):
+            sender.send_crops('Linux', 'General', [{'camName': 'Luna', 'x': x, 'x1': 10, 'y': 0, 'y1': 10}])
+        await asyncio.sleep(0.1)
+        sender.close()
+        return sender.sent
+
+    assert asyncio.run(send()) == 1
+    assert standin.wait_for(1)
+    standin.stop()
+    assert standin.sources['Luna']['crop']['left'] == 4
+    assert len(standin.timings) == 1
+
+def test_async_sender_keeps_command_kinds_apart():
+    import asyncio
+    from tests.plugin_standin import PluginStandIn
+    standin = PluginStandIn(port=0)
+    standin.start()
+    server = obs_plugin_server.Server(targets=[('127.0.0.1', standin.port)])
+    server.start_server()
+
+    async def send():
+        sender = obs_plugin_server.AsyncSender(server, min_interval=0.05)
+        await sender.start()
+        # A participant named speaker must not replace the speaker command queued in the same flush
+        sender.send_command(obs_plugin_server.speaker_command('Luna'), key=('speaker',))
+        sender.send_command(obs_plugin_server.visibility_command('speaker', False), key=('visible', 'speaker'))
+        await sender.wait_flushed()
+        sender.close()
+
+    asyncio.run(send())
+    assert standin.wait_for(2)
+    standin.stop()
+    assert standin.speaker == 'Luna'
+    assert standin.sources['speaker']['visible'] is False
+
+def test_async_sender_keeps_unbound_cameras_apart():
+    import asyncio
+    from tests.plugin_standin import PluginStandIn
+    standin = PluginStandIn(port=0)
+    received = []
+    standin.crop_cam = lambda win_title, cam_info, *args, **kwargs: received.append(len(cam_info))
+    standin.start()
+    server = obs_plugin_server.Server(targets=[('127.0.0.1', standin.port)])
+    server.start_server()
+
+    async def send():
+        sender = obs_plugin_server.AsyncSender(server, min_interval=0.05)
+        await sender.start()
+        for _ in range(2):
+            sender.send_crops('Linux', 'General', [{'camName': '', 'x': x, 'x1': 10, 'y': 0, 'y1': 10}
+                                                   for x in range(3)])
+        await asyncio.sleep(0.1)
+        sender.close()
+
+    asyncio.run(send())
+    assert standin.wait_for(1)
+    standin.stop()
+    server.stop_server()
+    assert received == [3]
+
+def test_wait_flushed_returns_once_sent():
+    import asyncio
+    server = obs_plugin_server.Server(targets=[('127.0.0.1', 48388)])
+    server.start_server()
+
+    async def send():
+        sender = obs_plugin_server.AsyncSender(server, min_interval=0.05)
+        await sender.start()
+        await sender.wait_flushed()
+        sender.send_crops('Linux', 'General', [{'camName': 'Luna', 'x': 0, 'x1': 10, 'y': 0, 'y1': 10}])
+        sent_before = sender.sent
+        await sender.wait_flushed()
+        sent_after = sender.sent
+        sender.close()
+        return sent_before, sent_after
+
+    assert asyncio.run(send()) == (0, 1)
+    server.stop_server()
+
+def test_visibility_command_decoded_by_plugin():
+    from tests.plugin_standin import PluginStandIn
+    standin = PluginStandIn(port=0)
+    standin.start()
+    server = obs_plugin_server.Server(targets=[('127.0.0.1', standin.port)])
+    server.start_server()
+    server.send_command(obs_plugin_server.visibility_command('Luna', False))
+    assert standin.wait_for(1)
+    standin.stop()
+    assert standin.sources['Luna']['visible'] is False
+
+def test_camera_layout_fractions():
+    cameras = {'0.jpg': [(100, 140, 400, 200), 'Luna'], '1.jpg': [(500, 140, 400, 200), 'James']}
+    layout = obs_plugin_server.camera_layout(cameras, (1000, 500), (0, 40, 0, 60))
+    assert layout['box'] == [0.1, 0.25, 0.8, 0.5]
+    crops = obs_plugin_server.build_camera_crops(cameras, 0, layout)
+    assert (crops[1]['nx'], crops[1]['ny'], crops[1]['nw'], crops[1]['nh']) == (0.5, 0.25, 0.4, 0.5)
+
+def test_relative_crops_follow_resize(tmp_path):
+    from tests.plugin_standin import PluginStandIn
+    from tests.synthetic_frames import gallery_frame
+    from mappingUtils import image_processing
+    ip = image_processing.ImageProcessing(str(tmp_path))
+    standin = PluginStandIn(port=0)
+    standin.stop()
+    cams = ip.process_frame(gallery_frame(4, 1280, 720)[0], save_crops=False)
+    for index, cam in enumerate(cams.values()):
+        cam[1] = '1280-' + str(index)
+    layout = obs_plugin_server.camera_layout(cams, (1280, 720), (0, 0, 0, 0), -40)
+    standin.handle(obs_plugin_server.crop_command('Linux', 'Call', obs_plugin_server.build_camera_crops(
+        cams, -40, layout), layout=layout))
+    # A wider window keeps the gallery centered at the same size so resized crops match a new detection exactly
+    for index, cam in enumerate(ip.process_frame(gallery_frame(4, 1920, 720)[0], save_crops=False).values()):
+        name = '1280-' + str(index)
+        standin.resize(name, 1280, 720)
+        standin.resize(name, 1920, 720)
+        assert standin.sources[name]['crop'] == {'left': cam[0][0], 'top': cam[0][1] - 40, 'cx': cam[0][2],
+                                                 'cy': cam[0][3]}
+
+def test_plugin_telemetry_in_stats():
+    from tests.plugin_standin import PluginStandIn
+    standin = PluginStandIn(port=0, send_telemetry=True)
+    standin.start()
+    server = obs_plugin_server.Server(targets=[('127.0.0.1', standin.port)])
+    server.start_server()
+    server.send_command(obs_plugin_server.crop_command('Linux', 'Call', [
+        {'camName': 'Luna', 'x': 0, 'x1': 10, 'y': 0, 'y1': 10}, {'camName': 'James', 'x': 10, 'x1': 10, 'y': 0,
+                                                                   'y1': 10}]))
+    server.send_command(obs_plugin_server.speaker_command('Luna'))
+    assert standin.wait_for(2)
+    deadline = time.monotonic() + 5
+    while server.telemetry[('127.0.0.1', standin.port)]['reports'] < 2 and time.monotonic() < deadline:
+        server.poll_telemetry()
+        time.sleep(0.01)
+    standin.stop()
+    plugin = server.get_stats()['127.0.0.1:{0}'.format(standin.port)]['plugin']
+    server.stop_server()
+    assert (plugin['reports'], plugin['messages'], plugin['applied'], plugin['created']) == (2, 2, 2, 2)
+    assert 0 < plugin['mean_apply'] <= plugin['max_apply_time']
+    assert not server.record_telemetry(('10.0.0.1', 1), b'{"arg": "telemetry"}')
+
+def test_malformed_telemetry_is_dropped():
+    server = obs_plugin_server.Server(targets=[('127.0.0.1', 48400)])
+    address = ('127.0.0.1', 48400)
+    assert not server.record_telemetry(address, b'{"arg": "telemetry", "messages": "many"}')
+    assert not server.record_telemetry(address, b'{"arg": "telemetry", "decode_ns": [1]}')
+    assert server.record_telemetry(address, b'{"arg": "telemetry", "messages": 2, "decode_ns": 4000000}')
+    assert server.telemetry[address]['reports'] == 1
+    assert '2.00 ms' in obs_plugin_server.format_stats(server.get_stats())
+
+def test_first_source_size_is_the_baseline():
+    from tests.plugin_standin import PluginStandIn
+    standin = PluginStandIn(port=0)
+    standin.stop()
+    cams = {'0.jpg': [(100, 100, 400, 200), 'Luna']}
+    layout = obs_plugin_server.camera_layout(cams, (1280, 700), (0, 0, 0, 0), -40)
+    standin.handle(obs_plugin_server.crop_command('Linux', 'Call', obs_plugin_server.build_camera_crops(
+        cams, -40, layout), layout=layout))
+    # OBS captures the window with its titlebar so the source renders taller than the detected window
+    standin.resize('Luna', 1280, 720)
+    assert standin.sources['Luna']['crop'] == {'left': 100, 'top': 60, 'cx': 400, 'cy': 200}
+    standin.resize('Luna', 1280, 1440)
+    assert standin.sources['Luna']['crop']['top'] != 60
@@ -1,3 +1,4 @@
+import json
 import jsonschema
 import pytest
 from mappingUtils import preset_handler
@@ -128,4 +129,23 @@ def test_createPresets_file_exists():
 
 def test_createPresets_file_does_not_exist():
     ph = preset_handler.PresetHandler()
-    assert ph.create_presets('tests/newpresets.json') is None
\ No newline at end of file
+    assert ph.create_presets('tests/newpresets.json') is None
+
+
+def test_loadJson_without_validation_then_validate():
+    ph = preset_handler.PresetHandler()
+    ph.load_json('tests/badFormedPresets.json', validate=False)
+    with pytest.raises(jsonschema.exceptions.ValidationError):
+        ph.validate_presets()
+
+
+def test_getPresetNames_before_validation_skips_malformed_presets(tmp_path):
+    presets_file = tmp_path / 'presets.json'
+    presets_file.write_text(json.dumps({'Presets': [{'people': ['Luna']}, {'preset_name': 'TestingPreset2',
+                                                                           'people': ['Kaly']}]}))
+    ph = preset_handler.PresetHandler()
+    ph.load_json(str(presets_file), validate=False)
+    assert ph.get_preset_names() == ['TestingPreset2']
+    ph.load_json('tests/badFormedPresets.json', validate=False)
+    assert ph.get_preset_names() == ['TestingPreset2']
+    assert ph.get_people('TestingPreset') is None
@@ -0,0 +1,81 @@
+import io
+import json
+from mappingUtils import scene_patcher
+
+
+def collection(tmp_path, sources):
+    path = tmp_path / 'collection.json'
+    path.write_text(json.dumps({'current_scene': 'Show', 'name': 'Test', 'scene_order': [{'name': 'Show'}],
+                                'sources': sources, 'transition_duration': 300}, indent=4))
+    return str(path)
+
+
+def capture_source(name, **extra):
+    return dict({'id': 'xcomposite_input', 'versioned_id': 'xcomposite_input', 'name': name,
+                 'settings': {'capture_window': '123\r\nGeneral\r\ndiscord'}, 'filters': []}, **extra)
+
+
+def scene(name, items):
+    return {'id': 'scene', 'versioned_id': 'scene', 'name': name,
+            'settings': {'items': items, 'id_counter': len(items)}}
+
+
+def test_json_stream_small_chunks():
+    document = {'a': [1, 2.5, {'b': 'x y'}], 'sources': [{'n': i} for i in range(20)], 'z': 12345}
+    stream = scene_patcher.JsonStream(io.StringIO(json.dumps(document, indent=2)), chunk_size=7)
+    read = {}
+    for key, value in stream.items():
+        read[key] = list(value.elements()) if key == 'sources' else value.value()
+    assert read == document
+
+
+def test_plan_sources_binds_people_in_order():
+    cameras = [{'rect': [8, 300, 940, 530], 'name': ''}, {'rect': [960, 300, 940, 530], 'name': 'James'}]
+    plan = scene_patcher.plan_sources('TestingPreset', ['Luna', 'James'], cameras)
+    assert plan == {'Luna': ('OBSMapper-TestingPreset', {'relative': False, 'left': 8, 'top': 300,
+                                                         'cx': 940, 'cy': 530}),
+                    'James': ('OBSMapper-TestingPreset', {'relative': False, 'left': 960, 'top': 300,
+                                                          'cx': 940, 'cy': 530})}
+
+
+def test_patch_collection(tmp_path):
+    path = collection(tmp_path, [scene('Show', [{'name': 'James', 'id': 1}]),
+                                 capture_source('OBSMapper-TestingPreset', uuid='a'),
+                                 capture_source('James', uuid='b', filters=[
+                                     {'id': 'crop_filter', 'name': 'CamCrop', 'settings': {'left': 1}}])])
+    cameras = [{'rect': [8, 300, 940, 530], 'name': ''}, {'rect': [960, 300, 940, 530], 'name': ''}]
+    plan = scene_patcher.plan_sources('TestingPreset', ['Luna', 'James'], cameras)
+    stats = scene_patcher.patch_collection(path, str(tmp_path / 'patched.json'), plan)
+    assert stats == {'created': 1, 'updated': 1}
+    with open(str(tmp_path / 'patched.json'), encoding='UTF-8') as patched_file:
+        patched = json.load(patched_file)
+    assert patched['transition_duration'] == 300
+    sources = {source['name']: source for source in patched['sources']}
+    assert sources['Luna']['filters'][0]['settings'] == {'relative': False, 'left': 8, 'top': 300,
+                                                          'cx': 940, 'cy': 530}
+    assert sources['Luna']['settings'] == sources['OBSMapper-TestingPreset']['settings']
+    assert sources['James']['filters'] == [{'id': 'crop_filter', 'name': 'CamCrop', 'settings': {
+        'left': 960, 'relative': False, 'top': 300, 'cx': 940, 'cy': 530}}]
+    items = sources['Show']['settings']['items']
+    assert [item['name'] for item in items] == ['James', 'Luna']
+    assert items[1]['id'] == 2 and items[1]['source_uuid'] == sources['Luna']['uuid']
+
+
+def test_patch_collection_missing_preset_source(tmp_path):
+    path = collection(tmp_path, [scene('Show', [])])
+    plan = scene_patcher.plan_sources('TestingPreset', ['Luna'], [{'rect': [8, 300, 940, 530], 'name': ''}])
+    try:
+        scene_patcher.patch_collection(path, str(tmp_path / 'patched.json'), plan)
+        assert False
+    except ValueError as error:
+        assert 'OBSMapper-TestingPreset' in str(error)
+
+
+def test_patch_collection_scene_must_be_a_scene(tmp_path):
+    path = collection(tmp_path, [scene('Show', []), capture_source('OBSMapper-TestingPreset'), capture_source('Luna')])
+    plan = scene_patcher.plan_sources('TestingPreset', ['Luna'], [{'rect': [8, 300, 940, 530], 'name': ''}])
+    try:
+        scene_patcher.patch_collection(path, str(tmp_path / 'patched.json'), plan, scene_name='Luna')
+        assert False
+    except ValueError as error:
+        assert 'scene named Luna' in str(error)
@@ -0,0 +1,70 @@
+import numpy as np
+from mappingUtils import image_processing, obs_plugin_server, session_archive
+
+
+def test_record_session(tmp_path):
+    ip = image_processing.ImageProcessing(str(tmp_path), False)
+    ip.start_recording(str(tmp_path / 'session'))
+    ip.get_camera_pos(None, screenshot='tests/discord_test.png')
+    ip.stop_recording()
+    replay = session_archive.SessionReplay(str(tmp_path / 'session'))
+    assert len(replay) == 1
+    assert replay.frame(0).shape == (1082, 1922, 3)
+
+
+def test_replay_frame_matches_recording(tmp_path):
+    frame = np.arange(20 * 30 * 3, dtype=np.uint8).reshape((20, 30, 3))
+    recorder = session_archive.SessionRecorder(str(tmp_path))
+    recorder.record(frame, (0, 0, 30, 20), {'0.jpg': [(1, 2, 3, 4), '']})
+    recorder.record(frame[::-1], (0, 0, 30, 20), {})
+    recorder.close()
+    replay = session_archive.SessionReplay(str(tmp_path))
+    assert np.array_equal(replay.frame(0), frame)
+    assert np.array_equal(replay.frame(1), frame[::-1])
+    assert replay.entries[0]['rects'] == [[1, 2, 3, 4]]
+
+
+def test_entries_are_readable_before_close(tmp_path):
+    frame = np.zeros((20, 30, 3), dtype=np.uint8)
+    recorder = session_archive.SessionRecorder(str(tmp_path))
+    recorder.record(frame, (0, 0, 30, 20), {}, 'General', 'Discord', '4194307\r\nGeneral\r\nDiscord')
+    replay = session_archive.SessionReplay(str(tmp_path))
+    assert replay.entries[0]['exe'] == '4194307\r\nGeneral\r\nDiscord'
+    assert np.array_equal(replay.frame(0), frame)
+    recorder.close()
+
+
+def test_replay_session_max_speed(tmp_path):
+    ip = image_processing.ImageProcessing(str(tmp_path), False)
+    ip.start_recording(str(tmp_path / 'session'))
+    ip.get_camera_pos(None, screenshot='tests/discord_test.png')
+    ip.get_camera_pos(None, screenshot='tests/discord_test.png')
+    ip.stop_recording()
+    server = obs_plugin_server.Server()
+    server.start_server()
+    stats = session_archive.replay_session(str(tmp_path / 'session'), ip, server, speed=None)
+    assert stats['frames'] == 2
+    assert stats['mismatches'] == 0
+
+
+def test_replay_uses_recorded_profile_and_linux_offset(tmp_path):
+    from tests.plugin_standin import PluginStandIn
+    from mappingUtils import detector_profiles
+    ip = image_processing.ImageProcessing(str(tmp_path), False)
+    ip.start_recording(str(tmp_path / 'session'))
+    ip.get_camera_pos(None, screenshot='tests/discord_test.png')
+    ip.stop_recording()
+    rects = session_archive.SessionReplay(str(tmp_path / 'session')).entries[0]['rects']
+    standin = PluginStandIn(port=0)
+    standin.start()
+    server = obs_plugin_server.Server(targets=[('127.0.0.1', standin.port)])
+    server.start_server()
+    ip.profile = detector_profiles.ZOOM
+    stats = session_archive.replay_session(str(tmp_path / 'session'), ip, server, speed=None, exe='General')
+    assert standin.wait_for(1)
+    standin.stop()
+    server.stop_server()
+    assert stats['mismatches'] == 0
+    assert ip.profile is detector_profiles.DISCORD
+    tops = [source['crop']['top'] - detector_profiles.DISCORD.linux_y_offset for source in standin.sources.values()]
+    assert tops and set(tops) <= {rect[1] for rect in rects}
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from tests.synthetic_frames import gallery_frame
+from mappingUtils import tile_analysis
+
+
+def draw_ring(frame, rect, colour=(90, 165, 35), width=5):
+    x, y, w, h = rect
+    frame[y:y + width, x:x + w] = colour
+    frame[y + h - width:y + h, x:x + w] = colour
+    frame[y:y + h, x:x + width] = colour
+    frame[y:y + h, x + w - width:x + w] = colour
+
+
+def test_speaker_detected():
+    frame, rects = gallery_frame(9)
+    draw_ring(frame, rects[4])
+    detector = tile_analysis.SpeakerDetector(hold_frames=1)
+    detector.set_rects(rects, frame.shape)
+    assert detector.update(frame) is True
+    assert detector.speaker == 4
+
+def test_no_speaker():
+    frame, rects = gallery_frame(49)
+    detector = tile_analysis.SpeakerDetector(hold_frames=1)
+    detector.set_rects(rects, frame.shape)
+    assert detector.update(frame) is False
+    assert detector.speaker is None
+
+def test_speaker_held_before_change():
+    frame, rects = gallery_frame(4)
+    draw_ring(frame, rects[1])
+    detector = tile_analysis.SpeakerDetector(hold_frames=2)
+    detector.set_rects(rects, frame.shape)
+    assert detector.update(frame) is False
+    assert detector.update(frame) is True
+    assert detector.speaker == 1
+
+def test_frame_shape_mismatch():
+    frame, rects = gallery_frame(4)
+    detector = tile_analysis.SpeakerDetector()
+    detector.set_rects(rects, (720, 1280))
+    with pytest.raises(ValueError):
+        detector.update(frame)
+
+def moving_frame(frame, rects, rng):
+    moved = frame.copy()
+    for x, y, w, h in rects:
+        noise = rng.integers(-6, 6, (h, w, 3))
+        moved[y:y + h, x:x + w] = np.clip(moved[y:y + h, x:x + w].astype(int) + noise, 0, 255)
+    return moved
+
+
+def test_camera_off_detected():
+    frame, rects = gallery_frame(9)
+    x, y, w, h = rects[2]
+    frame[y:y + h, x:x + w] = (120, 80, 60)
+    frame[y + h // 3:y + 2 * h // 3, x + w // 3:x + 2 * w // 3] = (200, 200, 240)
+    classifier = tile_analysis.CameraOffClassifier(hold_frames=2)
+    classifier.set_rects(rects, frame.shape)
+    rng = np.random.default_rng(0)
+    changes = []
+    for _ in range(4):
+        changes += classifier.update(moving_frame(frame, rects[:2] + rects[3:], rng))
+    assert changes == [(2, True)]
+
+def test_camera_back_on():
+    frame, rects = gallery_frame(4)
+    classifier = tile_analysis.CameraOffClassifier(hold_frames=1)
+    classifier.set_rects(rects, frame.shape)
+    classifier.update(frame)
+    assert classifier.update(frame) == [(0, True), (1, True), (2, True), (3, True)]
+    rng = np.random.default_rng(0)
+    assert classifier.update(moving_frame(frame, rects[1:2], rng)) == [(1, False)]
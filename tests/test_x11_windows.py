@@ -0,0 +1,59 @@
+from mappingUtils import x11_windows
+
+
+def test_listeners_only_hear_moves_and_resizes():
+    tracker = x11_windows.X11WindowTracker()
+    changes = []
+    tracker.subscribe(lambda previous, window: changes.append((previous.geometry, window.geometry)))
+    call = x11_windows.TrackedWindow('0x03a00007', 'Zoom Meeting', 'zoom.zoom', 10, 20, 1280, 720)
+    tracker.update(call)
+    tracker.update(call._replace(wm_name='Zoom Meeting 2'))
+    tracker.update(call._replace(x=50))
+    tracker.update(call._replace(x=50, w=1920))
+    assert changes == [((10, 20, 1290, 740), (50, 20, 1330, 740)), ((50, 20, 1330, 740), (50, 20, 1970, 740))]
+
+
+def test_lookup_like_wmctrl():
+    tracker = x11_windows.X11WindowTracker()
+    tracker.update(x11_windows.TrackedWindow('0x0000000a', 'General', 'discord.discord', 0, 0, 800, 600))
+    tracker.update(x11_windows.TrackedWindow('0x0000000b', 'Terminal', 'gnome-terminal.Gnome-terminal', 0, 0, 80, 60))
+    assert [window.id for window in tracker.by_name('General')] == ['0x0000000a']
+    tracker.remove(0x0a)
+    assert tracker.by_name('General') == []
+    assert [window.wm_name for window in tracker.list()] == ['Terminal']
+
+
+def test_connect_without_display():
+    assert x11_windows.connect('not a display') is None
+
+
+def test_request_errors_do_not_stop_following_events():
+    from types import SimpleNamespace
+
+    class FakeXError(Exception):
+        pass
+
+    class FakeConnectionClosedError(Exception):
+        pass
+
+    def bad_match(*args):
+        raise FakeXError('BadMatch')
+
+    closed_window = SimpleNamespace(id=0x0a, get_full_property=bad_match)
+    events = [SimpleNamespace(type=22, window=closed_window), SimpleNamespace(type=17, window=closed_window)]
+
+    def next_event():
+        if not events:
+            raise FakeConnectionClosedError()
+        return events.pop(0)
+
+    tracker = x11_windows.X11WindowTracker()
+    tracker.update(x11_windows.TrackedWindow('0x0000000a', 'General', 'discord.discord', 0, 0, 800, 600))
+    tracker._display = SimpleNamespace(pending_events=lambda: 1, next_event=next_event)
+    tracker._atoms = {'_NET_WM_NAME': 1, 'UTF8_STRING': 2}
+    tracker._xlib = (SimpleNamespace(PropertyNotify=28, ConfigureNotify=22, DestroyNotify=17),
+                     SimpleNamespace(XError=FakeXError, ConnectionClosedError=FakeConnectionClosedError))
+    tracker.running = True
+    tracker._follow_events()
+    assert tracker.list() == []
+    assert not tracker.running